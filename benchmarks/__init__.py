@@ -0,0 +1,10 @@
+'''
+Benchmarks for the overhead the em_framework adds on top of the model.
+
+The benchmarks follow the conventions of `airspeed velocity
+<https://asv.readthedocs.io>`_, so the history of the benchmarks over the
+commits can be tracked by running ``asv run`` or ``asv continuous master
+HEAD`` from the root of the repository. For a quick check without asv, run
+``python -m benchmarks`` from the root of the repository.
+
+'''
@@ -0,0 +1,162 @@
+'''
+Minimal runner for the benchmarks for use without asv. It understands the
+subset of the asv conventions used by the benchmarks in this package:
+``params``, ``param_names``, ``setup``, ``teardown``, and ``time_`` and
+``peakmem_`` methods. Peak memory is measured with :mod:`tracemalloc`,
+so it only includes memory allocated through python and numpy.
+
+usage::
+
+    python -m benchmarks [-b REGEX] [-r REPEAT] [-o FILE]
+
+Each run can be appended to a json file to keep a history of the results
+across commits. For proper tracking of the history, use asv.
+
+'''
+from __future__ import (absolute_import, print_function, division,
+                        unicode_literals)
+
+import argparse
+import datetime
+import importlib
+import inspect
+import itertools
+import json
+import os
+import pkgutil
+import re
+import subprocess
+import timeit
+import tracemalloc
+
+PREFIXES = ('time_', 'peakmem_')
+UNITS = {'time_': 's', 'peakmem_': 'bytes'}
+
+
+def discover():
+    '''yields the name and class of each benchmark class'''
+    package = os.path.dirname(os.path.abspath(__file__))
+    for _, module_name, _ in pkgutil.iter_modules([package]):
+        if not module_name.startswith('bench_'):
+            continue
+        module = importlib.import_module('benchmarks.' + module_name)
+
+        for name, klass in inspect.getmembers(module, inspect.isclass):
+            if klass.__module__ == module.__name__:
+                yield '{}.{}'.format(module_name, name), klass
+
+
+def measure(klass, method_name, params, repeat):
+    '''run a single benchmark method for the given parameters, returns
+    the best of repeat measurements'''
+    kind = method_name[0:method_name.index('_')+1]
+    values = []
+
+    for _ in range(repeat):
+        instance = klass()
+        if hasattr(instance, 'setup'):
+            instance.setup(*params)
+        method = getattr(instance, method_name)
+
+        try:
+            if kind == 'time_':
+                start = timeit.default_timer()
+                method(*params)
+                values.append(timeit.default_timer() - start)
+            else:
+                tracemalloc.start()
+                try:
+                    method(*params)
+                    values.append(tracemalloc.get_traced_memory()[1])
+                finally:
+                    tracemalloc.stop()
+        finally:
+            if hasattr(instance, 'teardown'):
+                instance.teardown(*params)
+
+    return min(values), UNITS[kind]
+
+
+def run(pattern=None, repeat=3):
+    '''run all benchmarks matching pattern
+
+    Parameters
+    ----------
+    pattern : str, optional
+              regular expression matched against module.class.method
+    repeat : int, optional
+
+    Returns
+    -------
+    list of dicts
+
+    '''
+    results = []
+    for class_name, klass in discover():
+        params = getattr(klass, 'params', ())
+        if params and not isinstance(params[0], (list, tuple)):
+            params = (params, )
+
+        for method_name in sorted(dir(klass)):
+            if not method_name.startswith(PREFIXES):
+                continue
+            name = '{}.{}'.format(class_name, method_name)
+            if pattern and not re.search(pattern, name):
+                continue
+
+            for combination in itertools.product(*params):
+                try:
+                    value, unit = measure(klass, method_name, combination,
+                                          repeat)
+                except NotImplementedError:
+                    print('{} {}: skipped'.format(name, combination))
+                    continue
+
+                print('{} {}: {:.6g} {}'.format(name, combination, value,
+                                                unit))
+                results.append({'benchmark': name,
+                                'params': list(combination),
+                                'value': value,
+                                'unit': unit})
+    return results
+
+
+def save(results, filename):
+    '''append the results of this run to the history in filename'''
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'])
+        commit = commit.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    history = []
+    if os.path.exists(filename):
+        with open(filename, 'r') as fh:
+            history = json.load(fh)
+
+    history.append({'commit': commit,
+                    'date': datetime.datetime.now().isoformat(),
+                    'results': results})
+    with open(filename, 'w') as fh:
+        json.dump(history, fh, indent=1)
+
+
+def main():
+    description = __doc__.strip().split('\n\n')[0]
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description=description)
+    parser.add_argument('-b', '--bench', default=None,
+                        help='regular expression for selecting benchmarks')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='number of measurements per benchmark')
+    parser.add_argument('-o', '--output', default=None,
+                        help='json file to which the results are appended')
+    args = parser.parse_args()
+
+    results = run(args.bench, args.repeat)
+    if args.output:
+        save(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
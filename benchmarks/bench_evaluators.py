@@ -0,0 +1,74 @@
+'''
+Benchmarks for the throughput of the evaluators. Experiments are performed
+on a no-op model, so the timings are the overhead of sampling, dispatching,
+running and storing the experiments.
+
+'''
+from __future__ import (absolute_import, print_function, division,
+                        unicode_literals)
+
+from ema_workbench.em_framework.evaluators import (MultiprocessingEvaluator,
+                                                   SequentialEvaluator)
+
+from .common import make_model
+
+N_WORKERS = 2
+
+
+def make_evaluator(kind, model):
+    '''create and initialize an evaluator
+
+    Parameters
+    ----------
+    kind : {'sequential', 'multiprocessing', 'distributed'}
+    model : AbstractModel instance
+
+    Raises
+    ------
+    NotImplementedError
+        if dask.distributed is not installed, asv treats this as
+        a skipped benchmark
+
+    '''
+    if kind == 'sequential':
+        evaluator = SequentialEvaluator(model)
+    elif kind == 'multiprocessing':
+        evaluator = MultiprocessingEvaluator(model, n_processes=N_WORKERS)
+    else:
+        try:
+            from distributed import Client, LocalCluster
+            from ema_workbench.em_framework.ema_distributed import \
+                DistributedEvaluator
+        except ImportError:
+            raise NotImplementedError('dask.distributed not available')
+
+        cluster = LocalCluster(n_workers=N_WORKERS, threads_per_worker=1)
+        evaluator = DistributedEvaluator(model, client=Client(cluster))
+
+    evaluator.initialize()
+    return evaluator
+
+
+class Evaluators(object):
+    params = (['sequential', 'multiprocessing', 'distributed'],
+              [1000, 10000])
+    param_names = ['evaluator', 'n_experiments']
+    timeout = 600
+
+    def setup(self, kind, n_experiments):
+        self.model = make_model(10, 0, 2)
+        self.evaluator = make_evaluator(kind, self.model)
+
+    def teardown(self, kind, n_experiments):
+        self.evaluator.finalize()
+
+        client = getattr(self.evaluator, 'client', None)
+        if client is not None:
+            client.cluster.close()
+            client.close()
+
+    def time_perform_experiments(self, kind, n_experiments):
+        self.evaluator.perform_experiments(scenarios=n_experiments)
+
+    def peakmem_perform_experiments(self, kind, n_experiments):
+        self.evaluator.perform_experiments(scenarios=n_experiments)
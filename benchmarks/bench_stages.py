@@ -0,0 +1,144 @@
+'''
+Benchmarks for the individual stages an experiment passes through. Each
+stage is timed with a no-op model, so the timings are the overhead of the
+em_framework itself.
+
+'''
+from __future__ import (absolute_import, print_function, division,
+                        unicode_literals)
+
+import collections
+
+from ema_workbench.em_framework.callbacks import DefaultCallback
+from ema_workbench.em_framework.experiment_runner import ExperimentRunner
+from ema_workbench.em_framework.model import AbstractModel
+from ema_workbench.em_framework.parameters import (Policy,
+                                                   experiment_generator)
+from ema_workbench.em_framework.samplers import (sample_levers,
+                                                 sample_uncertainties)
+from ema_workbench.em_framework.util import NamedObjectMap
+
+from .common import make_model
+
+
+def make_experiments(model, n_scenarios, n_policies):
+    scenarios = list(sample_uncertainties(model, n_scenarios))
+    if model.levers:
+        policies = list(sample_levers(model, n_policies))
+    else:
+        policies = [Policy('None')]
+    return list(experiment_generator(scenarios, [model], policies))
+
+
+def consume(iterator):
+    collections.deque(iterator, maxlen=0)
+
+
+class SampleUncertainties(object):
+    params = ([10, 100], [1000, 10000])
+    param_names = ['n_uncertainties', 'n_experiments']
+
+    def setup(self, n_uncertainties, n_experiments):
+        self.model = make_model(n_uncertainties, 0, 1)
+
+    def time_sample_uncertainties(self, n_uncertainties, n_experiments):
+        consume(sample_uncertainties(self.model, n_experiments))
+
+    def peakmem_sample_uncertainties(self, n_uncertainties, n_experiments):
+        consume(sample_uncertainties(self.model, n_experiments))
+
+
+class ExperimentGenerator(object):
+    params = ([1000, 10000], [1, 10])
+    param_names = ['n_scenarios', 'n_policies']
+
+    def setup(self, n_scenarios, n_policies):
+        self.model = make_model(10, 10, 1)
+        self.scenarios = list(sample_uncertainties(self.model, n_scenarios))
+        self.policies = list(sample_levers(self.model, n_policies))
+
+    def time_experiment_generator(self, n_scenarios, n_policies):
+        consume(experiment_generator(self.scenarios, [self.model],
+                                     self.policies))
+
+
+class RunExperiment(object):
+    params = ([10, 100], [0, 10], [1, 10])
+    param_names = ['n_uncertainties', 'n_levers', 'n_outcomes']
+    n_experiments = 1000
+
+    def setup(self, n_uncertainties, n_levers, n_outcomes):
+        model = make_model(n_uncertainties, n_levers, n_outcomes)
+        self.experiments = make_experiments(model, self.n_experiments, 1)
+
+        models = NamedObjectMap(AbstractModel)
+        models.extend([model])
+        self.runner = ExperimentRunner(models)
+
+    def time_run_experiment(self, n_uncertainties, n_levers, n_outcomes):
+        run_experiment = self.runner.run_experiment
+        for experiment in self.experiments:
+            run_experiment(experiment)
+
+
+class StoreResults(object):
+    params = ([10, 100], [0, 10], [1, 10], [1000, 10000])
+    param_names = ['n_uncertainties', 'n_levers', 'n_outcomes',
+                   'n_experiments']
+
+    # the callback can hold each experiment only once, so a fresh
+    # callback is needed for every sample
+    number = 1
+    repeat = 10
+    warmup_time = 0
+
+    def setup(self, n_uncertainties, n_levers, n_outcomes, n_experiments):
+        model = make_model(n_uncertainties, n_levers, n_outcomes)
+        experiments = make_experiments(model, n_experiments, 1)
+        outcomes = {outcome.name: 0.0 for outcome in model.outcomes}
+        self.results = [(experiment, outcomes) for experiment in experiments]
+
+        self.callback = DefaultCallback(list(model.uncertainties),
+                                        list(model.levers),
+                                        list(model.outcomes),
+                                        nr_experiments=n_experiments)
+
+    def time_call(self, n_uncertainties, n_levers, n_outcomes,
+                  n_experiments):
+        callback = self.callback
+        for experiment, outcomes in self.results:
+            callback(experiment, outcomes)
+
+    def time_store_batch(self, n_uncertainties, n_levers, n_outcomes,
+                         n_experiments):
+        self.callback.store_batch(self.results)
+
+
+class GetResults(object):
+    params = ([10, 100], [0, 10], [1, 10], [1000, 10000])
+    param_names = ['n_uncertainties', 'n_levers', 'n_outcomes',
+                   'n_experiments']
+
+    def setup(self, n_uncertainties, n_levers, n_outcomes, n_experiments):
+        model = make_model(n_uncertainties, n_levers, n_outcomes)
+        experiments = make_experiments(model, n_experiments, 1)
+        outcomes = {outcome.name: 0.0 for outcome in model.outcomes}
+
+        self.callback = DefaultCallback(list(model.uncertainties),
+                                        list(model.levers),
+                                        list(model.outcomes),
+                                        nr_experiments=n_experiments)
+        self.callback.store_batch([(experiment, outcomes) for experiment
+                                   in experiments])
+
+    def time_get_results(self, n_uncertainties, n_levers, n_outcomes,
+                         n_experiments):
+        self.callback.get_results()
+
+    def peakmem_get_results(self, n_uncertainties, n_levers, n_outcomes,
+                            n_experiments):
+        self.callback.get_results()
+
+    def mem_get_results(self, n_uncertainties, n_levers, n_outcomes,
+                        n_experiments):
+        return self.callback.get_results()
@@ -0,0 +1,49 @@
+'''
+helper functions shared by the benchmarks
+
+'''
+from __future__ import (absolute_import, print_function, division,
+                        unicode_literals)
+
+from ema_workbench.em_framework import (Model, RealParameter, ScalarOutcome)
+
+
+class NoopFunction(object):
+    '''model function that does no work and returns a constant for each
+    outcome, so all measured time is spend in the em_framework
+
+    defined as a class on the module level so it can be pickled and send
+    to the workers of the parallel evaluators
+
+    '''
+
+    def __init__(self, outcomes):
+        self.outcomes = {name: 0.0 for name in outcomes}
+
+    def __call__(self, **kwargs):
+        return self.outcomes
+
+
+def make_model(n_uncertainties, n_levers, n_outcomes):
+    '''create a no-op model
+
+    Parameters
+    ----------
+    n_uncertainties : int
+    n_levers : int
+    n_outcomes : int
+
+    Returns
+    -------
+    Model instance
+
+    '''
+    outcomes = ['o{}'.format(i) for i in range(n_outcomes)]
+
+    model = Model('noop', function=NoopFunction(outcomes))
+    model.uncertainties = [RealParameter('u{}'.format(i), 0, 1)
+                           for i in range(n_uncertainties)]
+    model.levers = [RealParameter('l{}'.format(i), 0, 1)
+                    for i in range(n_levers)]
+    model.outcomes = [ScalarOutcome(name) for name in outcomes]
+    return model
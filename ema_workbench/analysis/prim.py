@@ -17,7 +17,9 @@ from __future__ import (absolute_import, print_function, division,
                         unicode_literals)
 
 import copy
+import itertools
 import math
+import multiprocessing
 from operator import itemgetter
 import warnings
 from ema_workbench.util import ema_logging
@@ -36,6 +38,7 @@ from mpl_toolkits.axes_grid1 import host_subplot  # @UnresolvedImport
 
 import numpy as np
 import pandas as pd
+from scipy.stats import binom
 import seaborn as sns
 
 from .plotting_util import make_legend
@@ -48,8 +51,8 @@ from . import scenario_discovery_util as sdutil
 # .. codeauthor:: jhkwakkel <j.h.kwakkel (at) tudelft (dot) nl>
 
 
-__all__ = ['ABOVE', 'BELOW', 'setup_prim', 'Prim', 'PrimBox',
-           'PrimException', 'MultiBoxesPrim']
+__all__ = ['ABOVE', 'BELOW', 'setup_prim', 'prim_sweep', 'Prim',
+           'PrimBox', 'PrimException', 'MultiBoxesPrim']
 
 LENIENT2 = 'lenient2'
 LENIENT1 = 'lenient1'
@@ -100,6 +103,55 @@ def get_quantile(data, quantile):
     return value
 
 
+def _sorted_quantiles(data, quantile):
+    '''
+    vectorized version of :func:`get_quantile`, giving the quantile of
+    each row of a 2D array that is sorted along its rows
+
+    Parameters
+    ----------
+    data : 2D ndarray
+           dataset sorted along axis 1
+    quantile : float
+               the desired quantile
+
+    Returns
+    -------
+    1D ndarray
+
+    '''
+    assert quantile > 0
+    assert quantile < 1
+
+    n = data.shape[1]
+    rows = np.arange(data.shape[0])
+
+    i = (n-1)*quantile
+    lower = data[:, int(math.floor(i))]
+    higher = data[:, int(math.ceil(i))]
+
+    if quantile > 0.5:
+        # upper, move the lower index to the last smaller value
+        index = np.maximum(_sorted_counts(data, higher, 'left')-1, 0)
+        lower = np.where(lower == higher, data[rows, index], lower)
+    else:
+        # lower, move the higher index to the first larger value
+        index = np.minimum(_sorted_counts(data, lower, 'right'), n-1)
+        higher = np.where(lower == higher, data[rows, index], higher)
+
+    return (lower+higher)/2
+
+
+def _sorted_counts(data, values, side):
+    '''
+    for each row of a 2D array that is sorted along its rows, count the
+    number of entries smaller than (side='left') or smaller than or
+    equal to (side='right') the value for that row
+    '''
+    return np.asarray([np.searchsorted(row, value, side=side) for row, value
+                       in zip(data, values)], dtype=int)
+
+
 def _pair_wise_scatter(x, y, boxlim, box_init, restricted_dims):
     ''' helper function for pair wise scatter plotting
 
@@ -244,36 +296,147 @@ def setup_prim(results, classify, threshold, incl_unc=[], **kwargs):
     return Prim(x, y, threshold=threshold, mode=mode, **kwargs)
 
 
-def calculate_qp(data, x, y, Hbox, Tbox, box_lim, initial_boxlim):
-    '''Helper function for calculating quasi p-values'''
-    if data.size==0:
-        return [-1, -1]
-    
-    u = data.name
-    dtype = data.dtype
-    
-    unlimited = initial_boxlim[u]
-    
-    if np.issubdtype(dtype, np.number):
-        qp_values = []
-        for direction, (limit, unlimit) in enumerate(zip(data,
-                                                         unlimited)):
-            if unlimit != limit:
-                temp_box = box_lim.copy()
-                temp_box.loc[direction, u] = unlimit
-                qp = sdutil._calculate_quasip(x, y, temp_box,
-                                              Hbox, Tbox)
-            else:
-                qp = -1
-            qp_values.append(qp)
+def prim_sweep(x, y, thresholds, peel_alphas=[0.05], n_boxes=1,
+               n_processes=1, **kwargs):
+    '''
+
+    Run PRIM for a grid of thresholds, peel_alpha values, and outcomes.
+    The x data is preprocessed only once, and shared by all runs.
+
+    Parameters
+    ----------
+    x : DataFrame
+        the independent variables
+    y : 1d ndarray, or dict with 1d ndarrays
+        the dependent variable, use a dict to run PRIM for several 
+        outcomes of interest
+    thresholds : list of float
+                 the density thresholds
+    peel_alphas : list of float, optional
+    n_boxes : int, optional
+              the number of boxes to find for each run
+    n_processes : int, optional
+                  the number of processes over which the runs are 
+                  distributed, use None for all cores.
+    kwargs : dict
+             valid keyword arguments for prim.Prim, these are the same 
+             for all runs
+
+    Returns
+    -------
+    DataFrame
+        the peeling trajectories of all boxes, with the outcome, 
+        threshold, peel_alpha, and box number of each run as additional
+        columns
+
+    '''
+    if not isinstance(y, dict):
+        y = {'y': y}
+    outcomes = list(y.keys())
+
+    prim_obj = Prim(x, y[outcomes[0]], threshold=thresholds[0], **kwargs)
+
+    runs = list(itertools.product(outcomes, thresholds, peel_alphas))
+    if n_processes == 1:
+        results = (_run_sweep(prim_obj, y, run, n_boxes) for run in runs)
+        trajectories = _collect_sweep(results, len(runs))
     else:
-        temp_box = box_lim.copy()
-        temp_box.loc[:, u] = unlimited
-        qp = sdutil._calculate_quasip(x, y, temp_box,
-                                      Hbox, Tbox)
-        qp_values = [qp, -1]  
-    
-    return qp_values
+        pool = multiprocessing.Pool(n_processes, _sweep_initializer,
+                                    (prim_obj, y, n_boxes))
+        try:
+            results = pool.imap(_sweep_worker, runs)
+            trajectories = _collect_sweep(results, len(runs))
+        finally:
+            pool.close()
+            pool.join()
+
+    return pd.concat(trajectories, ignore_index=True)
+
+
+def _run_sweep(prim_obj, y, run, n_boxes):
+    '''Helper function that finds boxes for a single run of a sweep'''
+    outcome, threshold, peel_alpha = run
+
+    # copy y, the guivarch update function modifies it
+    prim_obj = prim_obj._derive(np.array(y[outcome]), threshold, peel_alpha)
+
+    trajectories = []
+    with temporary_filter(ema_logging.LOGGER_NAME, INFO, 'find_box'):
+        for i in range(n_boxes):
+            box = prim_obj.find_box()
+            if box is None:
+                break
+
+            trajectory = box.peeling_trajectory.copy()
+            trajectory['box'] = i
+            trajectories.append(trajectory)
+
+    trajectory = pd.concat(trajectories, ignore_index=True)
+    trajectory['outcome'] = outcome
+    trajectory['threshold'] = threshold
+    trajectory['peel_alpha'] = peel_alpha
+    columns = ['outcome', 'threshold', 'peel_alpha', 'box', 'id',
+               'coverage', 'density', 'mean', 'mass', 'res_dim']
+    return trajectory[columns]
+
+
+def _collect_sweep(results, n_runs):
+    '''helper function for collecting the results of a sweep, while
+    reporting progress'''
+    trajectories = []
+    for result in results:
+        trajectories.append(result)
+        _logger.info('prim run {} of {} completed'.format(len(trajectories),
+                                                          n_runs))
+    return trajectories
+
+
+# data shared with the sweep worker processes, set by the initializer
+_sweep_data = None
+
+
+def _sweep_initializer(prim_obj, y, n_boxes):
+    '''initializer for the sweep worker processes'''
+    global _sweep_data
+    _sweep_data = prim_obj, y, n_boxes
+
+
+def _sweep_worker(run):
+    '''run PRIM on the shared data for a single run of a sweep'''
+    prim_obj, y, n_boxes = _sweep_data
+    return _run_sweep(prim_obj, y, run, n_boxes)
+
+
+# data shared with the resampling worker processes, set by the initializer
+_resample_data = None
+
+
+def _resample_initializer(x, y, kwargs):
+    '''initializer for the resampling worker processes'''
+    global _resample_data
+    _resample_data = x, y, kwargs
+
+
+def _resample_worker(rows):
+    '''find a box on the subset of the shared data given by rows'''
+    x, y, kwargs = _resample_data
+    return _find_resample_box(x, y, rows, kwargs)
+
+
+def _find_resample_box(x, y, rows, kwargs):
+    '''Helper function that finds a box on a subset of the data, and 
+    returns the coverage and density, and the restricted dimensions
+    for each box on the peeling trajectory'''
+    x = x.loc[rows, :].reset_index(drop=True)
+
+    with temporary_filter(ema_logging.LOGGER_NAME, INFO, 'find_box'):
+        box = Prim(x, y[rows], **kwargs).find_box()
+
+    trajectory = box.peeling_trajectory[['coverage', 'density']]
+    restrictions = [sdutil._determine_restricted_dims(box_lim,
+                                                      box.prim.box_init)
+                    for box_lim in box.box_lims]
+    return trajectory, restrictions
 
 
 class CurEntry(object):
@@ -344,9 +507,13 @@ class PrimBox(object):
         self.peeling_trajectory = pd.DataFrame(columns=colums)
 
         self.box_lims = []
-        self.qp = []
+        self._qp = {}
         self._resampled = []
         self.yi_initial = indices[:]
+
+        # the data the box is found on, for the quasi-p values
+        self._y_initial = self.prim.y[self.yi_initial]
+        self._in_box = None
         
         columns = ['name', 'lower', 'upper', 'minimum', 'maximum',
                    'qp_lower', 'qp_upper', 'id']
@@ -394,7 +561,7 @@ class PrimBox(object):
         stats = self.peeling_trajectory.iloc[i].to_dict()
         stats['restricted_dim'] = stats['res_dim']
         
-        qp_values = self.qp[i]
+        qp_values = self._calculate_quasi_p(i)
             
         uncs = [(key, value) for key, value in qp_values.items()]
         uncs.sort(key=itemgetter(1))
@@ -580,7 +747,8 @@ class PrimBox(object):
         return chart & layered
     
     
-    def resample(self, i=None, iterations=10, p=1/2):
+    def resample(self, i=None, iterations=10, p=1/2, seed=None,
+                 n_processes=1):
         '''Calculate resample statistics for candidate box i
         
         Parameters
@@ -588,33 +756,67 @@ class PrimBox(object):
         i : int, optional
         iterations : int, optional
         p : float, optional
+        seed : int, optional
+               seed for the random selection of the subsets, use for 
+               reproducible results
+        n_processes : int, optional
+                      the number of processes over which the resampling
+                      is distributed, use None for all cores. Only index
+                      arrays are sent to the processes, the data itself
+                      is shared once when the processes start.
         
         
         Returns
         -------
         DataFrame
+
+        Notes
+        -----
+        Boxes found in earlier calls are reused, so only the missing 
+        iterations are added.
         
         '''
         if i == None:
             i = self._cur_box
 
-        x = self.prim.x.loc[self.yi_initial, :]
-        y = self.prim.y[self.yi_initial]
-        
-        if len(self._resampled) < iterations: 
-            with temporary_filter(ema_logging.LOGGER_NAME, INFO, 'find_box'):
-                for j in range(len(self._resampled), iterations):
-                    _logger.info('resample {}'.format(j))
-                    index = np.random.choice(x.index, size=int(x.shape[0]*p),
-                                             replace=False)
-                    x_temp = x.loc[index, :].reset_index(drop=True)
-                    y_temp = y[index]
-                    
-                    box = Prim(x_temp, y_temp, threshold=0.1,
-                               peel_alpha=self.prim.peel_alpha,
-                               paste_alpha=self.prim.paste_alpha).find_box()
-                    self._resampled.append(box)
-        
+        x = self.prim.x
+        y = self.prim.y
+        n = self.yi_initial.shape[0]
+        size = int(n*p)
+
+        if len(self._resampled) < iterations:
+            if seed is None:
+                rng = np.random
+                first = len(self._resampled)
+            else:
+                # always draw all subsets, so subset j only depends on the
+                # seed and not on boxes found in earlier calls
+                rng = np.random.RandomState(seed)
+                first = 0
+
+            samples = [self.yi_initial[rng.choice(n, size=size,
+                                                  replace=False)]
+                       for _ in range(first, iterations)]
+            samples = samples[len(self._resampled)-first:]
+
+            kwargs = dict(threshold=0.1, peel_alpha=self.prim.peel_alpha,
+                          paste_alpha=self.prim.paste_alpha)
+
+            if n_processes == 1:
+                results = (_find_resample_box(x, y, rows, kwargs) for rows
+                           in samples)
+                self._collect_resampled(results, iterations)
+            else:
+                pool = multiprocessing.Pool(n_processes,
+                                            _resample_initializer,
+                                            (x, y, kwargs))
+                try:
+                    results = pool.imap(_resample_worker, samples)
+                    self._collect_resampled(results, iterations)
+                finally:
+                    pool.close()
+                    pool.join()
+
         counters = []
         for _ in range(2):
             counter = {column:0.0 for column in x.columns}
@@ -623,22 +825,86 @@ class PrimBox(object):
         coverage = self.peeling_trajectory.coverage[i]
         density = self.peeling_trajectory.density[i]
         
-        for box in self._resampled:
-            coverage_index = (box.peeling_trajectory.coverage-coverage).abs().idxmin()
-            density_index = (box.peeling_trajectory.density-density).abs().idxmin()
+        for trajectory, restrictions in self._resampled[0:iterations]:
+            coverage_index = (trajectory.coverage-coverage).abs().idxmin()
+            density_index = (trajectory.density-density).abs().idxmin()
             for counter, index in zip(counters, [coverage_index,
                                                  density_index]):
-                for unc in box.qp[index].keys():
+                for unc in restrictions[index]:
                     counter[unc]+=1/iterations
         
         scores = pd.DataFrame(counters,
                               index=['reproduce coverage',
                                      'reproduce density'],
-                              columns=box.box_lim.columns).T*100
+                              columns=x.columns).T*100
         return scores.sort_values(by=['reproduce coverage',
                                       'reproduce density'],
                       ascending=False)
 
+    def _collect_resampled(self, results, iterations):
+        '''helper function for storing resampled boxes, while 
+        reporting progress'''
+        for result in results:
+            self._resampled.append(result)
+            _logger.info('resample {} of {} completed'.format(
+                                        len(self._resampled), iterations))
+
+    def bootstrap(self, i=None, iterations=1000, confidence=0.95,
+                  seed=None):
+        '''Calculate bootstrap confidence intervals on the coverage and
+        density of candidate box i
+        
+        Parameters
+        ----------
+        i : int, optional
+        iterations : int, optional
+                     the number of bootstrap samples
+        confidence : float, optional
+                     the confidence level of the intervals
+        seed : int, optional
+        
+        Returns
+        -------
+        DataFrame
+            with the coverage and density as rows, and their value and
+            the lower and upper bound of the confidence interval as
+            columns
+        
+        '''
+        if i == None:
+            i = self._cur_box
+
+        y = self.prim.y
+        n = y.shape[0]
+        if self.prim.threshold_type == ABOVE:
+            coi = y >= self.prim.threshold
+        else:
+            coi = y <= self.prim.threshold
+
+        box_lim = self.box_lims[i]
+        in_box = np.zeros((n, ), dtype=bool)
+        in_box[self.yi_initial] = sdutil._in_box(
+                            self.prim.x.loc[self.yi_initial, :], box_lim)
+        coi_in_box = coi & in_box
+
+        rng = np.random.RandomState(seed)
+        values = np.empty((iterations, 2))
+        for j in range(iterations):
+            weights = np.bincount(rng.randint(0, n, n), minlength=n)
+            coi_count = weights.dot(coi_in_box)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                values[j] = (coi_count/weights.dot(coi),
+                             coi_count/weights.dot(in_box))
+
+        alpha = (1-confidence)/2
+        lower, upper = np.nanpercentile(values, [alpha*100, (1-alpha)*100],
+                                        axis=0)
+        stats = pd.DataFrame({'value': [coi_in_box.sum()/coi.sum(),
+                                        coi_in_box.sum()/in_box.sum()],
+                              'lower': lower, 'upper': upper},
+                             index=['coverage', 'density'])
+        return stats[['value', 'lower', 'upper']]
+
     
     def select(self, i):
         '''        
@@ -720,9 +986,6 @@ class PrimBox(object):
         self.peeling_trajectory = self.peeling_trajectory.append(new_row,
                                             ignore_index=True,sort=True)
 
-        # boxlims
-        qp = self._calculate_quasi_p(i, restricted_dims)
-        self.qp.append(qp)
         self._cur_box = len(self.peeling_trajectory)-1
 
     def show_ppt(self):
@@ -820,10 +1083,11 @@ class PrimBox(object):
         print(self.peeling_trajectory)
         print("\n")
 
-    def _calculate_quasi_p(self, i, restricted_dims):
+    def _calculate_quasi_p(self, i):
         '''helper function for calculating quasi-p values as discussed
         in Bryant and Lempert (2010). This is a one sided  binomial
-        test. 
+        test. The values are cached for each box on the peeling 
+        trajectory.
 
         Parameters
         ----------
@@ -836,27 +1100,69 @@ class PrimBox(object):
         dict
 
         '''
+        i = range(len(self.box_lims))[i]
+        try:
+            return self._qp[i]
+        except KeyError:
+            pass
 
         box_lim = self.box_lims[i]
-        box_lim = box_lim[restricted_dims]
+        restricted_dims = sdutil._determine_restricted_dims(
+                                            box_lim, self.prim.box_init)
+        qp_values = {}
+        self._qp[i] = qp_values
+        if restricted_dims.shape[0] == 0:
+            return qp_values
+
+        if self._in_box is None:
+            x = self.prim.x.loc[self.yi_initial, :]
+            self._in_box = sdutil._BoxMembership(x)
 
         # total nr. of cases in box
-        Tbox = self.peeling_trajectory['mass'][i] * self.prim.n
+        Tbox = int(round(self.peeling_trajectory['mass'][i] * self.prim.n))
 
         # total nr. of cases of interest in box
-        Hbox = self.peeling_trajectory['coverage'][i] * self.prim.t_coi
-
-        x = self.prim.x.loc[self.prim.yi_remaining, restricted_dims]
-        y = self.prim.y[self.prim.yi_remaining]
+        Hbox = int(round(self.peeling_trajectory['coverage'][i] *
+                         self.prim.t_coi))
+
+        # for each limit of the box, the data points satisfying it; data
+        # points in the box with one limit relaxed violate at most that
+        # limit
+        satisfied = self._in_box.limits_satisfied(box_lim, restricted_dims)
+        nr_violated = satisfied.shape[0] - satisfied.sum(axis=0)
+        in_box = nr_violated == 0
+        single = ~satisfied[:, nr_violated == 1]
+
+        # y can be boolean, in which case dot would be a logical or
+        y = self._y_initial.astype(float)
+        Tj = in_box.sum() + single.sum(axis=1)
+        Hj = y[in_box].sum() + single.dot(y[nr_violated == 1])
+
+        # force one sided
+        with np.errstate(invalid='ignore', divide='ignore'):
+            p = Hj/Tj
+        qp = binom.sf(Hbox-1, Tbox, p)
+        qp = qp.reshape((-1, 2))
+
+        # only limits that differ from the initial box have a qp value
+        initial_lim = self.box_lims[0]
+        for k, u in enumerate(restricted_dims):
+            if u in self.prim.x_nominal_columns:
+                relaxed = [True, False]
+            else:
+                relaxed = box_lim[u].values != initial_lim[u].values
+            qp_values[u] = [value if entry else -1 for value, entry in
+                            zip(qp[k].tolist(), relaxed)]
 
-        ## TODO use apply on df?
-        
-        qp_values = box_lim.apply(calculate_qp, axis=0, result_type='expand', 
-                                  args=[x, y, Hbox, Tbox, box_lim,
-                                        self.box_lims[0]])
-        qp_values = qp_values.to_dict(orient='list')
         return qp_values
 
+    @property
+    def qp(self):
+        '''list with the quasi-p values of each box on the peeling
+        trajectory'''
+        return [self._calculate_quasi_p(i) for i in
+                range(len(self.box_lims))]
+
 #     def _format_stats(self, nr, stats):
 #         '''helper function for formating box stats'''
 #         row = self.stats_format.format(nr, **stats)
@@ -928,11 +1234,11 @@ class Prim(sdutil.OutputFormatterMixin):
         except KeyError:
             pass
         
-        x_float = x.select_dtypes(np.float)
+        x_float = x.select_dtypes(float)
         self.x_float = x_float.values
         self.x_float_colums = x_float.columns.values
         
-        x_int = x.select_dtypes(np.int)
+        x_int = x.select_dtypes(int)
         self.x_int = x_int.values
         self.x_int_columns = x_int.columns.values
         
@@ -950,10 +1256,41 @@ class Prim(sdutil.OutputFormatterMixin):
         for column in self.x_nominal_columns:
             x[column] = x[column].astype('category')
 
+        # presort the numeric columns once, peeling only has to select the
+        # data points in the box from the sorted columns
+        self._x_numeric = np.hstack([self.x_float,
+                                     self.x_int]).astype(float)
+        self._order = np.argsort(self._x_numeric, axis=0, kind='mergesort').T
+        self._x_sorted = self._x_numeric.T[
+            np.arange(self._order.shape[0])[:, np.newaxis], self._order]
+
+        self._x_codes = np.column_stack(
+            [x[column].cat.codes.values for column in self.x_nominal_columns]
+            + [np.zeros((x.shape[0], 0), dtype=int)])
+        self._categories = [x[column].cat.categories for column in
+                            self.x_nominal_columns]
+
         self.x = x
+
+        # set the indices
+        self.yi = x.index.values
+
+        # initial box that contains all data
+        self.box_init = sdutil._make_box(self.x)
+
+        self._set_parameters(y, threshold, obj_function, peel_alpha,
+                             paste_alpha, mass_min, threshold_type, mode,
+                             update_function)
+
+    def _set_parameters(self, y, threshold, obj_function, peel_alpha,
+                        paste_alpha, mass_min, threshold_type, mode,
+                        update_function):
+        '''helper function for setting y and the parameters of the
+        algorithm, and for resetting the boxes'''
         self.y = y
         self.mode = mode
 
+        self._update_function = update_function
         self._update_yi_remaining = self._update_functions[update_function]
 
         if len(self.y.shape) > 1:
@@ -965,25 +1302,33 @@ class Prim(sdutil.OutputFormatterMixin):
         self.mass_min = mass_min
         self.threshold = threshold
         self.threshold_type = threshold_type
+        self._obj_function = obj_function
         self.obj_func = self._obj_functions[obj_function]
 
-        # set the indices
-        self.yi = x.index.values
-
         # how many data points do we have
         self.n = self.y.shape[0]
 
         # how many cases of interest do we have?
         self.t_coi = self.determine_coi(self.yi)
 
-        # initial box that contains all data
-        self.box_init = sdutil._make_box(self.x)
-
         # make a list in which the identified boxes can be put
         self._boxes = []
 
         self._update_yi_remaining(self)
 
+    def _derive(self, y, threshold, peel_alpha):
+        '''returns a new Prim instance for y, threshold and peel_alpha,
+        with the other parameters of this instance. The preprocessed
+        x is shared with this instance.'''
+        assert self._assert_mode(y, self.mode, self._update_function)
+
+        prim = copy.copy(self)
+        prim._set_parameters(y, threshold, self._obj_function, peel_alpha,
+                             self.paste_alpha, self.mass_min,
+                             self.threshold_type, self.mode,
+                             self._update_function)
+        return prim
+
     @property
     def boxes(self):
         boxes = [box.box_lim for box in self._boxes]
@@ -1201,7 +1546,7 @@ class Prim(sdutil.OutputFormatterMixin):
         '''
 
         # set the indices
-        logical = np.ones(self.yi.shape[0], dtype=np.bool)
+        logical = np.ones(self.yi.shape[0], dtype=bool)
         for box in self._boxes:
             logical[box.yi] = False
         self.yi_remaining = self.yi[logical]
@@ -1223,294 +1568,288 @@ class Prim(sdutil.OutputFormatterMixin):
     def _peel(self, box):
         '''
 
-        Executes the peeling phase of the PRIM algorithm. Delegates
-        peeling to data type specific helper methods.
+        Executes the peeling phase of the PRIM algorithm. In each step,
+        all candidate peels are scored in one vectorized pass over the
+        presorted data, and the best one is applied to the box.
 
         '''
+        limits, allowed = self._box_to_arrays(box.box_lims[-1])
+        init_limits, init_allowed = self._box_to_arrays(self.box_init)
 
-        mass_old = box.yi.shape[0]/self.n
+        # y in the presorted order of each numeric column
+        y_sorted = self.y[self._order]
 
-        x_float = self.x_float[box.yi]
-        x_int = self.x_int[box.yi]
-        x_nominal = self.x_nominal[box.yi]
+        mask = np.zeros(self.n, dtype=bool)
+        mask[box.yi] = True
 
-        # identify all possible peels
-        possible_peels = []
-        
-        for x, columns, dtype,  in [(x_float, self.x_float_colums,
-                                     'float'),
-                                    (x_int, self.x_int_columns,
-                                     'int'),
-                                    (x_nominal, self.x_nominal_columns,
-                                     'object')]:
-            for j, u in enumerate(columns):
-                peels = self._peels[dtype](self, box, u, j, x)
-                [possible_peels.append(entry) for entry in peels]
-        
-        
-        if not possible_peels:
-            # there is no peel identified, so return box
-            return box
-
-        # determine the scores for each peel in order
-        # to identify the next candidate box
-        scores = []
-        for entry in possible_peels:
-            i, box_lim = entry
-            obj = self.obj_func(self, self.y[box.yi],  self.y[i])
-            non_res_dim = self.n_cols -\
-                sdutil._determine_nr_restricted_dims(box_lim,
-                                                     self.box_init)
-            score = (obj, non_res_dim, box_lim, i)
-            scores.append(score)
-
-        scores.sort(key=itemgetter(0, 1), reverse=True)
-        entry = scores[0]
-
-        obj_score = entry[0]
-        box_new, indices = entry[2:]
-
-        mass_new = self.y[indices].shape[0]/self.n
-
-        if (mass_new >= self.mass_min) &\
-           (mass_new < mass_old) &\
-           (obj_score > 0):
-            box.update(box_new, indices)
-            return self._peel(box)
-        else:
-            # else return received box
-            return box
+        while True:
+            mass_old = box.yi.shape[0]/self.n
 
-    def _real_peel(self, box, u, j, x):
-        '''
-
-        returns two candidate new boxes, peel along upper and lower
-        dimension
-
-        Parameters
-        ----------
-        box : a PrimBox instance
-        u : str
-            the uncertainty for which to peel
-        j : int
-            column for which to peel
-        x : ndarray
-
-        Returns
-        -------
-        tuple
-            two box lims and the associated indices
-
-        '''
-
-        peels = []
-        for direction in ['upper', 'lower']:
-            xj = x[:, j]
-
-            peel_alpha = self.peel_alpha
+            candidates = self._peel_candidates(box, mask, y_sorted, limits,
+                                               allowed, init_limits,
+                                               init_allowed)
+            if candidates is None:
+                # there is no peel identified, so return box
+                return box
+            obj, n_new, non_res_dim, peels = candidates
+
+            # sort on objective and nr. of non restricted dimensions, ties
+            # are resolved in favor of the first candidate
+            order = np.lexsort((np.arange(obj.shape[0]), -non_res_dim,
+                                -obj))
+            best = order[0]
+            mass_new = n_new[best]/self.n
+
+            if not ((mass_new >= self.mass_min) &
+                    (mass_new < mass_old) &
+                    (obj[best] > 0)):
+                # else return received box
+                return box
 
-            i = 0
-            if direction == 'upper':
-                peel_alpha = 1-self.peel_alpha
-                i = 1
+            kind, j, value, threshold, strict = peels[best]
+            box_lim = box.box_lims[-1].copy()
 
-            box_peel = get_quantile(xj, peel_alpha)
-            if direction == 'lower':
-                logical = xj >= box_peel
-                indices = box.yi[logical]
-            if direction == 'upper':
-                logical = xj <= box_peel
-                indices = box.yi[logical]
-            temp_box = copy.deepcopy(box.box_lims[-1])
-            temp_box.loc[i, u] = box_peel
-            peels.append((indices, temp_box))
+            if kind == 'nominal':
+                logical = self._x_codes[box.yi, j] != value
+                allowed[j][value] = False
+                u = self.x_nominal_columns[j]
+                entries = box_lim.loc[0, u] - {self._categories[j][value]}
+                box_lim[u] = [entries, entries]
+            else:
+                side = 0 if kind == 'lower' else 1
+                xj = self._x_numeric[box.yi, j]
+                if side == 0:
+                    logical = xj > threshold if strict else xj >= threshold
+                else:
+                    logical = xj < threshold if strict else xj <= threshold
+                limits[side, j] = value
 
+                if j >= self.x_float_colums.shape[0]:
+                    value = int(value)
+                box_lim.loc[side, self.x_numeric_columns[j]] = value
 
-        return peels
+            mask[box.yi[~logical]] = False
+            box.update(box_lim, box.yi[logical])
 
-    def _discrete_peel(self, box, u, j,  x):
+    def _peel_candidates(self, box, mask, y_sorted, limits, allowed,
+                         init_limits, init_allowed):
         '''
 
-        returns two candidate new boxes, peel along upper and lower
-        dimension
+        Determine the objective score, the resulting nr. of data points,
+        and the nr. of non restricted dimensions of all possible peels
+        of the box.
 
         Parameters
         ----------
         box : a PrimBox instance
-        u : str
-            the uncertainty for which to peel
-        j : int
-            column for which to peel
-        x : ndarray
+        mask : 1D boolean ndarray
+               the membership of the data points in the box
+        y_sorted : 2D ndarray
+                   y in the presorted order of each numeric column
+        limits : 2D ndarray
+                 the lower and upper limits of the numeric columns
+        allowed : list of boolean ndarrays
+                  the categories in the box for each nominal column
+        init_limits : 2D ndarray
+        init_allowed : list of boolean ndarrays
 
         Returns
         -------
         tuple
-            two box lims and the associated indices
+            objective scores, nr. of data points, nr. of non restricted
+            dimensions, and a list with for each peel a tuple of kind,
+            column, new limit, threshold, and strict, or None if there
+            are no possible peels
 
         '''
+        m = box.yi.shape[0]
+        n_numeric = self._x_numeric.shape[1]
+
+        numeric_restricted = (limits != init_limits).any(axis=0)
+        nominal_restricted = np.asarray([np.any(a != b) for a, b in
+                                         zip(allowed, init_allowed)],
+                                        dtype=bool)
+        nr_restricted = numeric_restricted.sum() + nominal_restricted.sum()
+
+        objs = []
+        sizes = []
+        non_res_dims = []
         peels = []
-        for direction in ['upper', 'lower']:
-            peel_alpha = self.peel_alpha
-            xj = x[:, j]
-            box_lim = box.box_lims[-1]
-
-            i = 0
-            if direction == 'upper':
-                peel_alpha = 1-self.peel_alpha
-                i = 1
-
-            box_peel = get_quantile(xj, peel_alpha)
-            box_peel = int(box_peel)
-
-            # determine logical associated with peel value
-            if direction == 'lower':
-                if box_peel == box_lim.loc[i, u]:
-                    logical = (xj > box_lim.loc[i, u]) &\
-                              (xj <= box_lim.loc[i+1, u])
-                else:
-                    logical = (xj >= box_peel) &\
-                              (xj <= box_lim.loc[i+1, u])
-            if direction == 'upper':
-                if box_peel == box_lim.loc[i, u]:
-                    logical = (xj < box_lim.loc[i, u]) &\
-                              (xj >= box_lim.loc[i-1, u])
-                else:
-                    logical = (xj <= box_peel) &\
-                              (xj >= box_lim.loc[i-1, u])
-
-            # determine value of new limit given logical
-            if xj[logical].shape[0] == 0:
-                if direction == 'upper':
-                    new_limit = np.max(xj)
-                else:
-                    new_limit = np.min(xj)
-            else:
-                if direction == 'upper':
-                    new_limit = np.max(xj[logical])
-                else:
-                    new_limit = np.min(xj[logical])
-
-            indices = box.yi[logical]
-            temp_box = copy.deepcopy(box_lim)
-            temp_box.loc[i, u] = new_limit
-            peels.append((indices, temp_box))
 
-        return peels
-
-    def _categorical_peel(self, box, u, j, x):
+        if n_numeric:
+            # the sorted data in the box for each numeric column, the
+            # presorted order is retained by the boolean mask
+            mask_sorted = mask[self._order]
+            x = self._x_sorted[mask_sorted].reshape(n_numeric, m)
+            y = y_sorted[mask_sorted].reshape(n_numeric, m)
+            y_cum = np.zeros((n_numeric, m+1))
+            np.cumsum(y, axis=1, out=y_cum[:, 1:])
+            rows = np.arange(n_numeric)
+            discrete = rows >= self.x_float_colums.shape[0]
+
+            upper = _sorted_quantiles(x, 1-self.peel_alpha)
+            lower = _sorted_quantiles(x, self.peel_alpha)
+            upper[discrete] = np.trunc(upper[discrete])
+            lower[discrete] = np.trunc(lower[discrete])
+
+            # for discrete columns, a peel value equal to the current
+            # limit means that the limit itself is peeled off
+            upper_strict = discrete & (upper == limits[1])
+            lower_strict = discrete & (lower == limits[0])
+
+            n_upper = np.where(upper_strict,
+                               _sorted_counts(x, upper, 'left'),
+                               _sorted_counts(x, upper, 'right'))
+            n_removed = np.where(lower_strict,
+                                 _sorted_counts(x, lower, 'right'),
+                                 _sorted_counts(x, lower, 'left'))
+            n_lower = m - n_removed
+
+            # the new limits of discrete columns are the remaining extremes
+            new_upper = np.where(discrete,
+                                 x[rows, np.where(n_upper > 0, n_upper-1,
+                                                  m-1)], upper)
+            new_lower = np.where(discrete,
+                                 x[rows, np.where(n_lower > 0, n_removed,
+                                                  0)], lower)
+
+            total = y_cum[:, m]
+            mean_old = total/m
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean_upper = y_cum[rows, n_upper]/n_upper
+                mean_lower = (total-y_cum[rows, n_removed])/n_lower
+
+            res_upper = (new_upper != init_limits[1]) |\
+                        (limits[0] != init_limits[0])
+            res_lower = (new_lower != init_limits[0]) |\
+                        (limits[1] != init_limits[1])
+            nr_res = nr_restricted - numeric_restricted
+
+            # for each column first the upper, next the lower peel
+            obj = np.column_stack([
+                    self.obj_func(self, mean_old, m, mean_upper, n_upper),
+                    self.obj_func(self, mean_old, m, mean_lower, n_lower)])
+            objs.append(obj.ravel())
+            sizes.append(np.column_stack([n_upper, n_lower]).ravel())
+            non_res_dims.append(self.n_cols - np.column_stack(
+                [nr_res + res_upper, nr_res + res_lower]).ravel())
+
+            for j in range(n_numeric):
+                peels.append(('upper', j, new_upper[j], upper[j],
+                              upper_strict[j]))
+                peels.append(('lower', j, new_lower[j], lower[j],
+                              lower_strict[j]))
+
+        if self.x_nominal_columns.shape[0]:
+            y = self.y[box.yi]
+            total = y.sum()
+
+            for j, categories in enumerate(self._categories):
+                entries = np.flatnonzero(allowed[j])
+                if entries.shape[0] < 2:
+                    continue
+
+                codes = self._x_codes[box.yi, j]
+                counts = np.bincount(codes, minlength=categories.shape[0])
+                sums = np.bincount(codes, weights=y,
+                                   minlength=categories.shape[0])
+
+                n_new = m - counts[entries]
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    mean_new = (total - sums[entries])/n_new
+
+                objs.append(self.obj_func(self, total/m, m, mean_new,
+                                          n_new))
+                sizes.append(n_new)
+                non_res_dims.append(np.repeat(self.n_cols - (
+                    nr_restricted - nominal_restricted[j] + 1),
+                                              entries.shape[0]))
+                peels.extend(('nominal', j, entry, None, False)
+                             for entry in entries)
+
+        if not peels:
+            return None
+
+        return (np.concatenate(objs), np.concatenate(sizes),
+                np.concatenate(non_res_dims), peels)
+
+    def _box_to_arrays(self, box_lim):
         '''
 
-        returns candidate new boxes for each possible removal of a
-        single  category. So. if the box[u] is a categorical variable
-        with 4 categories, this method will return 4 boxes. 
-
-        Parameters
-        ----------
-        box : a PrimBox instance
-        u : str
-            the uncertainty for which to peel
-        j : int
-            column for which to peel
-        x : ndarray
-
-        Returns
-        -------
-        tuple
-            a list of box lims and the associated indices
+        Helper function that turns box limits into a 2D array with the
+        limits of the numeric columns, and a list with a boolean array
+        of the categories in the box for each nominal column.
 
         '''
-        entries = box.box_lims[-1].loc[0, u]
-
-        if len(entries) > 1:
-            peels = []
-            for entry in entries:
-                bools = []
-                
-                temp_box = box.box_lims[-1].copy()
-                peel = copy.deepcopy(entries)
-                peel.discard(entry)
-                temp_box[u] = [peel, peel]
-
-                if type(list(entries)[0]) not in (str, float,
-                                                  int, bool):
-                    for element in x[u]:
-                        if element != entry:
-                            bools.append(True)
-                        else:
-                            bools.append(False)
-                    logical = np.asarray(bools, dtype=bool)
-                else:
-                    logical = x[:, j] != entry
-                indices = box.yi[logical]
-                peels.append((indices,  temp_box))
-            return peels
-        else:
-            # no peels possible, return empty list
-            return []
+        limits = box_lim[self.x_numeric_columns].values.astype(float)
+        allowed = [categories.isin(box_lim.loc[0, u]) for categories, u in
+                   zip(self._categories, self.x_nominal_columns)]
+        return limits, allowed
 
     def _paste(self, box):
         ''' Executes the pasting phase of the PRIM. Delegates pasting
         to data type specific helper methods.'''
 
-        mass_old = box.yi.shape[0]/self.n
-
-        # need to break this down by dtype
-        restricted_dims = sdutil._determine_restricted_dims(box.box_lims[-1],
-                                                    self.box_init)
-        res_dim = set(restricted_dims)
-
         x = self.x.loc[self.yi_remaining, :]
-
-        # identify all possible pastes
-        possible_pastes = []
-        for columns, dtype,  in [(self.x_float_colums,
-                                     'float'),
-                                    (self.x_int_columns,
-                                     'int'),
-                                    (self.x_nominal_columns,
-                                     'object')]:
-            for i, u in enumerate(columns):
-                if u not in res_dim: continue
-                debug("pasting "+u)
-                pastes = self._pastes[dtype](self, box, u, x,
-                                             restricted_dims)
-                [possible_pastes.append(entry) for entry in pastes]
-            if not possible_pastes:
-                # there is no peel identified, so return box
+        in_box = sdutil._BoxMembership(x)
+
+        while True:
+            mass_old = box.yi.shape[0]/self.n
+
+            # need to break this down by dtype
+            restricted_dims = sdutil._determine_restricted_dims(
+                                        box.box_lims[-1], self.box_init)
+            res_dim = set(restricted_dims)
+
+            # identify all possible pastes
+            possible_pastes = []
+            for columns, dtype,  in [(self.x_float_colums, 'float'),
+                                     (self.x_int_columns, 'int'),
+                                     (self.x_nominal_columns, 'object')]:
+                for u in columns:
+                    if u not in res_dim: continue
+                    debug("pasting "+u)
+                    pastes = self._pastes[dtype](self, box, u, x,
+                                                 restricted_dims, in_box)
+                    possible_pastes.extend(pastes)
+                if not possible_pastes:
+                    # there is no paste identified, so return box
+                    return box
+
+            # determine the scores for each paste in order
+            # to identify the next candidate box
+            y_old = self.y[box.yi]
+            mean_old = np.mean(y_old)
+            means = []
+            sizes = []
+            non_res_dims = []
+            for i, box_lim in possible_pastes:
+                y_new = self.y[i]
+                means.append(np.mean(y_new) if y_new.shape[0] else 0)
+                sizes.append(y_new.shape[0])
+                non_res_dims.append(len(x.columns) -\
+                    sdutil._determine_nr_restricted_dims(box_lim,
+                                                         self.box_init))
+            means = np.asarray(means)
+            sizes = np.asarray(sizes)
+            obj = self.obj_func(self, mean_old, y_old.shape[0], means, sizes)
+
+            best = np.lexsort((np.arange(obj.shape[0]),
+                               -np.asarray(non_res_dims), -obj))[0]
+            indices, box_new = possible_pastes[best]
+            mass_new = sizes[best]/self.n
+            mean_new = means[best]
+
+            if (mass_new >= self.mass_min) &\
+               (mass_new > mass_old) &\
+               (obj[best] > 0) &\
+               (mean_new > mean_old):
+                box.update(box_new, indices)
+            else:
+                # else return received box
                 return box
 
-        # determine the scores for each peel in order
-        # to identify the next candidate box
-        scores = []
-        for entry in possible_pastes:
-            i, box_lim = entry
-            obj = self.obj_func(self, self.y[box.yi],  self.y[i])
-            non_res_dim = len(x.columns) -\
-                sdutil._determine_nr_restricted_dims(box_lim,
-                                                     self.box_init)
-            score = (obj, non_res_dim, box_lim, i)
-            scores.append(score)
-
-        scores.sort(key=itemgetter(0, 1), reverse=True)
-        entry = scores[0]
-        obj, _, box_new, indices = entry
-        mass_new = self.y[indices].shape[0]/self.n
-
-        mean_old = np.mean(self.y[box.yi])
-        mean_new = np.mean(self.y[indices])
-
-        if (mass_new >= self.mass_min) &\
-           (mass_new > mass_old) &\
-           (obj > 0) &\
-           (mean_new > mean_old):
-            box.update(box_new, indices)
-            return self._paste(box)
-        else:
-            # else return received box
-            return box
-
-    def _real_paste(self, box, u, x, resdim):
+    def _real_paste(self, box, u, x, resdim, in_box=None):
         ''' returns two candidate new boxes, pasted along upper and
         lower dimension
 
@@ -1519,7 +1858,11 @@ class Prim(sdutil.OutputFormatterMixin):
         box : a PrimBox instance
         u : str
             the uncertainty for which to peel
-        x : ndarray
+        x : DataFrame
+        resdim : list of str
+                 the restricted dimensions of the box
+        in_box : sdutil._BoxMembership instance, optional
+                 precompiled membership test for x
 
         
         Returns
@@ -1528,53 +1871,49 @@ class Prim(sdutil.OutputFormatterMixin):
             two box lims and the associated indices
 
         '''
+        if in_box is None:
+            in_box = sdutil._BoxMembership(x)
 
-        pastes = []
         boxlim = box.box_lims[-1]
-        
-        for i, direction in enumerate(['lower', 'upper']):
+        minimum, maximum = self.box_init[u].values
+
+        # boxes containing data candidate for pasting
+        lower_box = boxlim.copy()
+        lower_box.loc[:, u] = minimum, boxlim.loc[0, u]
+        upper_box = boxlim.copy()
+        upper_box.loc[:, u] = boxlim.loc[1, u], maximum
+        logical = in_box.in_boxes([lower_box, upper_box], resdim)
+
+        xu = x[u].values
+        data = xu[logical[0]]
+        paste_value = minimum
+        if data.size > 0:
+            paste_value = get_quantile(data, 1-self.paste_alpha)
+        assert paste_value <= boxlim.loc[0, u]
+        paste_values = [paste_value]
+
+        data = xu[logical[1]]
+        paste_value = maximum
+        if data.size > 0:
+            paste_value = get_quantile(data, self.paste_alpha)
+        assert paste_value >= boxlim.loc[1, u]
+        paste_values.append(paste_value)
+
+        box_pastes = []
+        for i, paste_value in enumerate(paste_values):
             box_paste = boxlim.copy()
-            # box containing data candidate for pasting
-            paste_box = boxlim.copy()
-
-            minimum, maximum = self.box_init[u].values
-
-            if direction == 'lower':
-                paste_box.loc[:, u] = minimum, box_paste.loc[0, u]
-
-                indices = sdutil._in_box(x[resdim], paste_box[resdim])
-                data = x.loc[indices, u]
-
-                paste_value = minimum
-                if data.size > 0:
-                    paste_value = get_quantile(data, 1-self.paste_alpha)
-
-                assert paste_value <= boxlim.loc[i, u]
-            else:  #direction == 'upper':
-                paste_box.loc[:, u] = paste_box.loc[1, u], maximum
-                
-                indices = sdutil._in_box(x[resdim], paste_box[resdim])
-                data = x.loc[indices, u]
-
-                paste_value = maximum
-                if data.size > 0:
-                    paste_value = get_quantile(data, self.paste_alpha)
-
-                assert paste_value >= box.box_lims[-1].loc[i, u]
-
             dtype = box_paste[u].dtype
             if dtype == np.int32:
-                paste_value = np.int(paste_value)
+                paste_value = int(paste_value)
 
             box_paste.loc[i, u] = paste_value
-            logical = sdutil._in_box(x[resdim], box_paste[resdim])
-            indices = self.yi_remaining[logical]
+            box_pastes.append(box_paste)
 
-            pastes.append((indices, box_paste))
+        logical = in_box.in_boxes(box_pastes, resdim)
+        return [(self.yi_remaining[l], box_paste) for l, box_paste in
+                zip(logical, box_pastes)]
 
-        return pastes
-
-    def _categorical_paste(self, box, u, x, resdim):
+    def _categorical_paste(self, box, u, x, resdim, in_box=None):
         '''
 
         Return a list of pastes, equal to the number of classes currently
@@ -1585,7 +1924,11 @@ class Prim(sdutil.OutputFormatterMixin):
         box : a PrimBox instance
         u : str
             the uncertainty for which to peel
-        x : ndarray
+        x : DataFrame
+        resdim : list of str
+                 the restricted dimensions of the box
+        in_box : sdutil._BoxMembership instance, optional
+                 precompiled membership test for x
 
 
         Returns
@@ -1601,7 +1944,10 @@ class Prim(sdutil.OutputFormatterMixin):
         c_t = self.box_init.loc[0, u]
 
         if len(c_in_b) < len(c_t):
-            pastes = []
+            if in_box is None:
+                in_box = sdutil._BoxMembership(x)
+
+            box_pastes = []
             possible_cs = c_t - c_in_b
             for entry in possible_cs:
                 paste = copy.deepcopy(c_in_b)
@@ -1609,17 +1955,16 @@ class Prim(sdutil.OutputFormatterMixin):
 
                 box_paste = box_lim.copy()
                 box_paste.loc[:, u] = [paste, paste]
+                box_pastes.append(box_paste)
 
-                indices = sdutil._in_box(x[resdim], 
-                                         box_paste[resdim])
-                indices = self.yi_remaining[indices]
-                pastes.append((indices, box_paste))
-            return pastes
+            logical = in_box.in_boxes(box_pastes, resdim)
+            return [(self.yi_remaining[l], box_paste) for l, box_paste in
+                    zip(logical, box_pastes)]
         else:
             # no pastes possible, return empty list
             return []
 
-    def _lenient1_obj_func(self, y_old, y_new):
+    def _lenient1_obj_func(self, mean_old, n_old, mean_new, n_new):
         r'''
         the default objective function used by prim, instead of the
         original objective function, This function can cope with
@@ -1643,61 +1988,35 @@ class Prim(sdutil.OutputFormatterMixin):
         function often results in boxes mainly based on the categorical
         data.  
 
+        The objective functions operate on the mean and number of data
+        points of the old box and of an array of candidate new boxes.
+
         '''
-        mean_old = np.mean(y_old)
+        mean_new = np.where(n_new > 0, mean_new, 0)
+        change_mass = np.abs(n_old-n_new)
 
-        if y_new.shape[0] > 0:
-            mean_new = np.mean(y_new)
-        else:
-            mean_new = 0
-
-        obj = 0
-        if mean_old != mean_new:
-            if y_old.shape[0] > y_new.shape[0]:
-                obj = (mean_new-mean_old)/(y_old.shape[0]-y_new.shape[0])
-            elif y_old.shape[0] < y_new.shape[0]:
-                obj = (mean_new-mean_old)/(y_new.shape[0]-y_old.shape[0])
-            else:
-                raise PrimException('''mean is different {} vs {}, while shape is the same,
-                                       this cannot be the case'''.format(mean_old, mean_new))
-        return obj
+        with np.errstate(invalid='ignore', divide='ignore'):
+            obj = (mean_new-mean_old)/change_mass
+        return np.where((mean_old != mean_new) & (change_mass > 0), obj, 0)
 
-    def _lenient2_obj_func(self, y_old, y_new):
+    def _lenient2_obj_func(self, mean_old, n_old, mean_new, n_new):
         '''
 
         friedman and fisher 14.6
 
 
         '''
-        mean_old = np.mean(y_old)
-
-        if y_new.shape[0] > 0:
-            mean_new = np.mean(y_new)
-        else:
-            mean_new = 0
+        mean_new = np.where(n_new > 0, mean_new, 0)
+        change_mass = np.abs(n_old-n_new)
 
-        obj = 0
-        if mean_old != mean_new:
-            if y_old.shape == y_new.shape:
-                raise PrimException('''mean is different {} vs {}, while shape is the same,
-                                       this cannot be the case'''.format(mean_old, mean_new))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            obj = n_new * (mean_new-mean_old)/change_mass
+        return np.where((mean_old != mean_new) & (change_mass > 0), obj, 0)
 
-            change_mean = mean_new - mean_old
-            change_mass = abs(y_old.shape[0]-y_new.shape[0])
-            mass_new = y_new.shape[0]
-
-            obj = mass_new * change_mean / change_mass
-
-        return obj
-
-    def _original_obj_func(self, y_old, y_new):
+    def _original_obj_func(self, mean_old, n_old, mean_new, n_new):
         ''' The original objective function: the mean of the data
         inside the box'''
-
-        if y_new.shape[0] > 0:
-            return np.mean(y_new)
-        else:
-            return -1
+        return np.where(n_new > 0, mean_new, -1)
 
     def _assert_dtypes(self, keys, dtypes):
         '''
@@ -1775,10 +2094,6 @@ class Prim(sdutil.OutputFormatterMixin):
 
         return eigen_vectors
 
-    _peels = {'object': _categorical_peel,
-              'int': _discrete_peel,
-              'float': _real_peel}
-
     _pastes = {'object': _categorical_paste,
                'int': _real_paste,
                'float': _real_paste}
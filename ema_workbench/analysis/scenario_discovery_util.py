@@ -10,7 +10,6 @@ import matplotlib as mpl
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-import scipy as sp
 import seaborn as sns
 
 from .plotting_util import COLOR_LIST
@@ -182,7 +181,7 @@ def _compare(a, b):
     '''compare two boxes, for each dimension return True if the
     same and false otherwise'''
     dtypesDesc = a.dtype.descr
-    logical = np.ones((len(dtypesDesc,)), dtype=np.bool)
+    logical = np.ones((len(dtypesDesc,)), dtype=bool)
     for i, entry in enumerate(dtypesDesc):
         name = entry[0]
         logical[i] = logical[i] &\
@@ -238,23 +237,162 @@ def _in_box(x, boxlim):
     category dtype
 
     '''
-    
-    x_numbered = x.select_dtypes(np.number)
-    boxlim_numbered = boxlim.select_dtypes(np.number)
-    logical = (boxlim_numbered.loc[0, :].values<= x_numbered.values) &\
-                (x_numbered.values <= boxlim_numbered.loc[1, :].values)
-    logical = logical.all(axis=1)
-
-    # TODO:: how to speed this up
-    for column, values in x.select_dtypes(exclude=np.number).iteritems():
-        entries = boxlim.loc[0, column]
-        not_present = set(values.cat.categories.values) - entries
-
-        if not_present:
-            # what other options do we have here....
-            l = pd.isnull(x[column].cat.remove_categories(list(entries)))
-            logical = l & logical
-    return logical
+    return _BoxMembership(x)(boxlim)
+
+
+class _BoxMembership(object):
+    '''
+
+    Precompiled box membership test for a dataset. The numeric columns
+    are stored as a contiguous float matrix, and the categorical columns
+    as integer codes, so testing whether data points are inside a box
+    is a vectorized comparison against the box limits and the allowed
+    codes of the box.
+
+    Parameters
+    ----------
+    x : pd.DataFrame
+        the non numeric columns must be of pandas category dtype
+
+    Raises
+    ------
+    Attribute error if not numbered columns are not pandas
+    category dtype
+
+    '''
+
+    def __init__(self, x):
+        # same split as select_dtypes(np.number), but without copying x
+        numbered = [pd.api.types.is_numeric_dtype(dtype) and not
+                    pd.api.types.is_bool_dtype(dtype) for dtype in x.dtypes]
+        numbered = np.asarray(numbered, dtype=bool)
+        self.numeric_columns = x.columns[numbered]
+        self.nominal_columns = x.columns[~numbered]
+
+        # column major, so each column is contiguous
+        self.n = x.shape[0]
+        self.x_numeric = np.empty((self.n, self.numeric_columns.shape[0]),
+                                  order='F')
+        for j, column in enumerate(self.numeric_columns):
+            self.x_numeric[:, j] = x[column].values
+        self.minima = self.x_numeric.min(axis=0, initial=np.inf)
+        self.maxima = self.x_numeric.max(axis=0, initial=-np.inf)
+
+        self.categories = [x[column].cat.categories for column in
+                           self.nominal_columns]
+        self.codes = [x[column].cat.codes.values for column in
+                      self.nominal_columns]
+
+    def __call__(self, boxlim, columns=None):
+        '''
+
+        Parameters
+        ----------
+        boxlim : pd.DataFrame
+        columns : list of str, optional
+                  only test the limits on these columns, defaults to 
+                  all columns
+
+        Returns
+        -------
+        ndarray
+            boolean 1D array
+
+        '''
+        return self.in_boxes([boxlim], columns)[0]
+
+    def in_boxes(self, boxlims, columns=None):
+        '''
+
+        test many boxes at once
+
+        Parameters
+        ----------
+        boxlims : list of pd.DataFrame
+        columns : list of str, optional
+                  only test the limits on these columns, defaults to 
+                  all columns
+
+        Returns
+        -------
+        ndarray
+            boolean 2D array of shape (nr. of boxes, nr. of data points)
+
+        '''
+        logical = np.ones((len(boxlims), self.n), dtype=bool)
+
+        for j, column in enumerate(self.numeric_columns):
+            if columns is not None and column not in columns:
+                continue
+
+            limits = np.asarray([boxlim[column].values for boxlim in
+                                 boxlims], dtype=float)
+            if ((limits[:, 0] <= self.minima[j]).all() and
+                    (limits[:, 1] >= self.maxima[j]).all()):
+                # the column does not restrict any of the boxes
+                continue
+
+            xj = self.x_numeric[:, j]
+            logical &= limits[:, 0:1] <= xj
+            logical &= xj <= limits[:, 1:2]
+
+        for j, column in enumerate(self.nominal_columns):
+            if columns is not None and column not in columns:
+                continue
+
+            # a missing value (code -1) is never outside a box
+            allowed = np.ones((len(boxlims), len(self.categories[j])+1),
+                              dtype=bool)
+            for i, boxlim in enumerate(boxlims):
+                allowed[i, :-1] = self.categories[j].isin(
+                                                    boxlim.loc[0, column])
+            if allowed.all():
+                continue
+            logical &= allowed[:, self.codes[j]]
+
+        return logical
+
+    def limits_satisfied(self, boxlim, columns):
+        '''
+
+        test for each limit of the box separately which data points
+        satisfy it
+
+        Parameters
+        ----------
+        boxlim : pd.DataFrame
+        columns : list of str
+
+        Returns
+        -------
+        ndarray
+            boolean 2D array of shape (2*nr. of columns, nr. of data 
+            points), with for each column the test on the lower and the
+            upper limit. For categorical columns, the first is the test
+            on the categories, and the second is always True
+
+        '''
+        logical = np.ones((2*len(columns), self.n), dtype=bool)
+
+        numeric = {column: j for j, column in 
+                   enumerate(self.numeric_columns)}
+        nominal = {column: j for j, column in 
+                   enumerate(self.nominal_columns)}
+
+        for k, column in enumerate(columns):
+            if column in numeric:
+                xj = self.x_numeric[:, numeric[column]]
+                lower, upper = boxlim[column].values
+                logical[2*k] = lower <= xj
+                logical[2*k+1] = xj <= upper
+            else:
+                j = nominal[column]
+                allowed = np.ones((len(self.categories[j])+1, ), 
+                                  dtype=bool)
+                allowed[:-1] = self.categories[j].isin(boxlim.loc[0, column])
+                logical[2*k] = allowed[self.codes[j]]
+
+        return logical
 
 
 def _setup(results, classify, incl_unc=[]):
@@ -299,39 +437,6 @@ def _setup(results, classify, incl_unc=[]):
     return x, y, mode
 
 
-def _calculate_quasip(x, y, box, Hbox, Tbox):
-    '''
-    
-    Parameters
-    ----------
-    x : recarray
-    y : np.array
-    box : DataFrame
-    Hbox : int
-    Tbox : int
-    
-    '''
-    logical = _in_box(x, box)
-    yi = y[logical]
-
-    # total nr. of cases in box with one restriction removed
-    Tj = yi.shape[0]
-
-    # total nr. of cases of interest in box with one restriction
-    # removed
-    Hj = np.sum(yi)
-
-    p = Hj/Tj
-
-    Hbox = int(Hbox)
-    Tbox = int(Tbox)
-
-    # force one sided
-    qp = sp.stats.binom_test(Hbox, Tbox, p, alternative='greater')  # @UndefinedVariable
-
-    return qp
-
-
 def plot_box(boxlim, qp_values, box_init, uncs,
              coverage, density,
              ticklabel_formatter="{} ({})",
@@ -341,6 +341,11 @@ class BaseVensimModel(FileModel):
             else:
                 debug("cin file read successfully")
 
+        if self._lookup_uncertainties:
+            # experiments are read only, so the lookup values are added
+            # to a copy
+            experiment = dict(experiment)
+
         for lookup_uncertainty in self._lookup_uncertainties:
             # ask the lookup to transform the retrieved uncertainties to the
             # proper lookup value
@@ -12,11 +12,12 @@ __all__ = ["ema_parallel", "parameters"
            "perform_experiments", 'optimize', "IpyparallelEvaluator",
            "MultiprocessingEvaluator", "SequentialEvaluator",
            "DistributedEvaluator",
-           'ReplicatorModel', "EpsilonProgress", "HyperVolume",
-           "Convergence", "ArchiveLogger"]
+           'ReplicatorModel', 'VectorizedReplicatorModel', "EpsilonProgress", "HyperVolume",
+           "Convergence", "ArchiveLogger", "ResultCache"]
 
 from .outcomes import ScalarOutcome, TimeSeriesOutcome, Outcome, Constraint
-from .model import Model, FileModel, ReplicatorModel
+from .model import (Model, FileModel, ReplicatorModel,
+                    VectorizedReplicatorModel)
 from .parameters import (RealParameter, IntegerParameter, CategoricalParameter, BooleanParameter,
                          Scenario, Policy, Constant, Experiment, create_parameters,
                          parameters_to_csv, Category, experiment_generator)
@@ -27,6 +28,7 @@ from .salib_samplers import (SobolSampler, MorrisSampler, FASTSampler,
                              get_SALib_problem)
 from .evaluators import (perform_experiments, optimize,
                          MultiprocessingEvaluator, SequentialEvaluator)
+from .caching import ResultCache
 from .optimization import (Convergence, HyperVolume, EpsilonProgress,
                            ArchiveLogger)
 
@@ -0,0 +1,321 @@
+'''
+
+This module provides caches for the outcomes of experiments. An evaluator
+that is given a cache looks up each experiment before it is sent to a
+worker, so experiments that have been run before are never run again. This
+is useful for expensive models, for example when an optimization algorithm
+proposes the same combination of integer or categorical levers more than
+once, or when a crashed run is restarted.
+
+The :class:`ResultCache` keeps the most recently used results in memory
+and, optionally, stores all results on disk. Other storage backends can
+be added by extending :class:`AbstractCache`.
+
+'''
+from __future__ import (absolute_import, print_function, division,
+                        unicode_literals)
+
+import abc
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from ..util import ema_logging
+
+
+__all__ = ['AbstractCache',
+           'ResultCache']
+
+
+def _normalize(value):
+    '''turn numpy scalars into their python equivalent so that the
+    same value always has the same representation'''
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class AbstractCache(object):
+    '''
+    Abstract base class from which different caches can be derived. A
+    cache maps a key, derived from the model and the experiment, to the
+    outcomes of running the experiment.
+
+    Attributes
+    ----------
+    hits : int
+           the number of successful lookups
+    misses : int
+             the number of failed lookups
+
+    '''
+    __metaclass__ = abc.ABCMeta
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self):
+        '''the fraction of lookups that were successful'''
+        lookups = self.hits + self.misses
+        if not lookups:
+            return 0
+        return self.hits / lookups
+
+    def key(self, model, experiment):
+        '''
+        Determine the key for an experiment on a model. The key is a
+        stable hash of the name of the model, the values of the
+        uncertainties and levers of the model, and the values of its
+        constants. Any other values in the scenario or policy do not affect
+        the outcomes, and hence are ignored.
+
+        Parameters
+        ----------
+        model : AbstractModel instance
+        experiment : Case instance
+
+        Returns
+        -------
+        str
+
+        '''
+        values = [('model', model.name)]
+        for parameters, design in ((model.uncertainties, experiment.scenario),
+                                   (model.levers, experiment.policy)):
+            for name in sorted(parameters.keys()):
+                values.append((name, _normalize(design.get(name))))
+        for name in sorted(model.constants.keys()):
+            values.append((name, _normalize(model.constants[name].value)))
+
+        return hashlib.sha1(repr(values).encode('utf-8')).hexdigest()
+
+    def lookup(self, key):
+        '''
+        Retrieve the outcomes for key, and keep track of the hit rate.
+
+        Parameters
+        ----------
+        key : str
+
+        Returns
+        -------
+        dict or None
+            the outcomes dict, or None if key is not in the cache
+
+        '''
+        outcomes = self.get(key)
+        if outcomes is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return outcomes
+
+    @abc.abstractmethod
+    def get(self, key):
+        '''
+        Retrieve the outcomes for key. Any extension of AbstractCache
+        needs to implement this method.
+
+        Parameters
+        ----------
+        key : str
+
+        Returns
+        -------
+        dict or None
+            the outcomes dict, or None if key is not in the cache
+
+        '''
+
+    @abc.abstractmethod
+    def put(self, key, outcomes):
+        '''
+        Store the outcomes for key. Any extension of AbstractCache needs
+        to implement this method.
+
+        Parameters
+        ----------
+        key : str
+        outcomes : dict
+
+        '''
+
+
+class ResultCache(AbstractCache):
+    '''
+    Cache that keeps the most recently used outcomes in memory, and
+    optionally stores all outcomes on disk as well. The disk store is
+    shared between sessions, so a directory can be reused for rerunning an
+    analysis.
+
+    Parameters
+    ----------
+    maxsize : int, optional
+              the maximum number of outcomes kept in memory
+    directory : str, optional
+                the directory in which to store the outcomes. If not
+                provided, outcomes are only kept in memory.
+
+    '''
+
+    def __init__(self, maxsize=10000, directory=None):
+        super(ResultCache, self).__init__()
+        self.maxsize = maxsize
+        self.directory = directory
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        if directory is not None and not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def __len__(self):
+        return len(self._memory)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.pkl')
+
+    def _remember(self, key, outcomes):
+        self._memory[key] = outcomes
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            try:
+                outcomes = self._memory[key]
+            except KeyError:
+                pass
+            else:
+                self._memory.move_to_end(key)
+                return outcomes
+
+        if self.directory is None:
+            return None
+
+        try:
+            with open(self._path(key), 'rb') as fh:
+                outcomes = pickle.load(fh)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+        with self._lock:
+            self._remember(key, outcomes)
+        return outcomes
+
+    def put(self, key, outcomes):
+        with self._lock:
+            self._remember(key, outcomes)
+
+        if self.directory is None:
+            return
+
+        # write to a temporary file first, so a crash never leaves a
+        # partial entry behind
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as fh:
+            pickle.dump(outcomes, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._path(key))
+
+
+class CachingCallback(object):
+    '''
+    Wrapper around a callback that stores all outcomes it receives in a
+    cache. Its :meth:`filter` method removes the experiments whose outcomes
+    are already in the cache, and passes these cached outcomes on to the
+    callback instead.
+
+    Experiments are filtered and results are stored from different
+    threads in some of the evaluators, so access to the wrapped callback
+    is serialized.
+
+    Parameters
+    ----------
+    callback : AbstractCallback instance
+    cache : AbstractCache instance
+    models : list of AbstractModel instances
+
+    '''
+
+    def __init__(self, callback, cache, models):
+        self.callback = callback
+        self.cache = cache
+        self.models = {model.name: model for model in models}
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.callback, name)
+
+    def _key(self, experiment):
+        return self.cache.key(self.models[experiment.model_name], experiment)
+
+    def _put(self, experiment, outcomes):
+        try:
+            key = self._keys.pop(experiment.experiment_id)
+        except KeyError:
+            key = self._key(experiment)
+        self.cache.put(key, self._complete(experiment, outcomes))
+
+    def _complete(self, experiment, outcomes):
+        # outcomes written directly into shared memory by the workers are
+        # missing from outcomes, so take them from the wrapped callback
+        missing = [name for name in getattr(self.callback, 'outcomes', [])
+                   if name not in outcomes]
+        if not missing:
+            return outcomes
+
+        outcomes = dict(outcomes)
+        for name in missing:
+            try:
+                data = self.callback.results[name]
+            except (AttributeError, KeyError):
+                continue
+            outcomes[name] = np.copy(data[experiment.experiment_id])
+        return outcomes
+
+    def __call__(self, experiment, outcomes):
+        with self._lock:
+            self.callback(experiment, outcomes)
+        self._put(experiment, outcomes)
+
+    def store_batch(self, results):
+        results = list(results)
+        with self._lock:
+            self.callback.store_batch(results)
+        for experiment, outcomes in results:
+            self._put(experiment, outcomes)
+
+    def filter(self, experiments):
+        '''
+        Generator that yields the experiments that are not in the cache.
+
+        Parameters
+        ----------
+        experiments : iterable of Case instances
+
+        '''
+        hits = 0
+        misses = 0
+        for experiment in self.callback.filter(experiments):
+            key = self._key(experiment)
+            outcomes = self.cache.lookup(key)
+            if outcomes is None:
+                misses += 1
+                self._keys[experiment.experiment_id] = key
+                yield experiment
+            else:
+                hits += 1
+                with self._lock:
+                    self.callback(experiment, outcomes)
+
+        ema_logging.info(('{} of {} experiments retrieved from cache, '
+                          'overall hit rate {:.1%}').format(
+                              hits, hits + misses, self.cache.hit_rate))
@@ -16,7 +16,7 @@ from __future__ import (absolute_import, print_function, division,
                         unicode_literals)
 
 import abc
-import csv
+import json
 import os
 import shutil
 
@@ -24,7 +24,7 @@ import numpy as np
 import pandas as pd
 
 from ..util import ema_logging, ema_exceptions
-from .parameters import CategoricalParameter, IntegerParameter, BooleanParameter
+from .parameters import CategoricalParameter, BooleanParameter
 
 #
 # Created on 22 Jan 2013
@@ -34,7 +34,8 @@ from .parameters import CategoricalParameter, IntegerParameter, BooleanParameter
 
 __all__ = ['AbstractCallback',
            'DefaultCallback',
-           'FileBasedCallback']
+           'FileBasedCallback',
+           'load_file_based_results']
 
 
 class AbstractCallback(object):
@@ -99,12 +100,51 @@ class AbstractCallback(object):
         # TODO:: https://github.com/alexanderkuk/log-progress 
         # can we detect whether we are running within Jupyter?
         # yes: https://stackoverflow.com/questions/15411967/how-can-i-check-if-code-is-executed-in-the-ipython-notebook 
-        self.i += 1
+        self._log_progress(1)
+
+    def _log_progress(self, n):
+        '''update the counter with n completed experiments and log
+        progress if a reporting interval has been passed'''
+        previous = self.i
+        self.i += n
         ema_logging.debug(str(self.i)+" cases completed")
 
-        if self.i % self.reporting_interval == 0:
+        if self.i // self.reporting_interval > \
+                previous // self.reporting_interval:
             ema_logging.info(str(self.i)+" cases completed")
 
+    def store_batch(self, results):
+        '''
+        Method for storing many results in one go. The default
+        implementation calls the callback for each result. Extensions of
+        AbstractCallback can overwrite this method to store a batch
+        more efficiently.
+
+        Parameters
+        ----------
+        results : iterable of (Experiment instance, dict) tuples
+
+        '''
+        for experiment, outcomes in results:
+            self(experiment, outcomes)
+
+    def filter(self, experiments):
+        '''
+        Method for skipping experiments for which results have already
+        been stored, for example when resuming an interrupted run. The
+        default implementation returns all experiments.
+
+        Parameters
+        ----------
+        experiments : iterable of Case instances
+
+        Returns
+        -------
+        iterable of Case instances
+
+        '''
+        return experiments
+
     @abc.abstractmethod
     def get_results(self):
         """
@@ -123,9 +163,15 @@ class DefaultCallback(AbstractCallback):
     one can be overwritten or replaced with a callback of your own
     design. For example if you prefer to store the result in a database
     or write them to a text file
+
+    The experiments are stored column wise in preallocated numpy arrays,
+    one for each uncertainty and lever. The DataFrame with the experiments
+    is only assembled when the cases are requested, typically via
+    :meth:`get_results`. Many results can be stored in one go using
+    :meth:`store_batch`.
+
     """
     i = 0
-    cases = None
     results = {}
 
     shape_error_msg = "can only save up to 2d arrays, this array is {}d"
@@ -156,56 +202,130 @@ class DefaultCallback(AbstractCallback):
                                               reporting_interval,
                                               reporting_frequency)
         self.i = 0
-        self.cases = None
         self.results = {}
 
         self.outcomes = [outcome.name for outcome in outcomes]
 
         # determine data types of parameters
-        columns = []
-        dtypes = []
+        # integer parameters are stored as floats, and boolean parameters
+        # as objects, so experiments that have not been stored yet can
+        # be nan
+        self._columns = []
+        self._cases = {}
         self.parameters = []
 
         for parameter in uncs + levers:
             name = parameter.name
             self.parameters.append(name)
-            dataType = 'float'
-
-            if isinstance(parameter, CategoricalParameter):
-                dataType = 'object'
-            elif isinstance(parameter, BooleanParameter):
-                dataType = 'bool'
-            elif isinstance(parameter, IntegerParameter):
-                dataType = 'int'
-            columns.append(name)
-            dtypes.append(dataType)
-            
+            dtype = float
+
+            if isinstance(parameter, (CategoricalParameter,
+                                      BooleanParameter)):
+                dtype = object
+            self._add_column(name, dtype, nr_experiments)
+
         for name in ['scenario', 'policy', 'model']:
-            columns.append(name)
-            dtypes.append('object')
-                
-        df = pd.DataFrame(index=np.arange(nr_experiments))
-        
-        for name, dtype in zip(columns, dtypes):
-            df[name] = pd.Series(dtype=dtype)
-        self.cases = df
+            self._add_column(name, object, nr_experiments)
+
         self.nr_experiments = nr_experiments
 
+    @property
+    def cases(self):
+        '''the experiments as a DataFrame'''
+        return pd.DataFrame(self._cases, columns=self._columns)
+
+    def _add_column(self, name, dtype, nr_experiments):
+        column = np.empty((nr_experiments, ), dtype=dtype)
+        column[:] = np.NAN
+        self._cases[name] = column
+        self._columns.append(name)
+        return column
+
+    def _get_column(self, name):
+        try:
+            return self._cases[name]
+        except KeyError:
+            # parameter not known upfront, so we add it
+            return self._add_column(name, object, self.nr_experiments)
+
     def _store_case(self, experiment):
         scenario = experiment.scenario
         policy = experiment.policy
         index = experiment.experiment_id
 
-        self.cases.at[index, 'scenario'] = scenario.name
-        self.cases.at[index, 'policy'] = policy.name
-        self.cases.at[index, 'model'] = experiment.model_name
-        
+        self._cases['scenario'][index] = scenario.name
+        self._cases['policy'][index] = policy.name
+        self._cases['model'][index] = experiment.model_name
+
         for k, v in scenario.items():
-            self.cases.at[index, k] = v
-            
+            self._get_column(k)[index] = v
+
         for k, v in policy.items():
-            self.cases.at[index, k] = v
-        
+            self._get_column(k)[index] = v
+
+    def _store_cases(self, experiments):
+        index = np.asarray([e.experiment_id for e in experiments],
+                           dtype=np.int64)
+        self._cases['scenario'][index] = [e.scenario.name for e in
+                                          experiments]
+        self._cases['policy'][index] = [e.policy.name for e in experiments]
+        self._cases['model'][index] = [e.model_name for e in experiments]
+
+        for designs in ([e.scenario for e in experiments],
+                        [e.policy for e in experiments]):
+            # NamedDict is a UserDict, looking up values in the
+            # underlying dicts is much faster
+            designs = [getattr(design, 'data', design) for design in designs]
+            columns = self._design_columns(designs)
+
+            if columns is None:
+                # designs differ in their parameters, so store them one
+                # experiment at the time
+                for row, design in zip(index, designs):
+                    for k, v in design.items():
+                        self._get_column(k)[row] = v
+                continue
+
+            for k, column_values in columns.items():
+                column = self._get_column(k)
+
+                if column.dtype == object:
+                    # avoid numpy turning sequences into extra dimensions
+                    data = np.empty((len(column_values), ), dtype=object)
+                    data[:] = column_values
+                    column_values = data
+                column[index] = column_values
+
+    @staticmethod
+    def _design_columns(designs):
+        '''returns a dict with the values of each parameter across
+        designs, or None if not all designs have the same parameters'''
+        keys = list(designs[0].keys())
+        if any(len(design) != len(keys) for design in designs):
+            return None
+
+        try:
+            return {k: [design[k] for design in designs] for k in keys}
+        except KeyError:
+            return None
+
+    def _init_outcome(self, outcome, shape):
+        if len(shape) > 2:
+            message = self.shape_error_msg.format(len(shape))
+            raise ema_exceptions.EMAError(message)
+
+        shape = list(shape)
+        shape.insert(0, self.nr_experiments)
+
+        self.results[outcome] = self._allocate(outcome, tuple(shape))
+        return self.results[outcome]
+
+    def _allocate(self, outcome, shape):
+        '''allocate a nan filled array for storing the values of
+        outcome'''
+        data = np.empty(shape)
+        data[:] = np.NAN
+        return data
 
     def _store_outcomes(self, case_id, outcomes):
         for outcome in self.outcomes:
@@ -221,17 +341,38 @@ class DefaultCallback(AbstractCallback):
                     self.results[outcome][case_id, ] = outcome_res
                 except KeyError:
                     shape = np.asarray(outcome_res).shape
+                    data = self._init_outcome(outcome, shape)
+                    data[case_id, ] = outcome_res
 
-                    if len(shape) > 2:
-                        message = self.shape_error_msg.format(len(shape))
-                        raise ema_exceptions.EMAError(message)
+    def _store_outcomes_batch(self, case_ids, outcomes):
+        for outcome in self.outcomes:
+            ema_logging.debug("storing {}".format(outcome))
 
-                    shape = list(shape)
-                    shape.insert(0, self.nr_experiments)
+            rows = []
+            values = []
+            for case_id, entry in zip(case_ids, outcomes):
+                try:
+                    values.append(entry[outcome])
+                except KeyError:
+                    pass
+                else:
+                    rows.append(case_id)
 
-                    self.results[outcome] = np.empty(shape)
-                    self.results[outcome][:] = np.NAN
-                    self.results[outcome][case_id, ] = outcome_res
+            if len(rows) < len(case_ids):
+                # outcomes can be missing because they have already
+                # been stored elsewhere, e.g. in shared memory
+                message = "%s not specified as outcome in msi" % outcome
+                ema_logging.debug(message)
+
+            if not rows:
+                continue
+
+            values = np.asarray(values)
+            try:
+                data = self.results[outcome]
+            except KeyError:
+                data = self._init_outcome(outcome, values.shape[1::])
+            data[rows, ] = values
 
     def __call__(self, experiment, outcomes):
         '''
@@ -253,14 +394,37 @@ class DefaultCallback(AbstractCallback):
         # store outcomes
         self._store_outcomes(experiment.experiment_id, outcomes)
 
+    def store_batch(self, results):
+        '''
+        Method for storing many results in one go. The experiments and
+        outcomes are stored column wise, rather than one experiment at the
+        time.
+
+        Parameters
+        ----------
+        results : iterable of (Experiment instance, dict) tuples
+
+        '''
+        results = list(results)
+        if not results:
+            return
+
+        experiments, outcomes = zip(*results)
+        self._log_progress(len(experiments))
+
+        self._store_cases(experiments)
+        self._store_outcomes_batch([e.experiment_id for e in experiments],
+                                   outcomes)
+
     def get_results(self):
         return self.cases, self.results
     
 
-class FileBasedCallback(AbstractCallback):
+class FileBasedCallback(DefaultCallback):
     '''
-    Callback that stores data in csv files while running
-    
+    Callback that stores the results in a directory of binary files while
+    running
+
     Parameters
     ----------
     uncs : collection of Parameter instances
@@ -269,108 +433,311 @@ class FileBasedCallback(AbstractCallback):
     nr_experiments : int
     reporting_interval : int, optional 
     reporting_frequency : int, optional
+    directory : str, optional
+                the directory in which to store the results. If this
+                directory already exists, it will be overwritten unless
+                resume is True.
+    flush_interval : int, optional
+                     the number of experiments after which the results
+                     are flushed to disk
+    resume : bool, optional
+             if True, the results that were flushed to directory by an
+             earlier, interrupted, run are reopened. Only the
+             experiments that were not completed in that run have to be
+             performed again, see :meth:`filter`.
     
-    the data is stored in ./temp, relative to the current
-    working directory. If this directory already exists, it will be
-    overwritten.
-    
-    Warnings
-    --------
-    This class is still in beta. API is expected to change over the
-    coming months.
+    Numeric parameters and outcomes are stored in memory mapped .npy 
+    files, so they do not have to be kept in memory. All other columns 
+    of the experiments, such as the names of the scenarios and policies,
+    are buffered and written to disk in chunks. A manifest describing
+    all files is updated with each flush. Use :func:`load_file_based_results`
+    to read the results back in.
+
+    To use a directory other than the default, pass a partial of this 
+    class to perform_experiments, e.g. 
+    ``functools.partial(FileBasedCallback, directory='./results')``.
     
     '''
-    
+    manifest = 'manifest.json'
+
     def __init__(self, uncs, levers, outcomes, nr_experiments, 
-        reporting_interval=100, reporting_frequency=10):
+                 reporting_interval=100, reporting_frequency=10,
+                 directory='./temp', flush_interval=1000, resume=False):
+        self.directory = os.path.abspath(directory)
+        manifest = self._read_manifest() if resume else None
+        resumed = manifest is not None
+
+        if not resumed:
+            if os.path.exists(self.directory) and not resume:
+                shutil.rmtree(self.directory)
+            if not os.path.exists(self.directory):
+                os.makedirs(self.directory)
+            manifest = {'experiments': [], 'outcomes': []}
+        elif manifest['nr_experiments'] != nr_experiments:
+            raise ema_exceptions.EMAError(('cannot resume, {} contains '
+                    'results for {} experiments, not {}').format(
+                        self.directory, manifest['nr_experiments'],
+                        nr_experiments))
+
+        self.flush_interval = flush_interval
+        self._flushed = 0
+        self._files = {}
+        self._stored = {entry['name']: entry for entry in
+                        manifest['experiments']}
+        self._completed = np.zeros((nr_experiments, ), dtype=bool)
+        self._nr_flushes = 0
+
         super(FileBasedCallback, self).__init__(uncs, levers, outcomes,
                 nr_experiments, reporting_interval=reporting_interval,
                 reporting_frequency=reporting_frequency)
-        
-        self.i = 0
-        self.nr_experiments = nr_experiments
-        self.outcomes = [outcome.name for outcome in outcomes]
-        self.parameters = [parameter.name for parameter in uncs+levers]
- 
-        self.directory = os.path.abspath('./temp')
-        if os.path.exists(self.directory):
-            shutil.rmtree(self.directory)
-        os.makedirs(self.directory)
-        
-        self.experiments_fh = open(os.path.join(self.directory,
-                                                'experiments.csv'), 'w')
-        
-        header = self.parameters + ['scenario_id', 'policy', 'model']
-        writer = csv.writer(self.experiments_fh)
-        writer.writerow(header)
-        
-        self.outcome_fhs = {}
-        for outcome in self.outcomes:
-            self.outcome_fhs[outcome] = open(os.path.join(self.directory,
-                                                outcome+'.csv'), 'w')
 
-    def _store_case(self, experiment):
-        scenario = experiment.scenario
-        policy = experiment.policy
-        
-        case = []
-        for parameter in self.parameters:
-            try:
-                value = scenario[parameter]
-            except KeyError:
-                try:
-                    value = policy[parameter]
-                except KeyError:
-                    value = np.nan
-            finally:
-                case.append(value)
-
-        case.append(scenario.name)
-        case.append(policy.name)
-        case.append(experiment.model_name)
-
-        writer = csv.writer(self.experiments_fh)
-        writer.writerow(case)
-        
-    def _store_outcomes(self, outcomes):
-        for outcome in self.outcomes:
-            data = outcomes[outcome]
-            
-            try:
-                data = [str(entry) for entry in data]
-            except TypeError:
-                data = [str(data)]
-            
-            fh = self.outcome_fhs[outcome]
-            writer = csv.writer(fh)
-            writer.writerow(data)
+        if resumed:
+            self._resume(manifest)
+
+    def _read_manifest(self):
+        try:
+            with open(os.path.join(self.directory, self.manifest)) as fh:
+                manifest = json.load(fh)
+        except (IOError, OSError):
+            return None
+
+        # results without a record of the completed experiments cannot
+        # be resumed
+        if 'completed' not in manifest:
+            return None
+        return manifest
+
+    def _resume(self, manifest):
+        '''reopen the results of an earlier run'''
+        # columns of parameters that were not known upfront
+        for name in self._stored:
+            if name not in self._cases:
+                self._add_column(name, object, self.nr_experiments)
+
+        for entry in manifest['outcomes']:
+            self._files[entry['name']] = entry['file']
+            path = os.path.join(self.directory, entry['file'] + '.npy')
+            self.results[entry['name']] = np.load(path, mmap_mode='r+')
+
+        path = os.path.join(self.directory, manifest['completed'])
+        self._completed = np.load(path)
+        self._nr_flushes = manifest['nr_flushes']
+        self.i = self._flushed = manifest['nr_stored']
+
+        ema_logging.info(('resuming from {}, {} of {} experiments have '
+                          'been completed').format(self.directory, self.i,
+                                                   self.nr_experiments))
+
+    @property
+    def cases(self):
+        '''the experiments as a DataFrame'''
+        self.flush()
+        experiments, _ = load_file_based_results(self.directory)
+        return experiments
+
+    def _add_column(self, name, dtype, nr_experiments):
+        try:
+            entry = self._stored[name]
+        except KeyError:
+            file_name = 'experiments_{}'.format(len(self._columns))
+            self._files[name] = file_name
+
+            if dtype == object:
+                column = ChunkedColumn()
+            else:
+                column = self._open_memmap(file_name, (nr_experiments, ))
+        else:
+            file_name = entry['file']
+            self._files[name] = file_name
+
+            if entry['dtype'] == 'object':
+                column = ChunkedColumn(entry['chunks'])
+            else:
+                path = os.path.join(self.directory, file_name + '.npy')
+                column = np.load(path, mmap_mode='r+')
+
+        self._cases[name] = column
+        self._columns.append(name)
+        return column
+
+    def _allocate(self, outcome, shape):
+        file_name = 'outcomes_{}'.format(len(self.results))
+        self._files[outcome] = file_name
+        return self._open_memmap(file_name, shape)
+
+    def _open_memmap(self, file_name, shape):
+        path = os.path.join(self.directory, file_name + '.npy')
+        data = np.lib.format.open_memmap(path, mode='w+', dtype=float,
+                                         shape=shape)
+        data[:] = np.NAN
+        return data
 
     def __call__(self, experiment, outcomes):
+        super(FileBasedCallback, self).__call__(experiment, outcomes)
+        self._completed[experiment.experiment_id] = True
+
+        if self.i - self._flushed >= self.flush_interval:
+            self.flush()
+
+    def store_batch(self, results):
+        results = list(results)
+        super(FileBasedCallback, self).store_batch(results)
+        self._completed[[e.experiment_id for e, _ in results]] = True
+
+        if self.i - self._flushed >= self.flush_interval:
+            self.flush()
+
+    def filter(self, experiments):
         '''
-        Method responsible for storing results. This method calls
-        :meth:`super` first, thus utilizing the logging provided there.
+        Generator that yields the experiments that have not been
+        completed yet.
 
         Parameters
         ----------
-        experiment: Experiment instance
-        outcomes: dict
-                the outcomes dict
+        experiments : iterable of Case instances
 
         '''
-        super(FileBasedCallback, self).__call__(experiment, outcomes)
-
-        # store the case
-        self._store_case(experiment)
+        for experiment in experiments:
+            if not self._completed[experiment.experiment_id]:
+                yield experiment
+
+    def flush(self):
+        '''write all buffered results to disk, and update the manifest'''
+        experiments = []
+        for name in self._columns:
+            column = self._cases[name]
+            file_name = self._files[name]
+
+            if isinstance(column, ChunkedColumn):
+                column.write(os.path.join(self.directory, file_name))
+                entry = {'name': name, 'file': file_name, 'dtype': 'object',
+                         'chunks': column.nr_chunks}
+            else:
+                column.flush()
+                entry = {'name': name, 'file': file_name, 'dtype': 'float'}
+            experiments.append(entry)
+
+        outcomes = []
+        for name, data in self.results.items():
+            data.flush()
+            outcomes.append({'name': name, 'file': self._files[name]})
+
+        # alternate between two files, so the file the current manifest
+        # refers to is not overwritten before the new manifest is in place
+        completed = 'completed_{}.npy'.format(self._nr_flushes % 2)
+        np.save(os.path.join(self.directory, completed), self._completed)
+
+        manifest = {'nr_experiments': self.nr_experiments,
+                    'nr_stored': self.i,
+                    'nr_flushes': self._nr_flushes + 1,
+                    'completed': completed,
+                    'experiments': experiments,
+                    'outcomes': outcomes}
+
+        # replace the manifest in one go, so it is always complete
+        path = os.path.join(self.directory, self.manifest)
+        with open(path + '.tmp', 'w') as fh:
+            json.dump(manifest, fh)
+        os.replace(path + '.tmp', path)
+
+        self._flushed = self.i
+        self._nr_flushes += 1
 
-        # store outcomes
-        self._store_outcomes(outcomes)
-    
     def get_results(self):
-        
-        # TODO:: metadata
-        
-        self.experiments_fh.close()
-        for value in self.outcome_fhs.items():
-            value.close
-        
-        return self.directory
\ No newline at end of file
+        '''flush all results to disk, and read them back in with the
+        outcomes memory mapped'''
+        self.flush()
+        return load_file_based_results(self.directory)
+
+
+class ChunkedColumn(object):
+    '''
+    Column of arbitrary python objects that is written to disk in chunks.
+    Assigned values are buffered until :meth:`write` is called.
+
+    '''
+    dtype = np.dtype(object)
+
+    def __init__(self, nr_chunks=0):
+        self.nr_chunks = nr_chunks
+        self._rows = []
+        self._values = []
+
+    def __setitem__(self, index, value):
+        if np.ndim(index) == 0:
+            self._rows.append(index)
+            self._values.append(value)
+        else:
+            self._rows.extend(index)
+            self._values.extend(value)
+
+    def write(self, path):
+        '''write the buffered values to a new chunk
+
+        Parameters
+        ----------
+        path : str
+               path of the column, to which the chunk number is added
+
+        '''
+        if not self._rows:
+            return
+
+        values = np.empty((len(self._values), ), dtype=object)
+        values[:] = self._values
+        chunk = {'rows': np.asarray(self._rows, dtype=np.int64),
+                 'values': values}
+        np.savez('{}_{}.npz'.format(path, self.nr_chunks), **chunk)
+
+        self.nr_chunks += 1
+        self._rows = []
+        self._values = []
+
+
+def load_file_based_results(directory, mmap_mode='r'):
+    '''
+    load the results stored by a :class:`FileBasedCallback`
+
+    Parameters
+    ----------
+    directory : str
+    mmap_mode : {None, 'r+', 'r', 'w+', 'c'}, optional
+                memory map mode for the numeric columns and outcomes,
+                see numpy.load. If None, the data is read into memory.
+
+    Returns
+    -------
+    tuple
+        DataFrame with the experiments, and a dict with the outcomes
+
+    '''
+    directory = os.path.abspath(directory)
+    with open(os.path.join(directory, FileBasedCallback.manifest)) as fh:
+        manifest = json.load(fh)
+    nr_experiments = manifest['nr_experiments']
+
+    experiments = {}
+    columns = []
+    for entry in manifest['experiments']:
+        path = os.path.join(directory, entry['file'])
+
+        if entry['dtype'] == 'object':
+            column = np.empty((nr_experiments, ), dtype=object)
+            column[:] = np.NAN
+            for i in range(entry['chunks']):
+                chunk_file = '{}_{}.npz'.format(path, i)
+                with np.load(chunk_file, allow_pickle=True) as chunk:
+                    column[chunk['rows']] = chunk['values']
+        else:
+            column = np.load(path + '.npy', mmap_mode=mmap_mode)
+
+        experiments[entry['name']] = column
+        columns.append(entry['name'])
+    experiments = pd.DataFrame(experiments, columns=columns)
+
+    outcomes = {}
+    for entry in manifest['outcomes']:
+        path = os.path.join(directory, entry['file'] + '.npy')
+        outcomes[entry['name']] = np.load(path, mmap_mode=mmap_mode)
+
+    return experiments, outcomes
@@ -1,16 +1,21 @@
 
 import os
 import sys
+import time
 import traceback
+import functools
+import itertools
 import math
-from itertools import zip_longest
+from collections import deque
 
-from .evaluators import BaseEvaluator
+from .ema_multiprocessing import ChunkSizer
+from .evaluators import BaseEvaluator, complete_futures
+from .instrumentation import measure_size
 from ..util import ema_logging
-from .parameters import experiment_generator, Case
+from .parameters import Case
 from ..util.ema_exceptions import EMAError, CaseError
 
-from dask.distributed import Client, as_completed, get_worker
+from dask.distributed import Client, get_worker, wait, TimeoutError
 
 def store_model_on_worker(name, model):
 	worker = get_worker()
@@ -74,7 +79,7 @@ def run_experiment_on_worker(experiment):
 
 	return experiment.experiment_id, outcomes
 
-def run_experiments_on_worker(experiments):
+def run_experiments_on_worker(experiments, instrument=False):
 	"""
 	Run multiple experiments in a batch on one worker.
 
@@ -84,20 +89,177 @@ def run_experiments_on_worker(experiments):
 	Parameters
 	----------
 	experiments : Iterable of Case
+	instrument : bool (optional)
+	             If true, the timing of each experiment is added to its result as
+	             a tuple of experiment id, start time, run time and size of the outcomes.
 
 	Returns
 	-------
 	tuple
 		The results from `run_experiment_on_worker`
 	"""
-	return tuple(run_experiment_on_worker(experiment) for experiment in experiments if experiment is not None)
+	if not instrument:
+		return tuple(run_experiment_on_worker(experiment) for experiment in experiments if experiment is not None)
 
+	results = []
+	for experiment in experiments:
+		if experiment is None:
+			continue
 
-def grouper(iterable, n, fillvalue=None):
-	"Collect data into fixed-length chunks or blocks"
-	# grouper('ABCDEFG', 3, 'x') --> ABC DEF Gxx"
-	args = [iter(iterable)] * n
-	return zip_longest(*args, fillvalue=fillvalue)
+		started = time.time()
+		start = time.perf_counter()
+		experiment_id, outcomes = run_experiment_on_worker(experiment)
+		timing = (experiment_id, started, time.perf_counter() - start, measure_size(outcomes))
+		results.append((experiment_id, outcomes, timing))
+	return tuple(results)
+
+
+def run_timed_experiments_on_worker(experiments, instrument=False):
+	"""
+	Run a batch of experiments on one worker, and measure how long this takes.
+
+	Parameters
+	----------
+	experiments : Iterable of Case
+	instrument : bool (optional)
+
+	Returns
+	-------
+	tuple
+		The results from `run_experiments_on_worker`
+	float
+		The time in seconds it took to run the batch
+	"""
+	start = time.perf_counter()
+	results = run_experiments_on_worker(experiments, instrument=instrument)
+	return results, time.perf_counter() - start
+
+
+class AdaptiveBatches(object):
+	"""Helper class for sending experiments to the workers in batches.
+
+	Unless a fixed batch size is given, the size of the batches adapts to the observed run time
+	of the experiments, see ChunkSizer. The first batches contain a single experiment, and batches
+	grow until running a batch takes long enough to amortize the overhead of the scheduler. Near
+	the end of the run, the remaining experiments are divided evenly over the workers, so no
+	worker ends up with a long batch while the others are idle.
+
+	Up to two batches per worker are in flight at any time. Idle workers take queued batches from
+	busy workers through the work stealing of the dask scheduler.
+
+	Parameters
+	----------
+	client : distributed.Client
+	experiments : collection of Case
+	n_workers : int
+	batch_size : int (optional)
+	             If given, all batches have this size.
+	instrument : bool (optional)
+	speculative : float (optional)
+	              If given, once all experiments have been submitted, batches that have been
+	              running for more than speculative times their expected duration are submitted
+	              once more. The results of whichever copy completes first are used, and the other
+	              copy is cancelled.
+
+	"""
+
+	def __init__(self, client, experiments, n_workers, batch_size=None, instrument=False,
+				 speculative=None):
+		self.client = client
+		self.experiments = deque(experiments)
+		self.n_workers = max(1, n_workers)
+		self.chunksizer = ChunkSizer(batch_size)
+		self.instrument = instrument
+		self.speculative = speculative
+
+		self._ids = itertools.count()
+		self._batches = {}  # batch id -> (batch, time of submission, futures)
+		self._futures = {}  # future -> batch id
+
+	@property
+	def batch_size(self):
+		"""the number of experiments to put in the next batch"""
+		if self.chunksizer.fixed:
+			return self.chunksizer.chunksize
+
+		tail = math.ceil(len(self.experiments) / self.n_workers)
+		return max(1, min(self.chunksizer.chunksize, tail))
+
+	def _submit(self, batch_id, batch):
+		future = self.client.submit(run_timed_experiments_on_worker, batch,
+									instrument=self.instrument, pure=False)
+		self._futures[future] = batch_id
+		self._batches[batch_id][2].append(future)
+
+	def _fill(self):
+		while self.experiments and len(self._batches) < 2 * self.n_workers:
+			size = min(self.batch_size, len(self.experiments))
+			batch = [self.experiments.popleft() for _ in range(size)]
+
+			batch_id = next(self._ids)
+			self._batches[batch_id] = (batch, time.time(), [])
+			self._submit(batch_id, batch)
+
+	def _speculate(self):
+		"""resubmit straggling batches, returns the time in seconds until the next batch becomes
+		a straggler, or None if there is no such batch"""
+		if self.chunksizer.n_experiments == 0:
+			return None
+
+		runtime = self.chunksizer.duration / self.chunksizer.n_experiments
+		now = time.time()
+		next_check = None
+		for batch_id, (batch, submitted, futures) in list(self._batches.items()):
+			if len(futures) != 1:
+				continue
+
+			remaining = submitted + self.speculative * runtime * len(batch) - now
+			if remaining < 0:
+				ema_logging.debug("resubmitting batch of {} experiments".format(len(batch)))
+				self._submit(batch_id, batch)
+			elif next_check is None or remaining < next_check:
+				next_check = remaining
+		return next_check
+
+	def __iter__(self):
+		"""yields a tuple of the experiments and their results for each completed batch"""
+		self._fill()
+
+		# while speculating, stop waiting when the next batch becomes a straggler, so a straggler
+		# is also resubmitted when no other batch completes in the meantime
+		timeout = None
+		try:
+			while self._futures:
+				try:
+					done, _ = wait(list(self._futures), timeout=timeout,
+								   return_when='FIRST_COMPLETED')
+				except TimeoutError:
+					done = ()
+
+				for future in done:
+					batch_id = self._futures.pop(future, None)
+					if batch_id is None:
+						# a copy of a batch that has already completed
+						continue
+
+					results, duration = future.result()
+
+					batch, _, futures = self._batches.pop(batch_id)
+					for other in futures:
+						if other is not future:
+							self._futures.pop(other, None)
+							other.cancel()
+
+					self.chunksizer.update(len(batch), duration)
+					yield batch, results
+
+				self._fill()
+				timeout = None
+				if self.speculative and not self.experiments:
+					timeout = self._speculate()
+		finally:
+			if self._futures:
+				self.client.cancel(list(self._futures))
 
 
 
@@ -112,19 +274,26 @@ class DistributedEvaluator(BaseEvaluator):
              will be created.
     batch_size : int (optional)
                  The number of experiment to batch together when pushing tasks to distributed workers.
-                 If not given, the first call to evaluate_experiments will make a reasonable guess that
-                 will allocate batches so that there are about 10 tasks per worker.  This may or may not
-                 be efficient.
+                 If not given, the batch size adapts to the observed run time of the experiments, see
+                 AdaptiveBatches.
 	max_n_workers : int (default 32)
 	                The maximum number of workers that will be created for a default Client.  If the number
 	                of cores available is smaller than this number, fewer workers will be spawned.
+	cache : AbstractCache instance (optional)
+	        If provided, experiments that are already in the cache are not sent to the workers.
+	instrument : bool (optional)
+	             If true, the timings of the experiments are recorded, see BaseEvaluator.
+	speculative : float (optional)
+	              If given, straggling batches near the end of a run are run a second time on
+	              another worker, see AdaptiveBatches.
 
 	"""
 
 	_default_client = None
 
-	def __init__(self, msis, *, client=None, batch_size=None, max_n_workers=32):
-		super().__init__(msis, )
+	def __init__(self, msis, *, client=None, batch_size=None, max_n_workers=32,
+				 cache=None, instrument=False, speculative=None):
+		super().__init__(msis, cache=cache, instrument=instrument)
 
 		# Initialize a default dask.distributed client if one is not given
 		if client is None:
@@ -139,6 +308,7 @@ class DistributedEvaluator(BaseEvaluator):
 
 		self.client = client
 		self.batch_size = batch_size
+		self.speculative = speculative
 
 	def initialize(self):
 		self.broadcast_models_to_workers()
@@ -153,39 +323,39 @@ class DistributedEvaluator(BaseEvaluator):
 	def evaluate_experiments(self, scenarios, policies, callback):
 		ema_logging.debug("evaluating experiments asynchronously")
 
-		ex_gen = experiment_generator(scenarios, self._msis, policies)
+		ex_gen = self._experiment_generator(scenarios, policies, callback)
 
 		cwd = os.getcwd()
 
-		log_message = ('storing scenario %s for policy %s on model %s')
-
-		experiments = {
-			experiment.experiment_id: experiment
-			for experiment in ex_gen
-		}
+		instrumentation = self.instrumentation
+		n_workers = len(self.client.scheduler_info()['workers'])
 
-		if self.batch_size is None:
-			# make a guess at a good batch size if one was not given
-			n_workers = len(self.client.scheduler_info()['workers'])
-			n_experiments = len(experiments)
-			self.batch_size = math.ceil(n_experiments / n_workers / 10 )
-
-		# Experiments are sent to workers in batches, as the task-scheduler overhead is high for quick-running models.
-		outcomes = self.client.map(run_experiments_on_worker, grouper(experiments.values(), self.batch_size))
+		# Experiments are sent to workers in batches, as the task-scheduler overhead is high for
+		# quick-running models. Results are passed on to the callback as soon as a batch completes.
+		batches = AdaptiveBatches(self.client, ex_gen, n_workers, batch_size=self.batch_size,
+								  instrument=instrumentation is not None,
+								  speculative=self.speculative)
 
 		ema_logging.debug("receiving experiments asynchronously")
 
-		for future, result_batch in as_completed(outcomes, with_results=True):
-			for (experiment_id, outcome) in result_batch:
-				experiment = experiments[experiment_id]
-				ema_logging.debug(
-					log_message,
-					experiment.scenario.name,
-					experiment.policy.name,
-					experiment.model_name,
-				)
-				callback(experiment, outcome)
+		for batch, results in batches:
+			outcomes = []
+			for (experiment_id, outcome, *timing) in results:
+				if timing:
+					instrumentation.ran(*timing[0])
+				outcomes.append(outcome)
+			callback.store_batch(zip(batch, outcomes))
 
 		os.chdir(cwd)
 
 		ema_logging.debug("completed evaluate_experiments")
+
+	def _submit(self, experiments, futures):
+		batch_size = self.batch_size or 1
+
+		for i in range(0, len(experiments), batch_size):
+			batch = experiments[i:i + batch_size]
+			result = self.client.submit(run_experiments_on_worker, batch,
+										pure=False)
+			result.add_done_callback(functools.partial(complete_futures, batch,
+													   futures[i:i + batch_size]))
@@ -25,6 +25,7 @@ from jupyter_client.localinterfaces import localhost
 
 from . import experiment_runner
 from .ema_multiprocessing import setup_working_directories
+from .instrumentation import measure_size
 from .model import AbstractModel
 from .util import NamedObjectMap
 from ..util import ema_exceptions, ema_logging
@@ -324,6 +325,24 @@ def _run_experiment(experiment):
     return experiment, engine.run_experiment(experiment)
 
 
+def _run_instrumented_experiment(experiment):
+    '''wrapper function for engine.run_experiment that also returns the
+    timing of the experiment'''
+    engine.runner.instrument = True
+    outcomes = engine.run_experiment(experiment)
+    timings = [timing + (measure_size(outcomes), ) for timing in
+               engine.runner.pop_timings()]
+
+    return experiment, outcomes, timings
+
+
+def _run_experiments(experiments):
+    '''wrapper function for running a batch of experiments on an
+    engine'''
+
+    return [_run_experiment(experiment) for experiment in experiments]
+
+
 def _initialize_engine(engine_id, msis, cwd):
     '''wrapper function for initializing an engine'''
     global engine
@@ -7,7 +7,9 @@ from __future__ import (unicode_literals, print_function, absolute_import,
 
 from collections import defaultdict
 
+import functools
 import io
+import itertools
 import logging
 import multiprocessing
 import os
@@ -18,8 +20,19 @@ import shutil
 import traceback
 import queue
 
-from ..util import ema_logging
+import numpy as np
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # python < 3.8
+    shared_memory = None
+
+from ..util import ema_logging, EMAError
+from .caching import CachingCallback
+from .callbacks import DefaultCallback
 from .experiment_runner import ExperimentRunner
+from .instrumentation import InstrumentedCallback, measure_size
 from .util import NamedObjectMap
 from .model import AbstractModel
 
@@ -30,6 +43,9 @@ from .model import AbstractModel
 
 __all__ = []
 
+# the number of chunks per worker process that can be waiting in the pool
+TASKS_PER_PROCESS = 2
+
 
 def initializer(*args):
     '''initializer for a worker process
@@ -159,16 +175,270 @@ def setup_working_directories(models, root_dir):
         return None
 
 
-def worker(experiment):
-    '''the worker function for executing an individual experiment
+def worker(experiments, shared_outcomes=None, instrument=False):
+    '''the worker function for executing a chunk of experiments
+
+    Parameters
+    ----------
+    experiments : list of Case instances
+    shared_outcomes : dict proxy, optional
+                      descriptors of outcome arrays in shared memory, the
+                      values for these outcomes are written directly into
+                      shared memory rather than returned. The descriptors
+                      are read when the chunk starts, so outcome arrays
+                      that have been allocated after the chunk was
+                      submitted are used as well.
+    instrument : bool, optional
+                 if True, the timings of the experiments are returned
+
+    Returns
+    -------
+    list
+        the outcomes for each experiment
+    float
+        the time in seconds it took to run the experiments
+    list or None
+        if instrument, a tuple with experiment id, start time, run time,
+        and size of the returned outcomes for each experiment
+
+    '''
+    global experiment_runner
+    start = time.time()
+    experiment_runner.instrument = instrument
+
+    if shared_outcomes is not None:
+        arrays = attach_shared_outcomes(dict(shared_outcomes))
+
+    outcomes = []
+    for experiment in experiments:
+        outcome = experiment_runner.run_experiment(experiment)
+
+        if shared_outcomes is not None:
+            outcome = store_shared_outcomes(arrays, experiment.experiment_id,
+                                            outcome)
+        outcomes.append(outcome)
+
+    timings = None
+    if instrument:
+        timings = [timing + (measure_size(outcome), ) for timing, outcome
+                   in zip(experiment_runner.pop_timings(), outcomes)]
+    return outcomes, time.time() - start, timings
+
+
+def future_worker(experiments):
+    '''the worker used by submit_tasks. An exception raised when running
+    an experiment is returned instead of its outcomes. EMAError is not an
+    Exception, so otherwise it would terminate the worker process, and
+    the task would never complete.
 
     Parameters
     ----------
-    experiment : dict
+    experiments : list of Case instances
+
+    Returns
+    -------
+    list
+        the outcomes, or the exception, for each experiment
 
     '''
     global experiment_runner
-    return experiment, experiment_runner.run_experiment(experiment)
+    msis = experiment_runner.msis
+
+    outcomes = []
+    for experiment in experiments:
+        try:
+            outcomes.append(experiment_runner.run_experiment(experiment))
+        except (Exception, EMAError) as e:
+            outcomes.append(e)
+
+            # the runner cleans up the models after an error
+            experiment_runner = ExperimentRunner(msis)
+    return outcomes
+
+
+_attached_blocks = {}
+_detached_blocks = []
+
+
+def _close_blocks(blocks):
+    '''helper function for closing shared memory blocks
+
+    Parameters
+    ----------
+    blocks : list of SharedMemory instances
+
+    Returns
+    -------
+    list
+        the blocks that could not be closed because an array is still
+        using their memory
+
+    '''
+    still_used = []
+    for block in blocks:
+        try:
+            block.close()
+        except BufferError:
+            still_used.append(block)
+    return still_used
+
+
+def attach_shared_outcomes(descriptors):
+    '''helper function for getting the outcome arrays in shared memory
+    within a worker process
+
+    Parameters
+    ----------
+    descriptors : dict
+                  outcome name as key, tuple with name of shared memory
+                  block, shape, and dtype as value
+
+    Returns
+    -------
+    dict
+        with the outcome name as key, and the numpy array as value
+
+    '''
+    global _detached_blocks
+    names = {entry[0] for entry in descriptors.values()}
+
+    # close blocks from earlier runs, a block can only be closed once
+    # there are no more arrays using it, otherwise closing it is retried
+    # on the next call
+    for name in set(_attached_blocks.keys()) - names:
+        _detached_blocks.append(_attached_blocks.pop(name)[0])
+
+    _detached_blocks = _close_blocks(_detached_blocks)
+
+    arrays = {}
+    for outcome, (name, shape, dtype) in descriptors.items():
+        try:
+            _, array = _attached_blocks[name]
+        except KeyError:
+            block = shared_memory.SharedMemory(name=name)
+            array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+            _attached_blocks[name] = block, array
+        arrays[outcome] = array
+    return arrays
+
+
+def store_shared_outcomes(arrays, experiment_id, outcomes):
+    '''store the outcomes of an experiment in shared memory
+
+    Parameters
+    ----------
+    arrays : dict
+    experiment_id : int
+    outcomes : dict
+
+    Returns
+    -------
+    dict
+        the outcomes that could not be stored in shared memory
+
+    '''
+    remaining = {}
+    for key, value in outcomes.items():
+        try:
+            arrays[key][experiment_id, ] = value
+        except (KeyError, ValueError):
+            remaining[key] = value
+    return remaining
+
+
+def start_resource_tracker():
+    '''start the resource tracker before creating the pool, so the
+    worker processes use the resource tracker of the main process for
+    shared memory blocks rather than starting their own'''
+    if shared_memory is None:
+        raise EMAError('shared memory requires python 3.8 or newer')
+
+    if os.name == 'posix':
+        from multiprocessing import resource_tracker
+        resource_tracker.ensure_running()
+
+
+class SharedOutcomes(object):
+    '''helper class for managing outcome arrays in shared memory
+
+    The outcome arrays of the callback are allocated in shared memory
+    once their shape is known. Workers write the outcomes of each
+    experiment directly into these arrays, so they do not have to be
+    returned to the main process.
+
+    The descriptors of the arrays are kept in a dict managed by a
+    server process, so workers can look up the arrays that have been
+    allocated since their chunk was submitted.
+
+    Parameters
+    ----------
+    callback : DefaultCallback instance
+
+    Attributes
+    ----------
+    descriptors : dict proxy
+                  outcome name as key, tuple with name of shared memory
+                  block, shape, and dtype as value
+
+    '''
+
+    def __init__(self, callback):
+        if shared_memory is None:
+            raise EMAError('shared memory requires python 3.8 or newer')
+
+        self.callback = callback
+        self._manager = multiprocessing.Manager()
+        self.descriptors = self._manager.dict()
+        self._blocks = []
+
+        callback._allocate = self.allocate
+
+    def allocate(self, outcome, shape):
+        '''allocate a nan filled array for outcome in shared memory
+
+        Parameters
+        ----------
+        outcome : str
+        shape : tuple
+
+        Returns
+        -------
+        numpy array
+
+        '''
+        dtype = np.dtype(float)
+        size = int(np.prod(shape)) * dtype.itemsize
+        block = shared_memory.SharedMemory(create=True, size=max(1, size))
+        self._blocks.append(block)
+
+        data = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        data[:] = np.NAN
+
+
+        self.descriptors[outcome] = (block.name, shape, dtype.str)
+
+        return data
+
+    def release(self):
+        '''copy the outcome arrays out of shared memory and remove the
+        shared memory blocks'''
+        global _detached_blocks
+        del self.callback._allocate
+
+        self.descriptors = dict(self.descriptors)
+        self._manager.shutdown()
+
+        # the callback gets copies, so no array of the callback refers to
+        # shared memory once the blocks are closed. A block that is still
+        # used elsewhere is closed on a later release.
+        for outcome in self.descriptors.keys():
+            self.callback.results[outcome] = np.array(
+                self.callback.results[outcome])
+
+        for block in self._blocks:
+            block.unlink()
+        _detached_blocks = _close_blocks(_detached_blocks + self._blocks)
+        self._blocks = []
 
 
 class SubProcessLogHandler(logging.Handler):
@@ -257,40 +527,142 @@ class LogQueueReader(threading.Thread):
                 traceback.print_exc(file=sys.stderr)
 
 
+class ChunkSizer(object):
+    '''helper class for determining how many experiments to send to a
+    worker in one go
+
+    If no chunksize is specified, the chunksize is based on the observed
+    run time of the experiments. Chunks are sized such that running a
+    chunk takes roughly target_duration seconds, which amortizes the
+    communication overhead for fast models while keeping the load
+    balanced for slow models.
+
+    Parameters
+    ----------
+    chunksize : int, optional
+    target_duration : float, optional
+                      the desired run time of a chunk in seconds
+    max_chunksize : int, optional
+
+    Attributes
+    ----------
+    n_experiments : int
+                    the number of experiments run so far
+    duration : float
+               the total run time in seconds of these experiments
+
+    '''
+
+    def __init__(self, chunksize=None, target_duration=0.1,
+                 max_chunksize=1000):
+        if chunksize is not None and chunksize < 1:
+            raise ValueError('chunksize should be 1 or larger')
+
+        self.fixed = chunksize is not None
+        self.chunksize = chunksize if self.fixed else 1
+        self.target_duration = target_duration
+        self.max_chunksize = max_chunksize
+
+        self.n_experiments = 0
+        self.duration = 0
+
+    def update(self, n_experiments, duration):
+        '''update the chunksize given the time it took to run a chunk
+
+        Parameters
+        ----------
+        n_experiments : int
+        duration : float
+
+        '''
+        # the totals are also kept for a fixed chunksize, they are used
+        # for estimating the run time of an experiment
+        self.n_experiments += n_experiments
+        self.duration += duration
+
+        if self.fixed:
+            return
+
+        runtime = self.duration / self.n_experiments
+        if runtime > 0:
+            chunksize = int(self.target_duration / runtime)
+        else:
+            chunksize = self.max_chunksize
+        self.chunksize = min(max(1, chunksize), self.max_chunksize)
+
+
 class ExperimentFeeder(threading.Thread):
+    '''thread that sends chunks of experiments to the pool
+
+    Before each chunk is sent, a slot is acquired from pending, which
+    the ResultsReader releases once the results of a chunk have been
+    stored. This bounds the number of chunks in the pool, so the
+    experiments are generated lazily and the chunksize can adapt to the
+    observed run times.
+
+    '''
     
-    def __init__(self, pool, results_queue, experiments):
+    def __init__(self, pool, results_queue, experiments, chunksizer,
+                 pending, shared_outcomes=None, instrument=False):
         threading.Thread.__init__(self, name="task feeder")
         self.pool = pool
         self.experiments = experiments
         self.results_queue = results_queue
+        self.chunksizer = chunksizer
+        self.pending = pending
+        self.shared_outcomes = shared_outcomes
+        self.kwargs = {'instrument': True} if instrument else {}
         
         self.daemon = True
 
     def run(self):
-        for experiment in self.experiments:
-            result = self.pool.apply_async(worker, [experiment])
-            self.results_queue.put(result)
+        experiments = iter(self.experiments)
+        while True:
+            self.pending.acquire()
+            chunk = list(itertools.islice(experiments,
+                                          self.chunksizer.chunksize))
+            if not chunk:
+                self.pending.release()
+                break
+
+            args = [chunk]
+            if self.shared_outcomes is not None:
+                args.append(self.shared_outcomes.descriptors)
+
+            result = self.pool.apply_async(worker, args, self.kwargs)
+            self.results_queue.put((chunk, result))
 
 
 class ResultsReader(threading.Thread):
     
-    def __init__(self, queue, callback):
+    def __init__(self, queue, callback, chunksizer, pending,
+                 instrumentation=None):
         threading.Thread.__init__(self, name="results reader")
         self.queue = queue
         self.callback = callback
+        self.chunksizer = chunksizer
+        self.pending = pending
+        self.instrumentation = instrumentation
         self.daemon = True
     
     def run(self):
         while True:
             try:
-                result = self.queue.get()
+                entry = self.queue.get()
                 # get the logger for this record
-                if result is None:
+                if entry is None:
                     ema_logging.debug("none received")
                     break
-                
-                self.callback(*result.get())
+
+                chunk, result = entry
+                try:
+                    outcomes, duration, timings = result.get()
+                    self.chunksizer.update(len(chunk), duration)
+                    if timings:
+                        self.instrumentation.update(timings)
+                    self.callback.store_batch(zip(chunk, outcomes))
+                finally:
+                    self.pending.release()
             except (KeyboardInterrupt, SystemExit):
                 raise
             except EOFError:
@@ -301,7 +673,8 @@ class ResultsReader(threading.Thread):
                 traceback.print_exc(file=sys.stderr)
 
 
-def add_tasks(pool, experiments, callback):
+def add_tasks(pool, experiments, callback, chunksize=None,
+              shared_memory=False, instrumentation=None, max_pending=None):
     '''add experiments to pool
 
     Parameters
@@ -309,16 +682,101 @@ def add_tasks(pool, experiments, callback):
     pool : Pool instance
     experiments : collection
     callback : callable
+    chunksize : int, optional
+                the number of experiments to send to a worker in one go.
+                If not provided, the chunksize is determined based on the
+                observed run time of the experiments.
+    shared_memory : bool, optional
+                    if True, workers store the outcomes directly in
+                    shared memory. Only supported in combination with the
+                    DefaultCallback.
+    instrumentation : Instrumentation instance, optional
+                      if provided, the timings of the experiments are
+                      recorded in it
+    max_pending : int, optional
+                  the maximum number of chunks that have been sent to the
+                  pool but whose results have not yet been stored,
+                  defaults to TASKS_PER_PROCESS times the number of cpus
 
     '''
+    if max_pending is None:
+        max_pending = TASKS_PER_PROCESS * multiprocessing.cpu_count()
     
     results_queue = queue.Queue()
+    chunksizer = ChunkSizer(chunksize)
+    pending = threading.BoundedSemaphore(max_pending)
+
+    shared_outcomes = None
+    if shared_memory:
+        # look through the wrappers added by the evaluator, subclasses of
+        # DefaultCallback can allocate their outcomes differently
+        inner = callback
+        while isinstance(inner, (CachingCallback, InstrumentedCallback)):
+            inner = inner.callback
+
+        if type(inner) is DefaultCallback:
+            shared_outcomes = SharedOutcomes(inner)
+        else:
+            ema_logging.warning(('shared memory is only supported in '
+                                 'combination with the DefaultCallback'))
     
-    feeder = ExperimentFeeder(pool, results_queue, experiments)
-    reader = ResultsReader(results_queue, callback)
+    feeder = ExperimentFeeder(pool, results_queue, experiments, chunksizer,
+                              pending, shared_outcomes,
+                              instrument=instrumentation is not None)
+    reader = ResultsReader(results_queue, callback, chunksizer, pending,
+                           instrumentation)
     feeder.start()
     reader.start()
     
-    feeder.join()
-    results_queue.put(None)
-    reader.join()
\ No newline at end of file
+    try:
+        feeder.join()
+        results_queue.put(None)
+        reader.join()
+    finally:
+        if shared_outcomes is not None:
+            shared_outcomes.release()
+
+
+def submit_tasks(pool, experiments, futures, chunksize=None):
+    '''submit experiments to pool without waiting for them to complete
+
+    Parameters
+    ----------
+    pool : Pool instance
+    experiments : list of Case instances
+    futures : list of concurrent.futures.Future instances
+              the futures to complete with a tuple of the experiment and
+              its outcomes, one for each experiment
+    chunksize : int, optional
+                the number of experiments to send to a worker in one go,
+                defaults to 1
+
+    '''
+    chunksize = chunksize or 1
+
+    for i in range(0, len(experiments), chunksize):
+        chunk = experiments[i:i + chunksize]
+        chunk_futures = futures[i:i + chunksize]
+
+        pool.apply_async(future_worker, [chunk],
+                         callback=functools.partial(_set_results, chunk,
+                                                    chunk_futures),
+                         error_callback=functools.partial(_set_exception,
+                                                          chunk_futures))
+
+
+def _set_results(experiments, futures, outcomes):
+    for experiment, future, outcome in zip(experiments, futures, outcomes):
+        if not future.set_running_or_notify_cancel():
+            continue
+
+        if isinstance(outcome, BaseException):
+            future.set_exception(outcome)
+        else:
+            future.set_result((experiment, outcome))
+
+
+def _set_exception(futures, exception):
+    for future in futures:
+        if future.set_running_or_notify_cancel():
+            future.set_exception(exception)
@@ -6,9 +6,16 @@ optimization
 from __future__ import (unicode_literals, print_function, absolute_import,
                         division)
 
+import asyncio
+from collections.abc import Mapping
+import concurrent.futures
+import functools
+import hashlib
+import json
 import multiprocessing
 import numbers
 import os
+import pickle
 import random
 import shutil
 import string
@@ -17,11 +24,16 @@ import warnings
 
 warnings.simplefilter("once", ImportWarning)
 
-from .callbacks import DefaultCallback
-from .ema_multiprocessing import LogQueueReader, initializer, add_tasks
+from .caching import CachingCallback, _normalize
+from .callbacks import AbstractCallback, DefaultCallback, FileBasedCallback
+from .ema_multiprocessing import (LogQueueReader, initializer, add_tasks,
+                                  submit_tasks, start_resource_tracker,
+                                  TASKS_PER_PROCESS)
 from .ema_ipyparallel import (start_logwatcher, set_engine_logger,
-                              initialize_engines, cleanup, _run_experiment)
+                              initialize_engines, cleanup, _run_experiment,
+                              _run_experiments, _run_instrumented_experiment)
 from .experiment_runner import ExperimentRunner
+from .instrumentation import Instrumentation, InstrumentedCallback
 from .model import AbstractModel
 from .optimization import (evaluate_robust, evaluate, EpsNSGAII,
                            to_problem, to_robust_problem,
@@ -72,6 +84,19 @@ class BaseEvaluator(object):
     msis : collection of models
     searchover : {None, 'levers', 'uncertainties'}, optional
                   to be used in combination with platypus
+    cache : AbstractCache instance, optional
+            if provided, the outcomes of all experiments are stored in
+            the cache, and experiments that are already in the cache are
+            not run again.
+    instrument : bool, optional
+                 if True, the run time, queue wait, size of the outcomes,
+                 and callback time of each experiment are recorded.
+
+    Attributes
+    ----------
+    instrumentation : Instrumentation instance or None
+                      the timings of the experiments of the most recent
+                      call to :func:`perform_experiments`, if instrumented
 
     Raises
     ------
@@ -80,13 +105,16 @@ class BaseEvaluator(object):
     '''
     reporting_frequency = 3
 
-    def __init__(self, msis):
+    def __init__(self, msis, cache=None, instrument=False):
         super(BaseEvaluator, self).__init__()
 
         if isinstance(msis, AbstractModel):
             msis = [msis]
 
         self._msis = msis
+        self.cache = cache
+        self.instrument = instrument
+        self.instrumentation = None
 
     def __enter__(self):
         self.initialize()
@@ -110,6 +138,103 @@ class BaseEvaluator(object):
         '''used by ema_workbench'''
         raise NotImplementedError
 
+    def submit_experiments(self, scenarios, policies):
+        '''submit experiments without waiting for them to complete
+
+        Parameters
+        ----------
+        scenarios : collection of Scenario instances
+        policies : collection of Policy instances
+
+        Returns
+        -------
+        list of concurrent.futures.Future instances
+            one for each experiment, the result of which is a tuple
+            with the experiment and its outcomes
+
+        '''
+        futures = []
+        experiments = []
+        pending = []
+
+        models = {model.name: model for model in self._msis}
+        for experiment in experiment_generator(scenarios, self._msis,
+                                               policies):
+            future = concurrent.futures.Future()
+            futures.append(future)
+
+            if self.cache is not None:
+                key = self.cache.key(models[experiment.model_name],
+                                     experiment)
+                outcomes = self.cache.lookup(key)
+                if outcomes is not None:
+                    future.set_running_or_notify_cancel()
+                    future.set_result((experiment, outcomes))
+                    continue
+                future.add_done_callback(functools.partial(_store_in_cache,
+                                                           self.cache, key))
+
+            experiments.append(experiment)
+            pending.append(future)
+
+        if experiments:
+            self._submit(experiments, pending)
+        return futures
+
+    def _submit(self, experiments, futures):
+        '''submit experiments, and complete the associated futures
+        once the experiments have been run'''
+        raise NotImplementedError
+
+    def iter_experiments(self, scenarios, policies):
+        '''generator that performs the experiments and yields the
+        results in the order in which they complete
+
+        Parameters
+        ----------
+        scenarios : collection of Scenario instances
+        policies : collection of Policy instances
+
+        Yields
+        ------
+        tuple
+            the experiment and its outcomes
+
+        '''
+        futures = self.submit_experiments(scenarios, policies)
+        for future in concurrent.futures.as_completed(futures):
+            yield future.result()
+
+    async def aiter_experiments(self, scenarios, policies):
+        '''asynchronous generator that performs the experiments and
+        yields the results in the order in which they complete, for use
+        with asyncio
+
+        Parameters
+        ----------
+        scenarios : collection of Scenario instances
+        policies : collection of Policy instances
+
+        Yields
+        ------
+        tuple
+            the experiment and its outcomes
+
+        '''
+        futures = [asyncio.wrap_future(future) for future in
+                   self.submit_experiments(scenarios, policies)]
+        for future in asyncio.as_completed(futures):
+            yield await future
+
+    def _experiment_generator(self, scenarios, policies, callback):
+        '''generate the experiments to run, skipping the experiments
+        that are in the cache or that have already been completed'''
+        ex_gen = experiment_generator(scenarios, self._msis, policies)
+        if isinstance(callback, (AbstractCallback, CachingCallback,
+                                 InstrumentedCallback)):
+            ex_gen = callback.filter(ex_gen)
+        return ex_gen
+
     def evaluate_all(self, jobs, **kwargs):
         '''makes ema_workbench evaluators compatible with Platypus
         evaluators as used by platypus algorithms
@@ -150,7 +275,8 @@ class BaseEvaluator(object):
                             reporting_interval=None, reporting_frequency=10,
                             uncertainty_union=False, lever_union=False,
                             outcome_union=False, uncertainty_sampling=LHS,
-                            levers_sampling=LHS, callback=None):
+                            levers_sampling=LHS, callback=None,
+                            checkpoint=None, runtime_column=False):
         '''convenience method for performing experiments.
 
         is forwarded to :func:perform_experiments, with evaluator and
@@ -166,7 +292,8 @@ class BaseEvaluator(object):
                                    outcome_union=outcome_union,
                                    uncertainty_sampling=uncertainty_sampling,
                                    levers_sampling=levers_sampling,
-                                   callback=callback)
+                                   callback=callback, checkpoint=checkpoint,
+                                   runtime_column=runtime_column)
 
     def optimize(self, algorithm=EpsNSGAII, nfe=10000, searchover='levers',
                  reference=None, constraints=None, **kwargs):
@@ -205,20 +332,49 @@ class SequentialEvaluator(BaseEvaluator):
     def evaluate_experiments(self, scenarios, policies, callback):
         ema_logging.info("performing experiments sequentially")
 
-        ex_gen = experiment_generator(scenarios, self._msis, policies)
+        ex_gen = self._experiment_generator(scenarios, policies, callback)
 
         models = NamedObjectMap(AbstractModel)
         models.extend(self._msis)
 
         cwd = os.getcwd()
-        runner = ExperimentRunner(models)
+        instrumentation = self.instrumentation
+        runner = ExperimentRunner(models,
+                                  instrument=instrumentation is not None)
         
         for experiment in ex_gen:
             outcomes = runner.run_experiment(experiment)
+            if instrumentation is not None:
+                instrumentation.ran(*runner.pop_timings()[0])
             callback(experiment, outcomes)
         runner.cleanup()
         os.chdir(cwd)
 
+    def _submit(self, experiments, futures):
+        # there is nothing to wait for, so the experiments are run
+        # right away
+        models = NamedObjectMap(AbstractModel)
+        models.extend(self._msis)
+
+        cwd = os.getcwd()
+        runner = ExperimentRunner(models)
+
+        for experiment, future in zip(experiments, futures):
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                outcomes = runner.run_experiment(experiment)
+            except (Exception, EMAError) as e:
+                future.set_exception(e)
+
+                # the runner cleans up the models after an error
+                runner = ExperimentRunner(models)
+            else:
+                future.set_result((experiment, outcomes))
+        runner.cleanup()
+        os.chdir(cwd)
+
 
 class MultiprocessingEvaluator(BaseEvaluator):
     '''evaluator for experiments using a multiprocessing pool
@@ -227,14 +383,28 @@ class MultiprocessingEvaluator(BaseEvaluator):
     ----------
     msis : collection of models
     n_processes : int (optional)
+    chunksize : int (optional)
+                the number of experiments to send to a worker process in
+                one go. If not provided, the chunksize is determined based
+                on the observed run time of the experiments.
+    shared_memory : bool (optional)
+                    if True, outcome arrays are allocated in shared memory
+                    once their shape is known, and the worker processes
+                    store their outcomes directly in these arrays. This
+                    avoids sending large outcomes, such as long time
+                    series, back to the main process. Requires Python 3.8
+                    or newer and the DefaultCallback.
 
     '''
 
-    def __init__(self, msis, n_processes=None, **kwargs):
+    def __init__(self, msis, n_processes=None, chunksize=None,
+                 shared_memory=False, **kwargs):
         super(MultiprocessingEvaluator, self).__init__(msis, **kwargs)
 
         self._pool = None
         self.n_processes = n_processes
+        self.chunksize = chunksize
+        self.shared_memory = shared_memory
 
     def initialize(self):
         log_queue = multiprocessing.Queue()
@@ -261,11 +431,12 @@ class MultiprocessingEvaluator(BaseEvaluator):
             self.root_dir = os.path.abspath("tmp"+random_part)
             os.makedirs(self.root_dir)
 
+        if self.shared_memory:
+            start_resource_tracker()
+
         self._pool = multiprocessing.Pool(self.n_processes, initializer,
                                           (self._msis, log_queue, loglevel,
                                            self.root_dir))
-        
-        self._pool._taskqueue.maxsize = self._pool._processes * 5
         ema_logging.info("pool started")
         return self
 
@@ -290,8 +461,16 @@ class MultiprocessingEvaluator(BaseEvaluator):
             shutil.rmtree(self.root_dir)
 
     def evaluate_experiments(self, scenarios, policies, callback):
-        ex_gen = experiment_generator(scenarios, self._msis, policies)
-        add_tasks(self._pool, ex_gen, callback)
+        ex_gen = self._experiment_generator(scenarios, policies, callback)
+        n_processes = self.n_processes or multiprocessing.cpu_count()
+        add_tasks(self._pool, ex_gen, callback, chunksize=self.chunksize,
+                  shared_memory=self.shared_memory,
+                  instrumentation=self.instrumentation,
+                  max_pending=TASKS_PER_PROCESS * n_processes)
+
+    def _submit(self, experiments, futures):
+        submit_tasks(self._pool, experiments, futures,
+                     chunksize=self.chunksize)
 
 
 class IpyparallelEvaluator(BaseEvaluator):
@@ -329,14 +508,121 @@ class IpyparallelEvaluator(BaseEvaluator):
         cleanup(self.client)
 
     def evaluate_experiments(self, scenarios, policies, callback):
-        ex_gen = experiment_generator(scenarios, self._msis, policies)
+        ex_gen = self._experiment_generator(scenarios, policies, callback)
 
         lb_view = self.client.load_balanced_view()
-        results = lb_view.map(_run_experiment,
-                              ex_gen, ordered=False, block=False)
 
-        for entry in results:
-            callback(*entry)
+        if self.instrumentation is None:
+            results = lb_view.map(_run_experiment,
+                                  ex_gen, ordered=False, block=False)
+
+            for entry in results:
+                callback(*entry)
+        else:
+            results = lb_view.map(_run_instrumented_experiment,
+                                  ex_gen, ordered=False, block=False)
+
+            for experiment, outcomes, timings in results:
+                self.instrumentation.update(timings)
+                callback(experiment, outcomes)
+
+    def _submit(self, experiments, futures):
+        lb_view = self.client.load_balanced_view()
+
+        for experiment, future in zip(experiments, futures):
+            result = lb_view.apply_async(_run_experiments, [experiment])
+            result.add_done_callback(functools.partial(complete_futures,
+                                                       [experiment],
+                                                       [future]))
+
+
+def complete_futures(experiments, futures, source):
+    '''complete the futures for a batch of experiments
+
+    Parameters
+    ----------
+    experiments : list of Case instances
+    futures : list of concurrent.futures.Future instances
+    source : future like
+             the result of which is a sequence with for each experiment a
+             tuple of an identifier of the experiment and its outcomes
+
+    '''
+    try:
+        results = source.result()
+    except (Exception, EMAError) as e:
+        for future in futures:
+            if future.set_running_or_notify_cancel():
+                future.set_exception(e)
+        return
+
+    for experiment, future, (_, outcomes) in zip(experiments, futures,
+                                                 results):
+        if future.set_running_or_notify_cancel():
+            future.set_result((experiment, outcomes))
+
+
+def _store_in_cache(cache, key, future):
+    '''done callback for storing the outcomes of an experiment in the
+    cache'''
+    if not future.cancelled() and future.exception() is None:
+        _, outcomes = future.result()
+        cache.put(key, outcomes)
+
+
+def _fingerprint(models, scenarios, policies, *options):
+    '''helper function for a stable hash of the arguments of
+    perform_experiments that determine the experiments and the outcomes
+
+    Parameters
+    ----------
+    models : one or more AbstractModel instances
+    scenarios : int or collection of Scenario instances
+    policies :  int or collection of Policy instances
+    options : the remaining arguments that affect the experiments
+
+    Returns
+    -------
+    str
+
+    '''
+    if isinstance(models, AbstractModel):
+        models = [models]
+
+    values = []
+    for model in models:
+        values.append(('model', model.name))
+        for attribute in ('uncertainties', 'levers', 'constants'):
+            values.append((attribute, sorted(repr(entry) for entry in
+                                             getattr(model, attribute))))
+        values.append(('outcomes', sorted(model.outcomes.keys())))
+
+    # only the values of designs matter, their names are generated
+    for designs in (scenarios, policies):
+        if isinstance(designs, (numbers.Integral, Mapping)):
+            designs = [designs] if designs else []
+        values.append([sorted((k, _normalize(v)) for k, v in d.items())
+                       if isinstance(d, Mapping) else d for d in designs])
+    values.append(options)
+
+    return hashlib.sha1(repr(values).encode('utf-8')).hexdigest()
+
+
+def _read_checkpoint(file_name):
+    '''helper function for reading the fingerprint of the arguments and
+    whether the run has been completed from a checkpoint'''
+    try:
+        with open(file_name) as fh:
+            return json.load(fh)
+    except (IOError, OSError):
+        return {'fingerprint': None, 'completed': False}
+
+
+def _write_checkpoint(file_name, fingerprint, completed):
+    '''helper function for writing the fingerprint of the arguments and
+    whether the run has been completed to a checkpoint'''
+    with open(file_name, 'w') as fh:
+        json.dump({'fingerprint': fingerprint, 'completed': completed}, fh)
 
 
 def perform_experiments(models, scenarios=0, policies=0, evaluator=None,
@@ -344,7 +630,8 @@ def perform_experiments(models, scenarios=0, policies=0, evaluator=None,
                         uncertainty_union=False, lever_union=False,
                         outcome_union=False, uncertainty_sampling=LHS,
                         levers_sampling=LHS, callback=None,
-                        return_callback=False):
+                        return_callback=False, checkpoint=None,
+                        runtime_column=False):
     '''sample uncertainties and levers, and perform the resulting experiments
     on each of the models
 
@@ -362,6 +649,22 @@ def perform_experiments(models, scenarios=0, policies=0, evaluator=None,
     lever_sampling : {LHS, MC, FF, PFF, SOBOL, MORRIS, FAST}, optional
     callback  : Callback instance, optional
     return_callback : boolean, optional
+    checkpoint : str, optional
+                 directory in which the design and the results are
+                 stored while running. If this directory contains the
+                 results of an earlier, interrupted, run with the same
+                 arguments, the design is read from it and only the
+                 experiments that were not completed are performed. If
+                 the earlier run has been completed, its results are 
+                 returned. Results are stored using a 
+                 :class:`FileBasedCallback`.
+    runtime_column : bool, optional
+                     if True, the experiments are instrumented, even if
+                     the evaluator is not, and the run time of each
+                     experiment in seconds is added as a runtime column
+                     to the experiments. Experiments that were not run,
+                     because their outcomes were retrieved from a cache or
+                     from an earlier run, have a nan runtime.
     
     Returns
     -------
@@ -369,9 +672,41 @@ def perform_experiments(models, scenarios=0, policies=0, evaluator=None,
         the experiments as a numpy recarray, and a dict
         with the name of an outcome as key, and the associated scores
         as numpy array. Experiments and outcomes are alinged on index.
+
+    Raises
+    ------
+    EMAError
+        if checkpoint contains the results of a run with different
+        models, scenarios, policies, or outcomes
     
 
     '''
+    completed = False
+    if checkpoint is not None:
+        if callback:
+            raise EMAError('a callback cannot be combined with checkpoint')
+
+        fingerprint = _fingerprint(models, scenarios, policies,
+                                   uncertainty_union, lever_union,
+                                   outcome_union, uncertainty_sampling,
+                                   levers_sampling)
+        design = os.path.join(checkpoint, 'design.pkl')
+        state = os.path.join(checkpoint, 'checkpoint.json')
+        resume = os.path.exists(design)
+        if resume:
+            stored = _read_checkpoint(state)
+            if stored['fingerprint'] != fingerprint:
+                raise EMAError(('cannot resume, {} contains the results of '
+                                'a run with different models, scenarios, '
+                                'policies, or outcomes').format(checkpoint))
+            completed = stored['completed']
+
+            ema_logging.info('reading design from {}'.format(design))
+            with open(design, 'rb') as fh:
+                scenarios, policies = pickle.load(fh)
+        callback = functools.partial(FileBasedCallback,
+                                     directory=checkpoint, resume=resume)
+
     if not scenarios and not policies:
         raise EMAError(('no experiments possible since both '
                         'scenarios and policies are 0'))
@@ -442,10 +777,33 @@ def perform_experiments(models, scenarios=0, policies=0, evaluator=None,
                            reporting_interval=reporting_interval,
                            reporting_frequency=reporting_frequency)        
 
+    if checkpoint is not None and not resume:
+        # the callback has created the directory, so we can now store
+        # the design in it
+        with open(design, 'wb') as fh:
+            pickle.dump((scenarios, policies), fh,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        _write_checkpoint(state, fingerprint, False)
+
     if not evaluator:
         evaluator = SequentialEvaluator(models)
 
-    evaluator.evaluate_experiments(scenarios, policies, callback)
+    if evaluator.cache is not None:
+        if isinstance(models, AbstractModel):
+            models = [models]
+        callback = CachingCallback(callback, evaluator.cache, models)
+
+    if evaluator.instrument or runtime_column:
+        evaluator.instrumentation = Instrumentation()
+        callback = InstrumentedCallback(callback, evaluator.instrumentation)
+    else:
+        evaluator.instrumentation = None
+
+    if completed:
+        ema_logging.info(('all experiments in {} have been '
+                          'completed').format(checkpoint))
+    else:
+        evaluator.evaluate_experiments(scenarios, policies, callback)
 
     if callback.i != nr_of_exp:
         raise EMAError(('some fatal error has occurred while '
@@ -455,10 +813,24 @@ def perform_experiments(models, scenarios=0, policies=0, evaluator=None,
 
     ema_logging.info("experiments finished")
 
+    if isinstance(callback, InstrumentedCallback):
+        callback = callback.callback
+    if isinstance(callback, CachingCallback):
+        callback = callback.callback
+
+    if checkpoint is not None and not completed:
+        callback.flush()
+        _write_checkpoint(state, fingerprint, True)
+
     if return_callback:
         return callback
 
     results = callback.get_results()
+
+    if runtime_column:
+        experiments, outcomes = results
+        experiments['runtime'] = evaluator.instrumentation.runtimes(
+            experiments.index)
     return results
 
 
@@ -476,6 +848,13 @@ def optimize(models, algorithm=EpsNSGAII, nfe=10000,
     kwargs : additional arguments to pass on to algorithm
     convergence : function or collection of functions, optional
     constraints : list, optional
+    asynchronous : bool, optional
+                   if True, a :class:`SteadyStateEpsMOEA` is used rather
+                   than algorithm. This submits new candidate solutions as
+                   soon as earlier ones have been evaluated, which keeps
+                   all workers busy if run times vary. Requires an
+                   evaluator that implements submit_experiments, and an
+                   epsilons keyword argument.
     kwargs : any additional arguments will be passed on to algorithm
 
     Returns
@@ -526,6 +905,9 @@ def robust_optimize(model, robustness_functions, scenarios,
     algorithm : platypus Algorithm instance
     nfe : int
     constraints : list
+    asynchronous : bool, optional
+                   if True, a :class:`SteadyStateEpsMOEA` is used rather
+                   than algorithm, see :func:`optimize`.
     kwargs : any additional arguments will be passed on to algorithm
 
     Raises
@@ -6,6 +6,7 @@ from __future__ import (absolute_import, print_function, division,
                         unicode_literals)
 
 import sys
+import time
 import traceback
 
 from ..util import ema_logging, EMAError, CaseError
@@ -27,6 +28,9 @@ class ExperimentRunner(object):
     ----------
     msis : dict
     model_kwargs : dict
+    instrument : bool, optional
+                 if True, the start time and run time of each experiment
+                 are recorded in timings
 
     Attributes
     ----------
@@ -37,11 +41,17 @@ class ExperimentRunner(object):
            models indexed by name
     model_kwargs : dict
                    keyword arguments for model_init
+    timings : list of tuples
+              experiment id, start time since the epoch, and run time in
+              seconds of each experiment run since the last call to
+              :meth:`pop_timings`
 
     '''
 
-    def __init__(self, msis):
+    def __init__(self, msis, instrument=False):
         self.msis = msis
+        self.instrument = instrument
+        self.timings = []
         self.log_message = ('running scenario {scenario_id} for policy '
                             '{policy_name} on model {model_name}')
 
@@ -78,13 +88,18 @@ class ExperimentRunner(object):
         policy_name = experiment.policy.name
         model_name = experiment.model_name
         model = self.msis[model_name]
-        policy = experiment.policy.copy()
+        policy = experiment.policy
         scenario_id = experiment.scenario.name
 
         ema_logging.debug(self.log_message.format(scenario_id=scenario_id,
                                                   policy_name=policy_name,
                                                   model_name=model_name))
         scenario = experiment.scenario
+
+        if self.instrument:
+            started = time.time()
+            start = time.perf_counter()
+
         try:
             model.run_model(scenario, policy)
         except CaseError as e:
@@ -108,4 +123,15 @@ class ExperimentRunner(object):
         outcomes = model.outcomes_output
         model.reset_model()
 
+        if self.instrument:
+            self.timings.append((experiment.experiment_id, started,
+                                 time.perf_counter() - start))
+
         return outcomes
+
+    def pop_timings(self):
+        '''returns the timings recorded since the last call, and clears
+        them'''
+        timings = self.timings
+        self.timings = []
+        return timings
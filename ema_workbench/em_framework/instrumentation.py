@@ -0,0 +1,246 @@
+'''
+
+This module provides optional instrumentation of the hot path of performing
+experiments. If an evaluator is created with ``instrument=True``, the
+following is recorded for each experiment:
+
+* runtime, the wall time in seconds of running the model
+* queue_wait, the time in seconds between handing the experiment to the
+  evaluator and the start of running it on a worker
+* size, the size in bytes of the pickled outcomes returned by a worker.
+  This is not available for the :class:`SequentialEvaluator` because it does
+  not serialize the outcomes.
+* callback_time, the time in seconds spent in storing the outcomes in the
+  callback
+
+After :func:`perform_experiments`, the :class:`Instrumentation` instance
+with these timings is available as the instrumentation attribute of the
+evaluator. If instrumentation is disabled, the only overhead is a check of
+a flag for each experiment.
+
+Queue wait is based on the system clocks of the main process and the
+workers, so it is only meaningful if these clocks are synchronized.
+
+'''
+from __future__ import (absolute_import, print_function, division,
+                        unicode_literals)
+
+import pickle
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+
+__all__ = ['Instrumentation']
+
+
+def measure_size(obj):
+    '''returns the size in bytes of obj when pickled'''
+    return len(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+class Instrumentation(object):
+    '''
+    Collects the timings of individual experiments. The timings are
+    reported from different threads in some of the evaluators, so
+    updating them is serialized.
+
+    Attributes
+    ----------
+    columns : list of str
+              the recorded metrics
+
+    '''
+    columns = ['runtime', 'queue_wait', 'size', 'callback_time']
+
+    def __init__(self):
+        self._submitted = {}
+        self._runs = {}
+        self._callback_times = {}
+        self._lock = threading.Lock()
+
+    def submitted(self, experiment_id):
+        '''record that an experiment has been handed to the evaluator
+
+        Parameters
+        ----------
+        experiment_id : int
+
+        '''
+        self._submitted[experiment_id] = time.time()
+
+    def ran(self, experiment_id, started, runtime, size=np.nan):
+        '''record the run of an experiment
+
+        Parameters
+        ----------
+        experiment_id : int
+        started : float
+                  the time, since the epoch, at which the run started
+        runtime : float
+                  the wall time of the run in seconds
+        size : int, optional
+               size of the pickled outcomes in bytes
+
+        '''
+        with self._lock:
+            self._runs[experiment_id] = (started, runtime, size)
+
+    def update(self, timings):
+        '''record the runs of many experiments
+
+        Parameters
+        ----------
+        timings : iterable of tuples
+                  tuples of experiment id, started, runtime, and size,
+                  see :meth:`ran`
+
+        '''
+        with self._lock:
+            for experiment_id, started, runtime, size in timings:
+                self._runs[experiment_id] = (started, runtime, size)
+
+    def stored(self, experiment_ids, duration):
+        '''record the time it took to store the outcomes of one or more
+        experiments in the callback, the duration is divided evenly over
+        the experiments
+
+        Parameters
+        ----------
+        experiment_ids : list of int
+        duration : float
+
+        '''
+        duration = duration / len(experiment_ids)
+        with self._lock:
+            for experiment_id in experiment_ids:
+                self._callback_times[experiment_id] = duration
+
+    def to_dataframe(self):
+        '''
+        Returns
+        -------
+        DataFrame
+            the timings, with a row for each experiment indexed by
+            experiment id, and a column for each metric. Metrics which are
+            not available for an experiment are nan.
+
+        '''
+        with self._lock:
+            runs = pd.DataFrame.from_dict(self._runs, orient='index',
+                                          columns=['started', 'runtime',
+                                                   'size'])
+            submitted = pd.Series(self._submitted, dtype=float)
+            callback_times = pd.Series(self._callback_times, dtype=float)
+
+        index = runs.index.union(submitted.index).union(callback_times.index)
+        timings = pd.DataFrame(index=index, columns=self.columns,
+                               dtype=float)
+        timings['runtime'] = runs['runtime']
+        timings['size'] = runs['size']
+        timings['queue_wait'] = runs['started'] - submitted
+        timings['callback_time'] = callback_times
+        timings.index.name = 'experiment_id'
+        return timings.sort_index()
+
+    def runtimes(self, experiment_ids):
+        '''
+        Parameters
+        ----------
+        experiment_ids : array like
+
+        Returns
+        -------
+        numpy array
+            the runtime of each experiment, nan for experiments that were
+            not run, for example because their outcomes were retrieved
+            from a cache
+
+        '''
+        runtimes = self.to_dataframe()['runtime']
+        return runtimes.reindex(experiment_ids).values
+
+    def summary(self):
+        '''
+        Returns
+        -------
+        DataFrame
+            with a row for each metric, and the descriptive statistics and
+            total of the metric over all experiments as columns
+
+        '''
+        timings = self.to_dataframe()
+        summary = timings.describe().T
+        summary['total'] = timings.sum()
+        return summary
+
+    def histogram(self, metric='runtime', bins=10):
+        '''
+        Parameters
+        ----------
+        metric : {'runtime', 'queue_wait', 'size', 'callback_time'}, optional
+        bins : int or sequence of scalars, optional
+               passed on to :func:`numpy.histogram`
+
+        Returns
+        -------
+        counts : numpy array
+        bin_edges : numpy array
+
+        '''
+        values = self.to_dataframe()[metric].dropna().values
+        return np.histogram(values, bins=bins)
+
+
+class InstrumentedCallback(object):
+    '''
+    Wrapper around a callback that records the time it takes to store
+    outcomes in the callback. Its :meth:`filter` method records the time at
+    which each experiment is handed to the evaluator.
+
+    Parameters
+    ----------
+    callback : AbstractCallback instance
+    instrumentation : Instrumentation instance
+
+    '''
+
+    def __init__(self, callback, instrumentation):
+        self.callback = callback
+        self.instrumentation = instrumentation
+
+    def __getattr__(self, name):
+        return getattr(self.callback, name)
+
+    def __call__(self, experiment, outcomes):
+        start = time.perf_counter()
+        self.callback(experiment, outcomes)
+        self.instrumentation.stored([experiment.experiment_id],
+                                    time.perf_counter() - start)
+
+    def store_batch(self, results):
+        results = list(results)
+        if not results:
+            return
+
+        start = time.perf_counter()
+        self.callback.store_batch(results)
+        self.instrumentation.stored([e.experiment_id for e, _ in results],
+                                    time.perf_counter() - start)
+
+    def filter(self, experiments):
+        '''
+        Generator that yields the experiments that pass the filter of the
+        wrapped callback, and records the time at which the evaluator
+        requests each of them.
+
+        Parameters
+        ----------
+        experiments : iterable of Case instances
+
+        '''
+        for experiment in self.callback.filter(experiments):
+            self.instrumentation.submitted(experiment.experiment_id)
+            yield experiment
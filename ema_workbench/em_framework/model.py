@@ -18,9 +18,9 @@ try:
 except ImportError:
     from collections.abc import MutableMapping  # @UnusedImport
 
-from collections import defaultdict
+import numpy as np
 
-from .util import (NamedObject, combine, NamedObjectMapDescriptor)
+from .util import (NamedObject, NamedObjectMapDescriptor)
 from .parameters import Parameter, Constant, CategoricalParameter, Experiment
 from .outcomes import AbstractOutcome
 from ..util import debug, EMAError, ema_logging
@@ -32,7 +32,8 @@ from ..util.ema_logging import method_logger
 #
 
 __all__ = ['AbstractModel', 'Model', 'FileModel', 'Replicator',
-           'SingleReplication', 'ReplicatorModel']
+           'SingleReplication', 'ReplicatorModel',
+           'VectorizedReplicatorModel']
 
 
 class ModelMeta(abc.ABCMeta):
@@ -225,11 +226,14 @@ class AbstractModel(six.with_metaclass(ModelMeta, NamedObject)):
 
         """
         if not self.initialized(policy):
+            # the same policy is used for many experiments, so it is
+            # only copied and transformed when the model is initialized
+            policy = policy.copy()
             self.model_init(policy)
+            self._transform(policy, self.levers)
 
         # TODO:: here we need to add constants in some manner
         self._transform(scenario, self.uncertainties)
-        self._transform(policy, self.levers)
 
     #@method_logger
     def initialized(self, policy):
@@ -263,7 +267,7 @@ class AbstractModel(six.with_metaclass(ModelMeta, NamedObject)):
         implementation only sets the outputs to an empty dict. 
 
         """
-        self._outcome_output = {}
+        self._outcomes_output = {}
         self._constraints_output = {}
 
     #@method_logger
@@ -346,24 +350,81 @@ class Replicator(AbstractModel):
         super(Replicator, self).run_model(scenario, policy)
 
         constants = {c.name: c.value for c in self.constants}
-        outputs = defaultdict(list)
-        partial_experiment = combine(scenario, self.policy, constants)
+        partial_experiment = Experiment(scenario, self.policy, constants)
 
         for i, rep in enumerate(self.replications):
-            ema_logging.debug("replication {}".format(i))
             rep.id = i
-            experiment = Experiment(scenario, self.policy, constants, rep)
-            output = self.run_experiment(experiment)
-            for key, value in output.items():
-                outputs[key].append(value)
 
-        self.outcomes_output = outputs
+        self.outcomes_output = self.run_replications(partial_experiment)
 
         # perhaps set constraints with the outcomes instead
         # this avoids double processing, it also means that
         # each constraint needs to apply to an actual outcome
         self.constraints_output = (partial_experiment, self.outcomes_output)
 
+    def run_replications(self, experiment):
+        '''Method for running all replications of an experiment. The
+        default implementation runs the replications one by one, and
+        stores the outputs in arrays with the replications along the
+        first axis.
+
+        Parameters
+        ----------
+        experiment : Experiment instance
+                     the experiment without replication information
+
+        Returns
+        -------
+        dict
+            with the outputs for all replications
+
+        '''
+        nreplications = len(self.replications)
+        outputs = {}
+
+        for i, rep in enumerate(self.replications):
+            ema_logging.debug("replication {}".format(i))
+            output = self.run_experiment(experiment.replicate(rep))
+
+            for key, value in output.items():
+                try:
+                    data = outputs[key]
+                except KeyError:
+                    data = outputs[key] = _allocate(value, nreplications)
+
+                if isinstance(data, np.ndarray) and \
+                        _shape(value) == data.shape[1:]:
+                    data[i] = value
+                else:
+                    # outputs that do not fit into an array are kept in
+                    # a list instead
+                    if isinstance(data, np.ndarray):
+                        data = outputs[key] = list(data[:i])
+                    data.append(value)
+        return outputs
+
+
+def _shape(value):
+    try:
+        return np.shape(value)
+    except ValueError:
+        # ragged nested sequences
+        return None
+
+
+def _allocate(value, nreplications):
+    '''allocate an array for storing the values of an output for all
+    replications, given the value of the first replication'''
+    try:
+        value = np.asarray(value)
+    except ValueError:
+        return []
+
+    # integers are stored as floats, so later replications returning
+    # a float do not get truncated
+    dtype = float if value.dtype.kind in 'iuf' else object
+    return np.empty((nreplications, ) + value.shape, dtype=dtype)
+
 
 class SingleReplication(AbstractModel):
 
@@ -441,7 +502,10 @@ class BaseModel(AbstractModel):
 
         """
         model_output = self.function(**experiment)
+        return self._handle_output(model_output)
 
+    def _handle_output(self, model_output):
+        '''map the output of the function to the output variables'''
         # TODO: might it be possible to somehow abstract this
         # perhaps expose a get_data on modelInterface?
         # different connectors can than implement only this
@@ -559,3 +623,27 @@ class Model(SingleReplication, BaseModel):
 
 class ReplicatorModel(Replicator, BaseModel):
     pass
+
+
+class VectorizedReplicatorModel(Replicator, BaseModel):
+    ''' generic class for working with models implemented as a Python
+    callable that runs all replications in one go
+
+    Parameters
+    ----------
+    name : str
+    function : callable
+               a function with each of the uncertain parameters as a
+               keyword argument, and a replications keyword argument
+               with the list of replications. Each replication is a dict,
+               which is empty if replications is set to an int. The
+               function should return the outputs for all replications,
+               with the replications along the first axis.
+
+    '''
+
+    def run_replications(self, experiment):
+        model_output = self.function(replications=self.replications,
+                                     **experiment)
+        outputs = self._handle_output(model_output)
+        return {key: np.asarray(value) for key, value in outputs.items()}
@@ -5,10 +5,14 @@
 from __future__ import (unicode_literals, print_function, absolute_import,
                         division)
 
+import collections
+import concurrent.futures
 import copy
 import functools
 import math
+import numbers
 import os
+import numpy as np
 import pandas as pd
 import random
 import warnings
@@ -16,7 +20,7 @@ import warnings
 from .outcomes import AbstractOutcome
 from .parameters import (IntegerParameter, RealParameter, CategoricalParameter, BooleanParameter,
                          Scenario, Policy)
-from .samplers import determine_parameters
+from .samplers import determine_parameters, sample_uncertainties
 from .util import determine_objects
 from ..util import ema_logging
 from ema_workbench.util.ema_exceptions import EMAError
@@ -28,7 +32,7 @@ try:
                     Subset, EpsilonProgressContinuation, RandomGenerator,
                     TournamentSelector, NSGAII, EpsilonBoxArchive, Multimethod,
                     GAOperator, SBX, PM, PCX, DifferentialEvolution, UNDX, SPX, 
-                    UM, Solution)   # @UnresolvedImport
+                    UM, Solution, ParetoDominance)   # @UnresolvedImport
     from platypus import Problem as PlatypusProblem
 
     import platypus
@@ -70,7 +74,7 @@ except ImportError:
 # .. codeauthor::jhkwakkel <j.h.kwakkel (at) tudelft (dot) nl>
 
 __all__ = ["Problem", "RobustProblem", "EpsilonProgress", "HyperVolume",
-           "Convergence", "ArchiveLogger"]
+           "Convergence", "ArchiveLogger", "SteadyStateEpsMOEA"]
 
 
 class Problem(PlatypusProblem):
@@ -107,6 +111,15 @@ class Problem(PlatypusProblem):
         self.constraint_names = [c.name for c in constraints]
         self.reference = reference if reference else 0
 
+    def evaluate(self, solution):
+        # the objectives and constraints follow from the experiments, and
+        # are set on the solution by _evaluate_solution
+        objectives, constraints = solution.ema_results
+        del solution.ema_results
+
+        solution.objectives[:] = objectives
+        solution.constraints[:] = constraints
+
 
 class RobustProblem(Problem):
     '''small extension to Problem object for robust optimization, adds the 
@@ -310,19 +323,21 @@ def _process(jobs, problem):
     '''helper function to transform platypus job to dict with correct
     values for workbench'''
 
-    processed_jobs = []
-    for job in jobs:
-        variables = transform_variables(problem,
-                                        job.solution.variables)
-        processed_job = {}
-        for param, var in zip(problem.parameters, variables):
-            try:
-                var = var.value
-            except AttributeError:
-                pass
-            processed_job[param.name] = var
-        processed_jobs.append(processed_job)
-    return processed_jobs
+    return [_process_solution(job.solution, problem) for job in jobs]
+
+
+def _process_solution(solution, problem):
+    '''helper function to transform a platypus solution to dict with
+    correct values for workbench'''
+    variables = transform_variables(problem, solution.variables)
+    processed = {}
+    for param, var in zip(problem.parameters, variables):
+        try:
+            var = var.value
+        except AttributeError:
+            pass
+        processed[param.name] = var
+    return processed
 
 
 def process_robust(jobs):
@@ -369,27 +384,25 @@ def evaluate(jobs_collection, experiments, outcomes, problem):
     if searchover == 'levers':
         column = 'policy'
     else:
-        column = 'scenario_id'
+        column = 'scenario'
+
+    # the rows of each job are determined in one pass over the
+    # experiments, rather than by scanning all experiments for each job
+    rows = experiments.groupby(column, sort=False).indices
 
     for entry, job in jobs_collection:
-        logical = experiments[column] == entry.name
-        job_outcomes = {key: outcomes[key][logical][0]
-                        for key in outcome_names}
+        row = rows[entry.name][0]
+        job_outcomes = [outcomes[key][row] for key in outcome_names]
 
-        # TODO:: only retain uncertainties
-        job_experiment = experiments[logical]
+        job_constraints = []
+        if constraints:
+            # TODO:: only retain uncertainties
+            job_experiment = experiments.iloc[row]
+            data = {k: v[row] for k, v in outcomes.items()}
+            job_constraints = _evaluate_constraints(job_experiment, data,
+                                                    constraints)
 
-        data = {k:v[logical][0] for k, v in outcomes.items()}
-        job_constraints = _evaluate_constraints(job_experiment, data,
-                                                constraints)
-        job_outcomes = [outcomes[key][logical][0] for key in outcome_names]
-
-        if job_constraints:
-            job.solution.problem.function = lambda _: (job_outcomes,
-                                                       job_constraints)
-        else:
-            job.solution.problem.function = lambda _: job_outcomes
-        job.solution.evaluate()
+        _evaluate_solution(job.solution, job_outcomes, job_constraints)
 
 
 def evaluate_robust(jobs_collection, experiments, outcomes, problem):
@@ -399,32 +412,54 @@ def evaluate_robust(jobs_collection, experiments, outcomes, problem):
     robustness_functions = problem.robustness_functions
     constraints = problem.ema_constraints
 
-    for entry, job in jobs_collection:
-        logical = experiments['policy'] == entry.name
-        job_outcomes = {key: value[logical] for key, value in outcomes.items()}
+    # the rows of each policy are determined in one pass over the
+    # experiments, rather than by scanning all experiments for each job
+    rows = experiments.groupby('policy', sort=False).indices
+    jobs_collection = list(jobs_collection)
+
+    # vectorized robustness functions are called once, with the outcomes
+    # arranged as (policies, scenarios)
+    scores = {}
+    vectorized = [rf for rf in robustness_functions
+                  if getattr(rf, 'vectorized', False)]
+    if vectorized:
+        index = np.stack([rows[entry.name] for entry, _ in jobs_collection])
+        for rf in vectorized:
+            data = [outcomes[var_name][index] for var_name in
+                    rf.variable_name]
+            scores[rf.name] = rf.function(*data, axis=1)
+
+    for i, (entry, job) in enumerate(jobs_collection):
+        logical = rows[entry.name]
 
         job_outcomes_dict = {}
         job_outcomes = []
         for rf in robustness_functions:
-            data = [outcomes[var_name][logical] for var_name in
-                    rf.variable_name]
-            score = rf.function(*data)
+            if rf.name in scores:
+                score = scores[rf.name][i]
+            else:
+                data = [outcomes[var_name][logical] for var_name in
+                        rf.variable_name]
+                score = rf.function(*data)
             job_outcomes_dict[rf.name] = score
             job_outcomes.append(score)
 
-        # TODO:: only retain levers
-        job_experiment = experiments[logical].iloc[0]
-        job_constraints = _evaluate_constraints(job_experiment,
-                                                job_outcomes_dict,
-                                                constraints)
+        job_constraints = []
+        if constraints:
+            # TODO:: only retain levers
+            job_experiment = experiments.iloc[logical[0]]
+            job_constraints = _evaluate_constraints(job_experiment,
+                                                    job_outcomes_dict,
+                                                    constraints)
+
+        _evaluate_solution(job.solution, job_outcomes, job_constraints)
 
-        if job_constraints:
-            job.solution.problem.function = lambda _: (job_outcomes,
-                                                       job_constraints)
-        else:
-            job.solution.problem.function = lambda _: job_outcomes
 
-        job.solution.evaluate()
+def _evaluate_solution(solution, objectives, constraints):
+    '''Helper function for evaluating a platypus solution given the
+    values of its objectives and constraints'''
+    solution.ema_results = objectives, constraints
+    solution.evaluate()
 
 
 def _evaluate_constraints(job_experiment, job_outcomes, constraints):
@@ -781,8 +816,222 @@ class CombinedMutator(CombinedVariator):
                Subset: mutate_categorical}
 
 
+class SteadyStateEpsMOEA(object):
+    '''Asynchronous, steady state, epsilon dominance based MOEA
+
+    Rather than evaluating a full generation at the time, a new candidate
+    solution is created and submitted to the evaluator as soon as the
+    evaluation of an earlier candidate completes. So, with heterogeneous
+    run times, workers do not sit idle waiting for the slowest
+    experiment of a generation. Each evaluated candidate replaces a
+    member of the population if it is not dominated, and is added to the
+    epsilon box archive right away. This is the steady state approach of
+    the Borg MOEA.
+
+    The object mimics a platypus algorithm as wrapped by
+    EpsilonProgressContinuation, so the convergence metrics can be used
+    with it. They are updated after every population_size evaluations.
+
+    Parameters
+    ----------
+    problem : Problem instance
+    evaluator : BaseEvaluator instance
+                any evaluator that implements submit_experiments
+    epsilons : list of float
+    population_size : int, optional
+    generator : platypus Generator instance, optional
+    selector : platypus Selector instance, optional
+    variator : platypus Variator instance, optional
+    n_pending : int, optional
+                the number of candidate solutions that are being evaluated
+                at the same time, defaults to the number of cores.
+
+    Raises
+    ------
+    EMAError
+        if population_size is smaller than the number of parents the
+        variator needs, or n_pending is smaller than 1
+
+    Note:: in case of robust optimization with an integer number of
+    scenarios, the scenarios are sampled once, and used for all
+    candidates.
+
+    '''
+
+    def __init__(self, problem, evaluator, epsilons, population_size=100,
+                 generator=RandomGenerator(), selector=TournamentSelector(2),
+                 variator=None, n_pending=None):
+        self.problem = problem
+        self.evaluator = evaluator
+        self.population_size = population_size
+        self.generator = generator
+        self.selector = selector
+        self.variator = variator if variator else CombinedVariator()
+        self.n_pending = os.cpu_count() if n_pending is None else n_pending
+
+        # offspring can only be created once the population holds enough
+        # parents for the variator
+        if population_size < self.variator.arity:
+            raise EMAError(('population_size should be at least {}, the '
+                            'number of parents of the variator').format(
+                                self.variator.arity))
+        if self.n_pending < 1:
+            raise EMAError('n_pending should be at least 1')
+
+        self.archive = EpsilonBoxArchive(epsilons)
+        self.population = []
+        self.nfe = 0
+        self.dominance = ParetoDominance()
+
+        self._scenarios = [Scenario('None')]
+        self._policies = [Policy('None')]
+        if problem.searchover == 'levers' and problem.reference:
+            self._scenarios = [problem.reference]
+        elif problem.searchover == 'uncertainties' and problem.reference:
+            self._policies = [problem.reference]
+        elif problem.searchover == 'robust':
+            scenarios = problem.scenarios
+            if isinstance(scenarios, numbers.Integral):
+                scenarios = sample_uncertainties(evaluator._msis, scenarios)
+            self._scenarios = list(scenarios)
+
+    @property
+    def algorithm(self):
+        return self
+
+    @property
+    def result(self):
+        return self.archive
+
+    def run(self, nfe, callback=None):
+        '''run the algorithm until nfe candidate solutions have been
+        evaluated
+
+        Parameters
+        ----------
+        nfe : int
+        callback : callable, optional
+                   called after every population_size evaluations, and
+                   once all evaluations have completed
+
+        '''
+        candidates = collections.deque(self.generator.generate(self.problem)
+                                       for _ in range(self.population_size))
+        pending = {}
+        submitted = 0
+        last_callback = 0
+
+        while self.nfe < nfe:
+            while len(pending) < self.n_pending and submitted < nfe:
+                if not candidates:
+                    if len(self.population) < self.variator.arity:
+                        # wait for more of the initial population
+                        break
+                    candidates.extend(self._evolve())
+
+                solution = candidates.popleft()
+                futures = self._submit(solution, submitted)
+                pending[submitted] = solution, futures
+                submitted += 1
+
+            waiting = [future for _, futures in pending.values()
+                       for future in futures]
+            concurrent.futures.wait(waiting,
+                    return_when=concurrent.futures.FIRST_COMPLETED)
+
+            for index, (solution, futures) in list(pending.items()):
+                if all(future.done() for future in futures):
+                    del pending[index]
+                    self._evaluate(solution,
+                                   [future.result() for future in futures])
+
+            if callback and self.nfe - last_callback >= self.population_size:
+                last_callback = self.nfe
+                callback()
+
+        if callback and self.nfe > last_callback:
+            callback()
+
+    def _submit(self, solution, index):
+        values = _process_solution(solution, self.problem)
+        name = str(index)
+
+        if self.problem.searchover == 'uncertainties':
+            scenarios = [Scenario(name=name, **values)]
+            policies = self._policies
+        else:
+            scenarios = self._scenarios
+            policies = [Policy(name=name, **values)]
+
+        return self.evaluator.submit_experiments(scenarios, policies)
+
+    def _evaluate(self, solution, results):
+        '''set the objectives and constraints of solution given the
+        experiments and outcomes, and update population and archive'''
+        experiment, outcomes = results[0]
+        data = dict(experiment.scenario)
+        data.update(experiment.policy)
+
+        if self.problem.searchover == 'robust':
+            stacked = {key: np.asarray([entry[key] for _, entry in results])
+                       for key in outcomes.keys()}
+
+            scores = {}
+            for rf in self.problem.robustness_functions:
+                rf_data = [stacked[name] for name in rf.variable_name]
+                if getattr(rf, 'vectorized', False):
+                    rf_data = [value[np.newaxis] for value in rf_data]
+                    scores[rf.name] = rf.function(*rf_data, axis=1)[0]
+                else:
+                    scores[rf.name] = rf.function(*rf_data)
+            objectives = [scores[name] for name in self.problem.outcome_names]
+            outcomes = scores
+        else:
+            objectives = [outcomes[name] for name in
+                          self.problem.outcome_names]
+
+        constraints = _evaluate_constraints(data, outcomes,
+                                            self.problem.ema_constraints)
+        _evaluate_solution(solution, objectives, constraints)
+        self.nfe += 1
+
+        self._add_to_population(solution)
+        self.archive.add(solution)
+
+    def _evolve(self):
+        '''create offspring from the population and the archive'''
+        if len(self.archive) <= 1:
+            parents = self.selector.select(self.variator.arity,
+                                           self.population)
+        else:
+            parents = self.selector.select(self.variator.arity - 1,
+                                           self.population)
+            parents.append(random.choice(self.archive))
+        return self.variator.evolve(parents)
+
+    def _add_to_population(self, solution):
+        if len(self.population) < self.population_size:
+            self.population.append(solution)
+            return
+
+        dominated = []
+        for i, member in enumerate(self.population):
+            flag = self.dominance.compare(solution, member)
+            if flag < 0:
+                dominated.append(i)
+            elif flag > 0:
+                # solution is dominated, so discard it
+                return
+
+        if dominated:
+            index = random.choice(dominated)
+        else:
+            index = random.randrange(len(self.population))
+        self.population[index] = solution
+
+
 def _optimize(problem, evaluator, algorithm, convergence, nfe,
-              **kwargs):
+              asynchronous=False, **kwargs):
 
     klass = problem.types[0].__class__
 
@@ -792,9 +1041,14 @@ def _optimize(problem, evaluator, algorithm, convergence, nfe,
         variator = CombinedVariator()
     mutator = CombinedMutator()
 
-    optimizer = algorithm(problem, evaluator=evaluator, variator=variator,
-                          log_frequency=500, **kwargs)
-    optimizer.mutator = mutator
+    if asynchronous:
+        optimizer = SteadyStateEpsMOEA(problem, evaluator,
+                                       variator=variator, **kwargs)
+    else:
+        optimizer = algorithm(problem, evaluator=evaluator,
+                              variator=variator, log_frequency=500,
+                              **kwargs)
+        optimizer.mutator = mutator
 
     convergence = Convergence(convergence, nfe)
     callback = functools.partial(convergence, optimizer)
@@ -802,7 +1056,10 @@ def _optimize(problem, evaluator, algorithm, convergence, nfe,
 
     with temporary_filter(name=[callbacks.__name__,
                                 evaluators.__name__], level=INFO):
-        optimizer.run(nfe)
+        if asynchronous:
+            optimizer.run(nfe, callback=callback)
+        else:
+            optimizer.run(nfe)
 
     results = to_dataframe(optimizer, problem.parameter_names,
                            problem.outcome_names)
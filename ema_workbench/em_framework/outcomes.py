@@ -138,20 +138,28 @@ class ScalarOutcome(AbstractOutcome):
     name : str
            Name of the outcome.
     kind : {INFO, MINIMZE, MAXIMIZE}, optional
+    vectorized : bool, optional
+                 only used for robustness functions. If True, function is
+                 called once for all policies, with a 2-D array of shape
+                 (n_policies, n_scenarios) for each variable and with
+                 axis=1, like numpy.mean. It should return an array with
+                 the score of each policy.
 
     Attributes
     ----------
     name : str
     kind : int
+    vectorized : bool
 
     '''
 
     def __init__(self, name, kind=AbstractOutcome.INFO, variable_name=None,
-                 function=None, expected_range=None):
+                 function=None, expected_range=None, vectorized=False):
         super(ScalarOutcome, self).__init__(name, kind,
                                             variable_name=variable_name,
                                             function=function,
                                             expected_range=expected_range)
+        self.vectorized = vectorized
 
     def process(self, values):
         values = super(ScalarOutcome, self).process(values)
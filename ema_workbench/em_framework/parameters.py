@@ -3,15 +3,18 @@ from __future__ import (unicode_literals, print_function, absolute_import,
                         division)
 
 import abc
-import itertools
 import numbers
 import pandas
 import six
 import warnings
 
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping  # @UnusedImport
+
 from ema_workbench.em_framework.util import (NamedObject, Variable,
-                                             NamedObjectMap, Counter, NamedDict,
-                                             combine)
+                                             NamedObjectMap, Counter, NamedDict)
 
 # Created on Jul 14, 2016
 #
@@ -410,11 +413,17 @@ class Case(NamedObject):
         self.scenario = scenario
 
 
-class Experiment(NamedDict):
+class Experiment(Mapping):
     '''helper class that combines scenario, policy, any constants, and 
-    replication information (seed etc) into a single dictionary.
+    replication information (seed etc) into a single mapping.
+
+    The experiment is a read only view on the underlying dicts, so
+    nothing is copied when it is created. Values are looked up in the
+    replication, the constants, the policy, and the scenario, in that
+    order.
 
     '''
+    __slots__ = ('name', 'id', '_maps')
 
     def __init__(self, scenario, policy, constants, replication=None):
         scenario_id = scenario.id
@@ -422,17 +431,63 @@ class Experiment(NamedDict):
 
         if replication is None:
             replication_id = 1
+            maps = (constants, policy, scenario)
         else:
             replication_id = replication.id
-            constants = combine(constants, replication)
+            maps = (replication, constants, policy, scenario)
 
         # this is a unique identifier for an experiment
         # we might also create a better looking name
         self.id = scenario_id * policy_id * replication_id
-        name = '{}_{}_{}'.format(scenario.name, policy.name, replication_id)
+        self.name = '{}_{}_{}'.format(scenario.name, policy.name,
+                                      replication_id)
+        self._maps = maps
+
+    def __getitem__(self, key):
+        for mapping in self._maps:
+            try:
+                return mapping[key]
+            except KeyError:
+                pass
+        raise KeyError(key)
+
+    def __iter__(self):
+        # same order as in a dict combining scenario, policy, and
+        # constants
+        seen = set()
+        for mapping in reversed(self._maps):
+            for key in mapping:
+                if key not in seen:
+                    seen.add(key)
+                    yield key
+
+    def __len__(self):
+        return len(set().union(*self._maps))
+
+    def __contains__(self, key):
+        return any(key in mapping for mapping in self._maps)
 
-        super(Experiment, self).__init__(name,
-                                         **combine(scenario, policy, constants))
+    def __repr__(self):
+        return 'Experiment({!r}, {})'.format(self.name, dict(self))
+
+    def replicate(self, replication):
+        '''create the experiment for a replication of this experiment
+
+        Parameters
+        ----------
+        replication : dict like, with an id attribute
+
+        Returns
+        -------
+        Experiment instance
+
+        '''
+        experiment = self.__class__.__new__(self.__class__)
+        experiment._maps = (replication, ) + self._maps
+        experiment.id = self.id * replication.id
+        experiment.name = '{}_{}'.format(self.name.rsplit('_', 1)[0],
+                                         replication.id)
+        return experiment
 
 
 def experiment_generator(scenarios, model_structures, policies):
@@ -451,16 +506,18 @@ def experiment_generator(scenarios, model_structures, policies):
     this generator is essentially three nested loops: for each model structure,
     for each policy, for each scenario, return the experiment. This means 
     that designs should not be a generator because this will be exhausted after
-    the running the first policy on the first model. 
+    the running the first policy on the first model. The scenarios are 
+    iterated over lazily, so they are never all in memory at once.
 
     '''
-    jobs = itertools.product(model_structures, policies, scenarios)
-
-    for i, job in enumerate(jobs):
-        msi, policy, scenario = job
-        name = '{} {} {}'.format(msi.name, policy.name, i)
-        case = Case(name, msi.name, policy, scenario, i)
-        yield case
+    i = 0
+    for msi in model_structures:
+        for policy in policies:
+            for scenario in scenarios:
+                name = '{} {} {}'.format(msi.name, policy.name, i)
+                case = Case(name, msi.name, policy, scenario, i)
+                yield case
+                i += 1
 
 
 def parameters_to_csv(parameters, file_name):
@@ -17,7 +17,7 @@ import warnings
 
 import numpy as np
 
-from .samplers import DefaultDesigns
+from .samplers import DefaultDesigns, to_design_matrix
 from .parameters import IntegerParameter
 
 
@@ -109,8 +109,8 @@ class SALibSampler(object):
 
         nr_designs = next(iter(sampled_parameters.values())).shape[0]
 
-        params = sorted(sampled_parameters.keys())
-        designs = zip(*[sampled_parameters[u] for u in params])
+        designs = to_design_matrix([sampled_parameters[u.name] for u in
+                                    parameters], nr_designs)
         designs = DefaultDesigns(designs, parameters, nr_designs)
 
         return designs
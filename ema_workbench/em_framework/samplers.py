@@ -24,6 +24,7 @@ import itertools
 import numpy as np
 import operator
 import scipy.stats as stats
+from scipy.spatial import cKDTree
 
 from . import util
 from .parameters import (IntegerParameter, Policy, Scenario, BooleanParameter)
@@ -64,6 +65,38 @@ class AbstractSampler(object):
     def __init__(self):
         super(AbstractSampler, self).__init__()
 
+    def transform(self, parameters, unit):
+        '''
+        transform a sample from the unit hypercube to the distributions of
+        the parameters. The inverse cdf is evaluated once for all parameters
+        sharing the same type of distribution.
+
+        Parameters
+        ----------
+        parameters : list of Parameter instances
+        unit : numpy array
+               array of shape (n, len(parameters)) with values on [0, 1)
+
+        Returns
+        -------
+        dict
+            dict with the parameter.name as key, and the sample as value
+
+        '''
+        groups = {}
+        for i, param in enumerate(parameters):
+            groups.setdefault(param.dist, []).append(i)
+
+        samples = np.empty(unit.shape)
+        for dist, indices in groups.items():
+            params = np.asarray([parameters[i].params for i in indices],
+                                dtype=float)
+            samples[:, indices] = self.distributions[dist](*params.T).ppf(
+                unit[:, indices])
+
+        return {param.name: samples[:, i] for i, param in
+                enumerate(parameters)}
+
     @abc.abstractmethod
     def sample(self, distribution, params, size):
         '''
@@ -137,7 +170,8 @@ class AbstractSampler(object):
         '''
         parameters = sorted(parameters, key=operator.attrgetter('name'))
         sampled_parameters = self.generate_samples(parameters, nr_samples)
-        designs = zip(*[sampled_parameters[u.name] for u in parameters])
+        designs = to_design_matrix([sampled_parameters[u.name] for u in
+                                    parameters], nr_samples)
         designs = DefaultDesigns(designs, parameters, nr_samples)
 
         return designs
@@ -146,11 +180,81 @@ class AbstractSampler(object):
 class LHSSampler(AbstractSampler):
     """
     generates a Latin Hypercube sample for each of the parameters
+
+    The unit hypercube is generated in one pass for all parameters, after
+    which it is transformed to the distribution of each parameter. 
+    Optionally, the sample can be optimized for space filling by drawing a
+    number of candidate designs, and keeping the best one according to the
+    specified criterion. This is a random search rather than a proper
+    optimization, so the improvement over a plain Latin Hypercube is 
+    modest, and diminishes as the number of samples grows. Each candidate
+    is scored at a cost of O(n log n) for maximin, and O(n k^2) for 
+    correlation.
+
+    Parameters
+    ----------
+    seed : int, optional
+           seed for the random number generator. If None, the global
+           numpy random state is used.
+    criterion : {None, LHSSampler.MAXIMIN, LHSSampler.CORRELATION}, optional
+                criterion for optimizing the sample. Maximin maximizes the 
+                minimum distance between points, correlation minimizes the 
+                maximum absolute correlation between parameters. 
+    iterations : int, optional
+                 the number of candidate designs to draw when optimizing
+                 the sample
+
+    Raises
+    ------
+    ValueError
+        if criterion is not known, or iterations is smaller than 1
+
     """
 
-    def __init__(self):
+    MAXIMIN = 'maximin'
+    CORRELATION = 'correlation'
+
+    def __init__(self, seed=None, criterion=None, iterations=100):
         super(LHSSampler, self).__init__()
 
+        if criterion not in (None, LHSSampler.MAXIMIN,
+                             LHSSampler.CORRELATION):
+            raise ValueError(('invalid value for criterion, should be None, '
+                              'maximin, or correlation'))
+        if iterations < 1:
+            raise ValueError('iterations should be at least 1')
+
+        self.rng = get_rng(seed)
+        self.criterion = criterion
+        self.iterations = iterations
+
+    def generate_samples(self, parameters, size):
+        '''
+        generate a Latin Hypercube Sample over all parameters at once.
+
+        Parameters
+        ----------
+        parameters : collection
+                     a collection of :class:`~parameters.Parameter` 
+                     instances.
+        size : int
+               the number of samples to generate.
+
+        Returns
+        -------
+        dict
+            dict with the parameter.name as key, and the sample as value
+
+        '''
+        nr_params = len(parameters)
+
+        if self.criterion is None:
+            unit = self._lhs_unit(size, nr_params)
+        else:
+            unit = self._optimized_lhs_unit(size, nr_params)
+
+        return self.transform(parameters, unit)
+
     def sample(self, distribution, params, size):
         '''
         generate a Latin Hypercube Sample.
@@ -186,27 +290,97 @@ class LHSSampler(AbstractSampler):
               number of samples
 
         '''
-        perc = np.arange(0, 1., 1./siz)
-        np.random.shuffle(perc)
-        smp = stats.uniform(perc, 1./siz).rvs()
-        v = dist(*parms).ppf(smp)
+        return dist(*parms).ppf(self._lhs_unit(siz, 1)[:, 0])
+
+    def _lhs_unit(self, n, k):
+        '''
+        Latin Hypercube sample on the unit hypercube
 
-        # corner case fix (try siz=49)
-        # is not a proper fix, it means that perc is wrong
-        # so your intervals are wrong
-        v = v[np.isnan(v) == False]
+        Parameters
+        ----------
+        n : int
+            number of samples
+        k : int 
+            number of dimensions
+
+        Returns
+        -------
+        numpy array of shape (n, k)
+
+        '''
+        # each column is an independent permutation of the n intervals
+        intervals = self.rng.random((n, k)).argsort(axis=0)
+        return (intervals + self.rng.random((n, k))) / n
+
+    def _optimized_lhs_unit(self, n, k):
+        '''
+        draw a number of Latin Hypercube samples on the unit hypercube and
+        return the best according to the criterion
+
+        Parameters
+        ----------
+        n : int
+            number of samples
+        k : int 
+            number of dimensions
 
-        return v
+        Returns
+        -------
+        numpy array of shape (n, k)
+
+        '''
+        if self.criterion == LHSSampler.MAXIMIN:
+            score = _maximin_score
+        else:
+            score = _correlation_score
+
+        best = self._lhs_unit(n, k)
+        best_score = score(best)
+        for _ in range(self.iterations - 1):
+            candidate = self._lhs_unit(n, k)
+            candidate_score = score(candidate)
+
+            if candidate_score > best_score:
+                best, best_score = candidate, candidate_score
+        return best
 
 
 class MonteCarloSampler(AbstractSampler):
     """
     generates a Monte Carlo sample for each of the parameters. 
 
+    Parameters
+    ----------
+    seed : int, optional
+           seed for the random number generator. If None, the global
+           numpy random state is used.
+
     """
 
-    def __init__(self):
+    def __init__(self, seed=None):
         super(MonteCarloSampler, self).__init__()
+        self.rng = get_rng(seed)
+
+    def generate_samples(self, parameters, size):
+        '''
+        generate a Monte Carlo Sample over all parameters at once.
+
+        Parameters
+        ----------
+        parameters : collection
+                     a collection of :class:`~parameters.Parameter` 
+                     instances.
+        size : int
+               the number of samples to generate.
+
+        Returns
+        -------
+        dict
+            dict with the parameter.name as key, and the sample as value
+
+        '''
+        unit = self.rng.uniform(size=(size, len(parameters)))
+        return self.transform(parameters, unit)
 
     def sample(self, distribution, params, size):
         '''
@@ -227,8 +401,49 @@ class MonteCarloSampler(AbstractSampler):
             with the paramertainty.name as key, and the sample as value
 
         '''
+        dist = self.distributions[distribution](*params)
+        return dist.ppf(self.rng.uniform(size=size))
+
+
+def get_rng(seed=None):
+    '''return a random number generator for the given seed
+
+    Parameters
+    ----------
+    seed : int, optional
+
+    Returns
+    -------
+    object with a numpy random interface. If seed is None, this is the 
+    global numpy random state, so np.random.seed can still be used to
+    make sampling reproducible.
+
+    '''
+    if seed is None:
+        return np.random
+
+    try:
+        return np.random.default_rng(seed)
+    except AttributeError:
+        # numpy < 1.17
+        return np.random.RandomState(seed)
+
+
+def _maximin_score(unit):
+    '''minimum distance between the points in the sample'''
+    # the nearest neighbour of each point other than the point itself,
+    # this avoids the n x n matrix of all pairwise distances
+    distances, _ = cKDTree(unit).query(unit, k=2)
+    return distances[:, 1].min()
 
-        return self.distributions[distribution](*params).rvs(size)
+
+def _correlation_score(unit):
+    '''negative of the maximum absolute correlation between columns'''
+    if unit.shape[1] < 2:
+        return 0
+    corr = np.corrcoef(unit, rowvar=False)
+    np.fill_diagonal(corr, 0)
+    return -np.abs(corr).max()
 
 
 class FullFactorialSampler(AbstractSampler):
@@ -307,11 +522,8 @@ class FullFactorialSampler(AbstractSampler):
         parameters = sorted(parameters, key=operator.attrgetter('name'))
 
         samples = self.generate_samples(parameters, nr_samples)
-        zipped_samples = itertools.product(
-            *[samples[u.name] for u in parameters])
-
-        n_designs = self.determine_nr_of_designs(samples)
-        designs = DefaultDesigns(zipped_samples, parameters, n_designs)
+        designs = FullFactorialDesigns([samples[u.name] for u in parameters],
+                                       parameters)
 
         return designs
 
@@ -347,6 +559,8 @@ class PartialFactorialSampler(AbstractSampler):
     ----------
     sampling: {PartialFactorialSampler.LHS, PartialFactorialSampler.MC}, optional
               the desired sampling for the non factorial parameters.
+    seed : int, optional
+           seed for the random number generator of the LHS or MC sampler
 
     Raises
     ------
@@ -358,13 +572,13 @@ class PartialFactorialSampler(AbstractSampler):
     LHS = 'LHS'
     MC = 'MC'
 
-    def __init__(self, sampling='LHS'):
+    def __init__(self, sampling='LHS', seed=None):
         super(PartialFactorialSampler, self).__init__()
 
         if sampling == PartialFactorialSampler.LHS:
-            self.sampler = LHSSampler()
+            self.sampler = LHSSampler(seed=seed)
         elif sampling == PartialFactorialSampler.MC:
-            self.sampler = MonteCarloSampler()
+            self.sampler = MonteCarloSampler(seed=seed)
         else:
             raise ValueError(('invalid value for sampling type, should be LHS '
                               'or MC'))
@@ -556,26 +770,183 @@ def from_experiments(models, experiments):
     return scenarios
 
 
-class DefaultDesigns(object):
-    '''iterable for the experimental designs'''
+def to_design_matrix(samples, n):
+    '''helper function for combining the samples for each parameter into
+    a 2-D design matrix
 
-    def __init__(self, designs, parameters, n):
-        self.designs = list(designs)
+    Parameters
+    ----------
+    samples : list of 1-D arrays
+              the samples for each parameter
+    n : int
+        the number of designs
+
+    Returns
+    -------
+    numpy array
+        with a row for each design and a column for each parameter
+
+    '''
+    if not samples:
+        return np.empty((n, 0))
+    return np.column_stack(samples).astype(float)
+
+
+class AbstractDesigns(object):
+    '''abstract base class for iterables over experimental designs
+
+    The designs are indexed lazily: only the requested rows of the design
+    matrix are computed, and Scenario or Policy instances are only created
+    when iterating over the designs. Memory use is therefore bounded by
+    the blocksize rather than by the number of designs.
+
+    Parameters
+    ----------
+    parameters : list of Parameter instances
+    n : int
+
+    '''
+    __metaclass__ = abc.ABCMeta
+
+    # the number of designs to create in one go when iterating
+    blocksize = 1000
+
+    def __init__(self, parameters, n):
         self.parameters = parameters
         self.params = [p.name for p in parameters]
         self.kind = None
         self.n = n
 
     @abc.abstractmethod
+    def take(self, indices):
+        '''return the rows of the design matrix for the given indices
+
+        Parameters
+        ----------
+        indices : 1-D numpy array of ints
+
+        Returns
+        -------
+        numpy array
+            with a row for each index and a column for each parameter
+
+        '''
+
+    def rows(self, start, stop):
+        '''return the rows start up to stop of the design matrix'''
+        return self.take(np.arange(start, min(stop, self.n)))
+
+    def chunks(self, chunksize):
+        '''generator yielding lists with chunksize designs
+
+        Parameters
+        ----------
+        chunksize : int
+
+        Yields
+        ------
+        list
+            of experimental designs
+
+        '''
+        for start in range(0, self.n, chunksize):
+            designs = self.rows(start, start + chunksize)
+            yield list(design_generator(designs, self.parameters, self.kind))
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.n
+        if not 0 <= i < self.n:
+            raise IndexError('design index out of range')
+
+        design = self.take(np.asarray([i]))
+        return next(design_generator(design, self.parameters, self.kind))
+
     def __iter__(self):
         '''should return iterator'''
+        return itertools.chain.from_iterable(self.chunks(self.blocksize))
+
 
-        return design_generator(self.designs, self.parameters, self.kind)
+class DefaultDesigns(AbstractDesigns):
+    '''iterable for the experimental designs
+
+    The designs are stored as a 2-D numpy array, with a row for each
+    design and a column for each parameter. Categorical parameters are
+    stored as the index of the category. The Scenario or Policy instances
+    are only created when iterating over the designs.
+
+    Parameters
+    ----------
+    designs : 2-D numpy array, or iterable of tuples
+    parameters : list of Parameter instances
+    n : int
+
+    '''
+
+    def __init__(self, designs, parameters, n):
+        super(DefaultDesigns, self).__init__(parameters, n)
+        if not isinstance(designs, np.ndarray):
+            designs = np.asarray(list(designs))
+        self.designs = designs.reshape((-1, len(parameters)))
+
+    def take(self, indices):
+        return self.designs[indices]
+
+    def rows(self, start, stop):
+        return self.designs[start:stop]
 
     def __repr__(self):
         return f"<ema_workbench.DefaultDesigns, {self.n} designs on {len(self.params)} parameters>"
 
-class PartialFactorialDesigns(object):
+
+class FullFactorialDesigns(AbstractDesigns):
+    '''iterable for a full factorial design
+
+    Only the values for each parameter are stored. A row of the design is
+    computed from its index, in the same order as itertools.product over
+    the values.
+
+    Parameters
+    ----------
+    samples : list of 1-D arrays
+              the values for each parameter
+    parameters : list of Parameter instances
+
+    '''
+
+    def __init__(self, samples, parameters):
+        self.samples = [np.asarray(sample, dtype=float) for sample in samples]
+        self.shape = tuple(sample.shape[0] for sample in self.samples)
+
+        n = functools.reduce(operator.mul, self.shape, 1)
+        super(FullFactorialDesigns, self).__init__(parameters, n)
+
+    def take(self, indices):
+        if not self.samples:
+            return np.empty((indices.shape[0], 0))
+
+        indices = np.unravel_index(indices, self.shape)
+        return np.column_stack([sample[index] for sample, index in
+                                zip(self.samples, indices)])
+
+    def __repr__(self):
+        return f"<ema_workbench.FullFactorialDesigns, {self.n} designs on {len(self.params)} parameters>"
+
+
+class PartialFactorialDesigns(AbstractDesigns):
+    '''iterable for a partial factorial design
+
+    Each design of the full factorial part is combined with each design of
+    the other part, in the same order as itertools.product over both. 
+    
+    Parameters
+    ----------
+    ff_designs : AbstractDesigns instance
+    other_designs : AbstractDesigns instance
+    parameters : list of Parameter instances
+    n : int
+
+    '''
 
     @property
     def kind(self):
@@ -590,51 +961,69 @@ class PartialFactorialDesigns(object):
     def __init__(self, ff_designs, other_designs, parameters, n):
         self.ff_designs = ff_designs
         self.other_designs = other_designs
+        super(PartialFactorialDesigns, self).__init__(parameters, n)
 
-        self.parameters = parameters
-        self.params = [p.name for p in parameters]
-
-        self._kind = None
-        self.n = n
+        # map the combined columns to the order of parameters
+        names = ff_designs.params + other_designs.params
+        self._columns = [names.index(name) for name in self.params]
 
-    def __iter__(self):
-        designs = itertools.product(self.ff_designs, self.other_designs)
-        return partial_designs_generator(designs)
+    def take(self, indices):
+        ff_indices, other_indices = np.divmod(indices, self.other_designs.n)
+        designs = np.hstack([self.ff_designs.take(ff_indices),
+                             self.other_designs.take(other_indices)])
+        return designs[:, self._columns]
 
 
-def partial_designs_generator(designs):
-    '''generator which combines the full factorial part of the design with
-    the non full factorial part into a single dict
+def design_converters(params):
+    '''helper function for getting a function for each parameter that
+    converts a sampled value to the value for the design
 
     Parameters
     ----------
-    designs: iterable of tuples
-
-    Yields
-    ------
-    dict
-        experimental design dict
+    params : iterable of Parameter instances
 
+    Returns
+    -------
+    list
+        with a callable or None for each parameter
 
     '''
+    converters = []
+    for param in params:
+        if isinstance(param, CategoricalParameter):
+            # categorical parameter is an integer parameter, so
+            # conversion to int is needed before looking up the category
+            categories = [category.value for category in param.categories]
+            converter = functools.partial(_to_category, categories)
+        elif isinstance(param, BooleanParameter):
+            converter = _to_bool
+        elif isinstance(param, IntegerParameter):
+            converter = int
+        else:
+            converter = None
+        converters.append(converter)
+    return converters
 
-    for design in designs:
-        ff_part, other_part = design
 
-        design = ff_part.copy()
-        design.update(other_part)
+def _to_category(categories, value):
+    return categories[int(value)]
 
-        yield design
 
+def _to_bool(value):
+    return bool(int(value))
 
-def design_generator(designs, params, kind):
+
+def design_generator(designs, params, kind, blocksize=1000):
     '''generator that combines the sampled parameters with their correct 
     name in order to return dicts.
 
     Parameters
     ----------
-    designs : iterable of tuples
-    params : iterable of str
+    designs : 2-D numpy array, or iterable of tuples
+    params : iterable of Parameter instances
+    kind : class
+    blocksize : int, optional
+                the number of rows of designs to convert in one go
 
     Yields
     ------
@@ -642,20 +1031,21 @@ def design_generator(designs, params, kind):
         experimental design dictionary
 
     '''
-
-    for design in designs:
-
-        design_dict = {}
-        for param, value in zip(params, design):
-            if isinstance(param, IntegerParameter):
-                value = int(value)
-            if isinstance(param, BooleanParameter):
-                value = bool(value)
-            if isinstance(param, CategoricalParameter):
-                # categorical parameter is an integer parameter, so
-                # conversion to int is already done
-                value = param.cat_for_index(value).value
-
-            design_dict[param.name] = value
-
-        yield kind(**design_dict)
+    names = [param.name for param in params]
+    converters = list(enumerate(design_converters(params)))
+    converters = [(i, converter) for i, converter in converters if
+                  converter is not None]
+
+    if isinstance(designs, np.ndarray):
+        # convert blocks of rows to python objects in one go
+        blocks = (designs[i:i+blocksize].tolist() for i in
+                  range(0, designs.shape[0], blocksize))
+        rows = itertools.chain.from_iterable(blocks)
+    else:
+        rows = (list(design) for design in designs)
+
+    for design in rows:
+        for i, converter in converters:
+            design[i] = converter(design[i])
+
+        yield kind(**dict(zip(names, design)))
@@ -2,7 +2,6 @@
 from __future__ import (unicode_literals, print_function, absolute_import,
                         division)
 
-import copy
 from collections import OrderedDict
 
 try:
@@ -173,7 +172,10 @@ class NamedObjectMapDescriptor(object):
 class NamedDict(UserDict, NamedObject):
 
     def __init__(self, name=representation, **kwargs):
-        super(NamedDict, self).__init__(**kwargs)
+        super(NamedDict, self).__init__()
+        # update the underlying dict directly, which is much faster
+        # than adding the items one by one
+        self.data.update(kwargs)
         if name is None:
             raise ValueError()
         elif callable(name):
@@ -198,7 +200,7 @@ def combine(*args):
     EMAError 
         if a keyword argument exists in more than one dict
     '''
-    experiment = copy.deepcopy(args[0])
+    experiment = args[0].copy()
     for entry in args[1::]:
         # overlap = set(experiment.keys()).intersection(set(entry.keys()))
         # if overlap:
@@ -12,12 +12,19 @@ except ImportError:
     import ConfigParser as configparser
 
 # import cPickle
+import contextlib
 from io import BytesIO, StringIO
+import json
 import math
 import os
 import sys
 import tarfile
 
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
 from matplotlib.mlab import rec2csv
 import numpy as np
 # from numpy.lib import recfunctions
@@ -35,6 +42,18 @@ if PY3:
 else:
     WriterFile = BytesIO
 
+# name of the metadata file, and version of the format, of tar files
+# written by save_results
+METADATA = 'metadata.json'
+FORMAT_VERSION = 2
+
+# types of values that can be stored in the metadata
+try:
+    SCALAR_TYPES = (str, unicode, int, long, float,  # @UndefinedVariable
+                    bool, type(None))
+except NameError:  # we are on python3
+    SCALAR_TYPES = (str, int, float, bool, type(None))
+
 # Created on 13 jan. 2011
 #
 # .. codeauthor:: jhkwakkel <j.h.kwakkel (at) tudelft (dot) nl>
@@ -46,107 +65,360 @@ __all__ = ['load_results',
            ]
 
 
-def load_results(file_name):
+def load_results(file_name, mmap_mode=None, outcomes=None, lazy=False,
+                 rows=None, allow_pickle=False):
     '''
-    load the specified bz2 file. the file is assumed to be saves
-    using save_results.
+    load the specified tar file. the file is assumed to be saved
+    using save_results. Files in the old csv based format can also be
+    loaded.
 
     Parameters
     ----------    
     file_name : str
                 the path to the file
+    mmap_mode : {None, 'r', 'c'}, optional
+                if not None, the outcomes and the numeric columns of the
+                experiments are memory mapped, rather than read into memory.
+                This is only possible for archives saved without 
+                compression. Otherwise, this argument is ignored. 
+    outcomes : list of str, optional
+               the names of the outcomes to load. If None, all outcomes
+               are loaded.
+    lazy : bool, optional
+           if True, the outcomes are returned as a mapping that loads each
+           outcome from the file on first access.
+    rows : array like or callable, optional
+           the experiments to load, as a boolean mask or indices. A 
+           callable is called with the experiments DataFrame, and should
+           return a mask or indices, for example 
+           ``lambda experiments: experiments['policy'] == 'a'``. The 
+           experiments are renumbered, so the rows of the experiments and 
+           outcomes match.
+    allow_pickle : bool, optional
+                   if True, columns and outcomes that were saved as 
+                   pickled python objects are loaded as well. Loading 
+                   pickled data can execute arbitrary code, so only do 
+                   this for files from a trusted source.
 
     Raises
     ------
     IOError if file not found
+    EMAError if an outcome is not in the file, or if the file contains
+    pickled data and allow_pickle is False
 
     '''
     file_name = os.path.abspath(file_name)
-    outcomes = {}
-    with tarfile.open(file_name, 'r:gz', encoding="UTF8") as z:
-        # load x
-        experiments = z.extractfile('experiments.csv')
-        if not (hasattr(experiments, 'read')):
-            raise EMAError(repr(experiments))
-
-        experiments = pd.read_csv(experiments)
-
-        # load experiment metadata
-        metadata = z.extractfile('experiments metadata.csv').readlines()
- 
-        metadata_temp = []
-        for entry in metadata:
-            entry = entry.decode('UTF-8')
-            entry = entry.strip()
-            entry = entry.split(",")
-            name, dtype = [str(item) for item in entry]
-            if np.dtype(dtype)==object:
-                experiments[name] = experiments[name].astype('category') 
-#         metadata = metadata_temp
- 
-#         metadata = np.dtype(metadata)
-
-        # cast experiments to dtype and name specified in metadata
-#         temp_experiments = np.zeros((experiments.shape[0],), dtype=metadata)
-#         for i, entry in enumerate(experiments.dtype.descr):
-#             dtype = metadata[i]
-#             name = metadata.descr[i][0]
-#             temp_experiments[name][:] = experiments[entry[0]].astype(dtype)
-#         experiments = temp_experiments
-
-        # load outcome metadata
-        metadata = z.extractfile('outcomes metadata.csv').readlines()
-        metadata = [entry.decode('UTF-8') for entry in metadata]
-        metadata = [entry.strip() for entry in metadata]
-        metadata = [tuple(entry.split(",")) for entry in metadata]
-        metadata = {entry[0]: entry[1:] for entry in metadata}
-
-        # load outcomes
-        for outcome, shape in metadata.items():
-            shape = list(shape)
-            shape[0] = shape[0][1:]
-            shape[-1] = shape[-1][0:-1]
-
-            temp_shape = []
-            for entry in shape:
-                if entry:
-                    try:
-                        temp_shape.append(int(entry))
-                    except ValueError:
-                        try:
-                            # @UndefinedVariable
-                            temp_shape.append(int(long(entry)))
-                        except NameError:  # we are on python3
-                            temp_shape.append(int(entry[0:-1]))
-            shape = tuple(temp_shape)
-
-            if len(shape) > 2:
-                nr_files = shape[-1]
-
-                data = np.empty(shape)
-                for i in range(nr_files):
-                    values = z.extractfile("{}_{}.csv".format(outcome, i))
-                    values = read_csv(values, index_col=False,
-                                      header=None).values
-                    data[:, :, i] = values
 
-            else:
-                data = z.extractfile("{}.csv".format(outcome))
-                data = read_csv(data, index_col=False, header=None).values
-                data = np.reshape(data, shape)
+    with _open_archive(file_name) as (z, metadata):
+        if metadata['compressed']:
+            # memory mapping is not possible
+            mmap_mode = None
 
-            outcomes[outcome] = data
+        if metadata['version'] == 1:
+            experiments = _load_csv_experiments(z)
+        else:
+            experiments = _load_npy_experiments(z, metadata, file_name,
+                                                mmap_mode, allow_pickle)
+
+        index = None
+        if rows is not None:
+            if callable(rows):
+                rows = rows(experiments)
+            index = np.asarray(rows)
+            if index.dtype == bool:
+                index = np.flatnonzero(index)
+            experiments = experiments.iloc[index].reset_index(drop=True)
+
+        entries = {entry['name']: entry for entry in metadata['outcomes']}
+        if outcomes is None:
+            outcomes = [entry['name'] for entry in metadata['outcomes']]
+        for outcome in outcomes:
+            if outcome not in entries:
+                raise EMAError('{} not in {}'.format(outcome, file_name))
+
+        if lazy:
+            outcomes = LazyOutcomes(file_name, outcomes, mmap_mode=mmap_mode,
+                                    rows=index, allow_pickle=allow_pickle)
+        else:
+            outcomes = {outcome: _load_outcome(z, metadata, entries[outcome],
+                                               file_name, mmap_mode, index,
+                                               allow_pickle)
+                        for outcome in outcomes}
 
     info("results loaded succesfully from {}".format(file_name))
     return experiments, outcomes
 
 
-def save_results(results, file_name):
+class LazyOutcomes(Mapping):
+    '''
+    Mapping of outcome names to outcomes, which loads each outcome from the
+    file on first access. Returned by load_results if lazy is True.
+
+    Parameters
+    ----------
+    file_name : str
+    names : list of str
+            the names of the outcomes
+    mmap_mode : {None, 'r', 'c'}, optional
+    rows : numpy array, optional
+           the indices of the experiments to load
+    allow_pickle : bool, optional
+
+    '''
+
+    def __init__(self, file_name, names, mmap_mode=None, rows=None,
+                 allow_pickle=False):
+        self.file_name = file_name
+        self.names = list(names)
+        self.mmap_mode = mmap_mode
+        self.rows = rows
+        self.allow_pickle = allow_pickle
+        self._loaded = {}
+
+    def __getitem__(self, key):
+        try:
+            return self._loaded[key]
+        except KeyError:
+            if key not in self.names:
+                raise
+
+        with _open_archive(self.file_name) as (z, metadata):
+            entries = {entry['name']: entry for entry in
+                       metadata['outcomes']}
+            data = _load_outcome(z, metadata, entries[key], self.file_name,
+                                 self.mmap_mode, self.rows,
+                                 self.allow_pickle)
+
+        self._loaded[key] = data
+        return data
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __repr__(self):
+        return '<LazyOutcomes {}, loaded: {}>'.format(self.names,
+                                                      list(self._loaded))
+
+
+@contextlib.contextmanager
+def _open_archive(file_name):
+    '''helper context manager for opening a tar file with results. Yields
+    the TarFile instance, and a metadata dict with the format version, 
+    whether the archive is compressed, and an entry for each outcome.'''
+    try:
+        z = tarfile.open(file_name, 'r:', encoding="UTF8")
+        compressed = False
+    except tarfile.ReadError:
+        z = tarfile.open(file_name, 'r:*', encoding="UTF8")
+        compressed = True
+
+    with z:
+        try:
+            metadata = z.extractfile(METADATA)
+        except KeyError:
+            metadata = _load_csv_metadata(z)
+        else:
+            metadata = json.loads(metadata.read().decode('UTF-8'))
+        metadata['compressed'] = compressed
+
+        yield z, metadata
+
+
+def _load_outcome(z, metadata, entry, file_name, mmap_mode=None, rows=None,
+                  allow_pickle=False):
+    '''helper function for loading a single outcome, and selecting the
+    rows'''
+    if metadata['version'] == 1:
+        data = _load_csv_outcome(z, entry['name'], entry['shape'])
+    elif rows is not None and not metadata['compressed']:
+        # only read the rows we need
+        data = _load_array(z, entry['file'], file_name, 'r', allow_pickle)
+        return _restore_objects(data[rows], entry)
+    else:
+        data = _load_array(z, entry['file'], file_name, mmap_mode,
+                           allow_pickle)
+
+    if rows is not None:
+        data = data[rows]
+    return _restore_objects(data, entry)
+
+
+def _restore_objects(data, entry):
+    '''helper function for turning the codes of an array of python
+    scalars back into an object array, see _encode_objects'''
+    if 'categories' not in entry:
+        return data
+
+    values = np.empty((len(entry['categories']) + 1, ), dtype=object)
+    values[:-1] = entry['categories']
+
+    # missing values have code -1
+    values[-1] = np.nan
+    return values[data]
+
+
+def _load_npy_experiments(z, metadata, file_name, mmap_mode,
+                          allow_pickle=False):
+    '''helper function for loading experiments saved as npy files'''
+    experiments = {}
+    columns = []
+    for entry in metadata['experiments']:
+        column = _load_array(z, entry['file'], file_name, mmap_mode,
+                             allow_pickle)
+
+        if entry['dtype'] != 'category':
+            column = _restore_objects(column, entry)
+        elif 'categories' in entry:
+            column = pd.Categorical.from_codes(column, entry['categories'])
+        else:
+            column = pd.Categorical(column)
+        experiments[entry['name']] = column
+        columns.append(entry['name'])
+    return pd.DataFrame(experiments, columns=columns)
+
+def _load_array(z, member, file_name, mmap_mode=None, allow_pickle=False):
+    '''helper function for loading an npy file from a tar archive
+
+    Parameters
+    ----------
+    z : TarFile instance
+    member : str
+    file_name : str
+                the path of the tar file
+    mmap_mode : {None, 'r', 'c'}, optional
+                only to be used for tar files without compression
+    allow_pickle : bool, optional
+                   whether arrays of pickled python objects can be loaded
+
+    Raises
+    ------
+    EMAError if the array contains pickled objects and allow_pickle is
+    False
+
+    '''
+    member = z.getmember(member)
+    fh = z.extractfile(member)
+
+    version = np.lib.format.read_magic(fh)
+    if version == (1, 0):
+        header = np.lib.format.read_array_header_1_0(fh)
+    else:
+        header = np.lib.format.read_array_header_2_0(fh)
+    shape, fortran_order, dtype = header
+
+    if mmap_mode and not dtype.hasobject:
+        # the npy data is stored uncompressed within the tar file
+        # so we can map it directly
+        order = 'F' if fortran_order else 'C'
+        offset = member.offset_data + fh.tell()
+        return np.memmap(file_name, dtype=dtype, mode=mmap_mode,
+                         shape=shape, order=order, offset=offset)
+
+    if dtype.hasobject:
+        if not allow_pickle:
+            raise EMAError(('{} contains pickled objects, use '
+                            'allow_pickle=True to load it if the file is '
+                            'from a trusted source').format(member.name))
+        fh.seek(0)
+        return np.load(fh, allow_pickle=True)
+
+    # read the data directly into the array
+    order = 'F' if fortran_order else 'C'
+    data = np.empty(shape, dtype=dtype, order=order)
+    buffer = memoryview(data.reshape(-1, order='A').view(np.uint8))
+    while buffer.nbytes:
+        nr_bytes = fh.readinto(buffer)
+        if not nr_bytes:
+            raise EMAError('unexpected end of {}'.format(member.name))
+        buffer = buffer[nr_bytes:]
+    return data
+
+
+def _load_csv_experiments(z):
+    '''helper function for loading experiments saved in the old csv based
+    format'''
+    experiments = z.extractfile('experiments.csv')
+    if not (hasattr(experiments, 'read')):
+        raise EMAError(repr(experiments))
+
+    experiments = pd.read_csv(experiments)
+
+    # load experiment metadata
+    metadata = z.extractfile('experiments metadata.csv').readlines()
+
+    for entry in metadata:
+        entry = entry.decode('UTF-8')
+        entry = entry.strip()
+        entry = entry.split(",")
+        name, dtype = [str(item) for item in entry]
+        if np.dtype(dtype)==object:
+            experiments[name] = experiments[name].astype('category') 
+    return experiments
+
+
+def _load_csv_metadata(z):
+    '''helper function for loading the outcome metadata from the old csv
+    based format'''
+    metadata = z.extractfile('outcomes metadata.csv').readlines()
+    metadata = [entry.decode('UTF-8') for entry in metadata]
+    metadata = [entry.strip() for entry in metadata]
+    metadata = [tuple(entry.split(",")) for entry in metadata]
+
+    outcomes = []
+    for entry in metadata:
+        outcome = entry[0]
+        shape = list(entry[1:])
+        shape[0] = shape[0][1:]
+        shape[-1] = shape[-1][0:-1]
+
+        temp_shape = []
+        for entry in shape:
+            if entry:
+                try:
+                    temp_shape.append(int(entry))
+                except ValueError:
+                    try:
+                        # @UndefinedVariable
+                        temp_shape.append(int(long(entry)))
+                    except NameError:  # we are on python3
+                        temp_shape.append(int(entry[0:-1]))
+        outcomes.append({'name': outcome, 'shape': tuple(temp_shape)})
+
+    return {'version': 1, 'outcomes': outcomes}
+
+
+def _load_csv_outcome(z, outcome, shape):
+    '''helper function for loading an outcome saved in the old csv based
+    format'''
+    if len(shape) > 2:
+        nr_files = shape[-1]
+
+        data = np.empty(shape)
+        for i in range(nr_files):
+            values = z.extractfile("{}_{}.csv".format(outcome, i))
+            values = read_csv(values, index_col=False,
+                              header=None).values
+            data[:, :, i] = values
+
+    else:
+        data = z.extractfile("{}.csv".format(outcome))
+        data = read_csv(data, index_col=False, header=None).values
+        data = np.reshape(data, shape)
+    return data
+
+
+def save_results(results, file_name, compression='gz', allow_pickle=False):
     '''
-    save the results to the specified tar.gz file. The results are stored as 
-    csv files. There is an x.csv, and a csv for each outcome. In 
-    addition, there is a metadata csv which contains the datatype information
-    for each of the columns in the x array.
+    save the results to the specified tar file. Each column of the
+    experiments and each outcome is stored as a binary npy file. In
+    addition, there is a metadata json file with the name, dtype, and shape
+    of each of these. Categorical columns, and columns or outcomes of
+    python scalars such as strings, ints, and bools, are stored as integer
+    codes with the unique values in the metadata, so the file can be 
+    loaded without unpickling anything.
 
     Parameters
     ----------    
@@ -154,69 +426,193 @@ def save_results(results, file_name):
               the return of perform_experiments
     file_name : str
                 the path of the file
+    compression : {'gz', 'bz2', 'xz', None}, optional
+                  the compression of the tar file. Without compression, 
+                  saving and loading are fastest, and the results can be
+                  memory mapped when loading.
+    allow_pickle : bool, optional
+                   if True, columns and outcomes with python objects other
+                   than scalars are pickled. Such files can only be loaded
+                   with allow_pickle=True.
 
     Raises
     ------
     IOError if file not found
+    EMAError if the results contain python objects other than scalars,
+    and allow_pickle is False
 
     '''
     file_name = os.path.abspath(file_name)
+    mode = 'w:{}'.format(compression) if compression else 'w'
 
-    def add_file(tararchive, string_to_add, filename):
-        tarinfo = tarfile.TarInfo(filename)
-        tarinfo.size = len(string_to_add)
+    experiments, outcomes = results
+    metadata = {'version': FORMAT_VERSION,
+                'experiments': [],
+                'outcomes': []}
+
+    with tarfile.open(file_name, mode) as z:
+        for i, (name, column) in enumerate(experiments.items()):
+            member = 'experiments/{}.npy'.format(i)
+            entry = {'name': name, 'file': member,
+                     'dtype': str(column.dtype)}
+
+            if entry['dtype'] == 'category':
+                categories = [c.item() if isinstance(c, np.generic) else c
+                              for c in column.cat.categories]
+                if all(isinstance(c, SCALAR_TYPES) for c in categories):
+                    entry['categories'] = categories
+                    column = column.cat.codes.values
+                else:
+                    column = np.asarray(column, dtype=object)
+            else:
+                column = column.values
 
-        fh = BytesIO(string_to_add.encode('UTF-8'))
+            column = _storable_array(column, entry, allow_pickle)
+            _add_array(z, column, member)
+            metadata['experiments'].append(entry)
 
-        z.addfile(tarinfo, fh)
+        for i, (name, value) in enumerate(outcomes.items()):
+            value = np.asarray(value)
 
-    def save_numpy_array(fh, data):
-        data = pd.DataFrame(data)
-        data.to_csv(fh, header=False, index=False, encoding='UTF-8')
+            member = 'outcomes/{}.npy'.format(i)
+            entry = {'name': name, 'file': member,
+                     'dtype': str(value.dtype), 'shape': value.shape}
+            _add_array(z, _storable_array(value, entry, allow_pickle),
+                       member)
+            metadata['outcomes'].append(entry)
 
-    experiments, outcomes = results
-    with tarfile.open(file_name, 'w:gz') as z:
-        # write the x to the zipfile
-        experiments_file = WriterFile()
-
-        experiments.to_csv(experiments_file, header=True,
-                           encoding='UTF-8', index=False)
-
-        add_file(z, experiments_file.getvalue(), 'experiments.csv')
-
-        # write experiment metadata
-        metadatafile = WriterFile()
-        experiments.dtypes.to_csv(metadatafile)
-        add_file(z, metadatafile.getvalue(), 'experiments metadata.csv')
-
-        # write outcome metadata
-        outcome_names = outcomes.keys()
-        outcome_meta = ["{},{}".format(outcome, outcomes[outcome].shape)
-                        for outcome in outcome_names]
-        outcome_meta = "\n".join(outcome_meta)
-        add_file(z, outcome_meta, "outcomes metadata.csv")
-
-        # outcomes
-        for key, value in outcomes.items():
-            fh = WriterFile()
-
-            nr_dim = len(value.shape)
-            if nr_dim == 3:
-                for i in range(value.shape[2]):
-                    data = value[:, :, i]
-                    save_numpy_array(fh, data)
-                    fh = fh.getvalue()
-                    fn = '{}_{}.csv'.format(key, i)
-                    add_file(z, fh, fn)
-                    fh = WriterFile()
-            else:
-                save_numpy_array(fh, value)
-                fh = fh.getvalue()
-                add_file(z, fh, '{}.csv'.format(key))
+        data = json.dumps(metadata).encode('UTF-8')
+        tarinfo = tarfile.TarInfo(METADATA)
+        tarinfo.size = len(data)
+        z.addfile(tarinfo, BytesIO(data))
 
     info("results saved successfully to {}".format(file_name))
 
 
+def _storable_array(data, entry, allow_pickle=False):
+    '''helper function for converting an array of python objects into an
+    array that can be saved without pickling. An array of python scalars
+    is replaced by integer codes, and the unique values are added to the
+    metadata entry as categories.
+
+    Raises
+    ------
+    EMAError if data contains objects other than scalars, and 
+    allow_pickle is False
+
+    '''
+    if not data.dtype.hasobject:
+        return data
+
+    encoded = _encode_objects(data)
+    if encoded is not None:
+        data, entry['categories'] = encoded
+        return data
+
+    if not allow_pickle:
+        raise EMAError(('{} contains python objects, use allow_pickle=True '
+                        'to save it pickled').format(entry['name']))
+    return data
+
+
+def _encode_objects(data):
+    '''helper function for encoding an array of python scalars as codes 
+    into a list of its unique values. Nan is encoded as -1. Values of a
+    different type are kept apart, so 1, 1.0, and True remain distinct.
+
+    Returns
+    -------
+    tuple
+        the codes and the unique values, or None if data contains objects
+        other than scalars
+
+    '''
+    codes = np.empty(data.shape, dtype=np.int64)
+    categories = []
+    index = {}
+
+    for i, value in enumerate(data.flat):
+        if isinstance(value, np.generic):
+            value = value.item()
+        if not isinstance(value, SCALAR_TYPES):
+            return None
+
+        if isinstance(value, float) and math.isnan(value):
+            codes.flat[i] = -1
+            continue
+
+        key = (type(value), value)
+        try:
+            codes.flat[i] = index[key]
+        except KeyError:
+            codes.flat[i] = index[key] = len(categories)
+            categories.append(value)
+    return codes, categories
+
+
+def _add_array(z, data, member):
+    '''helper function for adding an array as an npy file to a tar file
+    without first copying it into an in memory file
+
+    Parameters
+    ----------
+    z : TarFile instance
+    data : numpy array
+    member : str
+
+    '''
+    if data.dtype.hasobject:
+        fh = BytesIO()
+        np.save(fh, data, allow_pickle=True)
+        size = fh.tell()
+        fh.seek(0)
+    else:
+        fh = NpyReader(data)
+        size = fh.size
+
+    tarinfo = tarfile.TarInfo(member)
+    tarinfo.size = size
+    z.addfile(tarinfo, fh)
+
+
+class NpyReader(object):
+    '''
+    Read only file like object for the npy representation of a numeric 
+    array. The data is read directly from the array.
+
+    Parameters
+    ----------
+    data : numpy array
+
+    '''
+
+    def __init__(self, data):
+        data = np.ascontiguousarray(data)
+
+        header = BytesIO()
+        header_data = np.lib.format.header_data_from_array_1_0(data)
+        np.lib.format.write_array_header_1_0(header, header_data)
+
+        self._buffers = [memoryview(header.getvalue()),
+                         memoryview(data.reshape(-1).view(np.uint8))]
+        self.size = sum(buffer.nbytes for buffer in self._buffers)
+
+    def read(self, size=-1):
+        chunks = []
+        while self._buffers and size != 0:
+            buffer = self._buffers[0]
+            if size < 0 or size >= buffer.nbytes:
+                chunk = buffer
+                self._buffers.pop(0)
+            else:
+                chunk = buffer[:size]
+                self._buffers[0] = buffer[size:]
+            chunks.append(chunk.tobytes())
+            if size > 0:
+                size -= len(chunk)
+        return b''.join(chunks)
+
+
 def experiments_to_scenarios(experiments, model=None):
     '''
 
@@ -8,8 +8,10 @@ import unittest
 
 import numpy as np
 import pandas as pd
+from scipy import stats
 
 from ema_workbench.analysis import prim
+from ema_workbench.analysis import scenario_discovery_util as sdutil
 from ema_workbench.analysis.prim import PrimBox
 from test import utilities
 
@@ -69,7 +71,7 @@ class PrimBoxTestCase(unittest.TestCase):
         new_box_lim = pd.DataFrame([(0,1,1),
                                     (2,5,6)], 
                                     columns=['a', 'b', 'c'])
-        indices = np.array([0,1], dtype=np.int)
+        indices = np.array([0,1], dtype=int)
         box.update(new_box_lim, indices)
         
         box.select(0)
@@ -88,7 +90,7 @@ class PrimBoxTestCase(unittest.TestCase):
         new_box_lim = pd.DataFrame([(0,1,1),
                                     (2,5,6)], 
                                     columns=['a', 'b', 'c'])
-        indices = np.array([0,1], dtype=np.int)
+        indices = np.array([0,1], dtype=int)
         box.update(new_box_lim, indices)
         
         box.inspect(1)
@@ -107,7 +109,7 @@ class PrimBoxTestCase(unittest.TestCase):
         new_box_lim = pd.DataFrame([(0,1,1),
                                     (2,5,6)], 
                                     columns=['a', 'b', 'c'])
-        indices = np.array([0,1], dtype=np.int)
+        indices = np.array([0,1], dtype=int)
         box.update(new_box_lim, indices)
         
         self.assertEqual(box.peeling_trajectory['mean'][1], 1)
@@ -130,7 +132,7 @@ class PrimBoxTestCase(unittest.TestCase):
         new_box_lim = pd.DataFrame([(0,1,1),
                                     (2,2,6)], 
                                     columns=['a', 'b', 'c'])
-        indices = np.array([0,1], dtype=np.int)
+        indices = np.array([0,1], dtype=int)
         box.update(new_box_lim, indices)
         
         box.drop_restriction('b')
@@ -152,9 +154,110 @@ class PrimBoxTestCase(unittest.TestCase):
         self.assertEqual(box.peeling_trajectory['res_dim'][2], 1)
         self.assertEqual(box.peeling_trajectory['mass'][2], 2/3)        
 
-    
+
     def test_calculate_quasi_p(self):
-        pass
+        x = pd.DataFrame([(0.1, 1, 'a'),
+                          (0.2, 2, 'b'),
+                          (0.3, 3, 'a'),
+                          (0.4, 4, 'b'),
+                          (0.5, 5, 'a'),
+                          (0.6, 6, 'b')],
+                         columns=['a', 'b', 'c'])
+        y = np.array([0, 1, 0, 1, 1, 1])
+
+        prim_obj = prim.Prim(x, y, threshold=0.8)
+        box = PrimBox(prim_obj, prim_obj.box_init, prim_obj.yi)
+
+        new_box_lim = prim_obj.box_init.copy()
+        new_box_lim.loc[0, 'a'] = 0.2
+        new_box_lim['c'] = [set(['b']), set(['b'])]
+        indices = np.array([1, 3, 5])
+        box.update(new_box_lim, indices)
+
+        qp = box._calculate_quasi_p(1)
+        self.assertEqual(set(qp.keys()), set(['a', 'c']))
+        self.assertEqual(qp['a'][1], -1)
+        self.assertEqual(qp['c'][1], -1)
+
+        # relaxing c adds data points 2 and 4
+        p = 4/5
+        expected = stats.binom_test(3, 3, p, alternative='greater')
+        self.assertAlmostEqual(qp['c'][0], expected)
+
+        # relaxing a adds no data points
+        expected = stats.binom_test(3, 3, 1, alternative='greater')
+        self.assertAlmostEqual(qp['a'][0], expected)
+
+        self.assertIs(box.qp[1], qp)
+        self.assertEqual(box.qp[0], {})
+
+    def test_calculate_quasi_p_boolean(self):
+        rng = np.random.RandomState(42)
+        x = pd.DataFrame(rng.rand(500, 3), columns=['a', 'b', 'c'])
+        y = ((x['a'] > 0.4) & (x['b'] < 0.7)).values
+
+        prim_obj = prim.Prim(x, y, threshold=0.8)
+        box = prim_obj.find_box()
+        box_lim = box.box_lims[-1]
+        qp = box._calculate_quasi_p(-1)
+
+        in_box = sdutil._in_box(prim_obj.x, box_lim)
+        Tbox = in_box.sum()
+        Hbox = y[in_box].sum()
+
+        # compare against relaxing each limit of the box one by one
+        self.assertTrue(qp)
+        for unc, values in qp.items():
+            for k, value in enumerate(values):
+                if value == -1:
+                    continue
+                relaxed = box_lim.copy()
+                relaxed.loc[k, unc] = prim_obj.box_init.loc[k, unc]
+                logical = sdutil._in_box(prim_obj.x, relaxed)
+                p = y[logical].sum()/logical.sum()
+                expected = stats.binom_test(Hbox, Tbox, p,
+                                            alternative='greater')
+                self.assertAlmostEqual(value, expected)
+
+    def test_resample(self):
+        rng = np.random.RandomState(42)
+        x = pd.DataFrame(rng.rand(500, 3), columns=['a', 'b', 'c'])
+        y = ((x['a'] > 0.5) & (x['b'] < 0.6)).values.astype(int)
+
+        prim_obj = prim.Prim(x, y, threshold=0.8)
+        box = prim_obj.find_box()
+
+        scores = box.resample(iterations=4, seed=1)
+        self.assertEqual(len(box._resampled), 4)
+        self.assertEqual(scores.shape, (3, 2))
+        self.assertTrue(((scores >= 0) & (scores <= 100)).all().all())
+
+        # seeded resampling is reproducible, also over processes
+        box._resampled = []
+        box.resample(iterations=2, seed=1)
+        other = box.resample(iterations=4, seed=1, n_processes=2)
+        self.assertTrue(scores.equals(other))
+
+    def test_bootstrap(self):
+        rng = np.random.RandomState(42)
+        x = pd.DataFrame(rng.rand(500, 3), columns=['a', 'b', 'c'])
+        y = (((x['a'] > 0.5) & (x['b'] < 0.6)) |
+             (rng.rand(500) < 0.1)).values.astype(int)
+
+        prim_obj = prim.Prim(x, y, threshold=0.8)
+        box = prim_obj.find_box()
+
+        stats = box.bootstrap(iterations=100, seed=1)
+        trajectory = box.peeling_trajectory.iloc[-1]
+        for stat in ['coverage', 'density']:
+            self.assertAlmostEqual(stats.loc[stat, 'value'], trajectory[stat])
+            self.assertLessEqual(stats.loc[stat, 'lower'],
+                                 stats.loc[stat, 'value'])
+            self.assertGreaterEqual(stats.loc[stat, 'upper'],
+                                    stats.loc[stat, 'value'])
+
+        self.assertTrue(stats.equals(box.bootstrap(iterations=100, seed=1)))
+
 
 class PrimTestCase(unittest.TestCase):
 
@@ -262,6 +365,13 @@ class PrimTestCase(unittest.TestCase):
         self.assertTrue(prim.get_quantile(data, 0.95)==8.5)
         self.assertTrue(prim.get_quantile(data, 0.1)==1.5)
         self.assertTrue(prim.get_quantile(data, 0.05)==1.5)        
+        
+        # vectorized quantiles over the rows of sorted data
+        data = np.sort(np.random.randint(0, 5, (4, 20)), axis=1)
+        for quantile in [0.05, 0.1, 0.5, 0.9, 0.95]:
+            expected = [prim.get_quantile(row, quantile) for row in data]
+            np.testing.assert_equal(prim._sorted_quantiles(data, quantile),
+                                    expected)
           
         
 
@@ -344,7 +454,7 @@ class PrimTestCase(unittest.TestCase):
                          columns=['a', 'b'])
         
         y = np.random.randint(0,2, (10,))
-        y = y.astype(np.int)
+        y = y.astype(int)
         y = {'y':y}
         results = x, y
         classify = 'y'
@@ -355,19 +465,51 @@ class PrimTestCase(unittest.TestCase):
                                  columns=['a', 'b'] )
         box = prim.PrimBox(prim_obj, box_lims, prim_obj.yi)
         
-        u = 'b'
-        x = x.select_dtypes(exclude=np.number).values
-        j = 0
-        peels = prim_obj._categorical_peel(box, u, j, x)
+        limits, allowed = prim_obj._box_to_arrays(box_lims)
+        mask = np.ones(prim_obj.n, dtype=bool)
+        y_sorted = prim_obj.y[prim_obj._order]
+        candidates = prim_obj._peel_candidates(box, mask, y_sorted, limits,
+                                               allowed, limits, allowed)
+        _, n_new, _, peels = candidates
         
+        peels = [(peel, n) for peel, n in zip(peels, n_new) 
+                 if peel[0] == 'nominal']
         self.assertEqual(len(peels), 2)
         
-        for peel in peels:
-            pl  = peel[1][u]
-            self.assertEqual(len(pl[0]), 1)
-            self.assertEqual(len(pl[1]), 1)
+        categories = prim_obj._categories[0]
+        for peel, n in peels:
+            entry = categories[peel[2]]
+            self.assertEqual(n, np.sum(x['b'].values != entry))
         
 
+    def test_prim_sweep(self):
+        rng = np.random.RandomState(42)
+        x = pd.DataFrame(rng.rand(500, 3), columns=['a', 'b', 'c'])
+        y = {'y1': ((x['a'] > 0.5) & (x['b'] < 0.6)).values.astype(int),
+             'y2': (x['c'] > 0.3).values.astype(int)}
+
+        results = prim.prim_sweep(x, y, [0.8, 0.9], peel_alphas=[0.05, 0.1],
+                                  n_boxes=2)
+        self.assertEqual(results.columns.tolist(),
+                         ['outcome', 'threshold', 'peel_alpha', 'box', 'id',
+                          'coverage', 'density', 'mean', 'mass', 'res_dim'])
+        runs = results.groupby(['outcome', 'threshold', 'peel_alpha'])
+        self.assertEqual(len(runs), 8)
+
+        # a sweep gives the same trajectories as a separate run
+        prim_obj = prim.Prim(x.copy(), y['y2'], threshold=0.9,
+                             peel_alpha=0.1)
+        box = prim_obj.find_box()
+        run = results[(results.outcome == 'y2') & (results.threshold == 0.9) &
+                      (results.peel_alpha == 0.1) & (results.box == 0)]
+        np.testing.assert_almost_equal(run['coverage'].values.astype(float),
+                                       box.peeling_trajectory['coverage'])
+
+        # and in parallel
+        other = prim.prim_sweep(x, y, [0.8, 0.9], peel_alphas=[0.05, 0.1],
+                                n_boxes=2, n_processes=2)
+        self.assertTrue(results.equals(other))
+
     def test_categorical_paste(self):
         a = np.random.rand(10,)
         b = ['a','b','a','b','a','a','b','a','b','a', ]
@@ -375,7 +517,7 @@ class PrimTestCase(unittest.TestCase):
         x['b'] = x['b'].astype('category')
         
         y = np.random.randint(0,2, (10,))
-        y = y.astype(np.int)
+        y = y.astype(int)
         y = {'y':y}
         results = x,y
         classify = 'y'
@@ -95,7 +95,39 @@ class ScenarioDiscoveryUtilTestCase(unittest.TestCase):
         logical = sdutil._in_box(x, boxlim)
         result = x.loc[logical]
         self.assertTrue(np.all(correct_result==result))
-    
+
+    def test_box_membership(self):
+        x = pd.DataFrame([(0.1, 0, 'a'),
+                          (1.1, 1, 'a'),
+                          (2.1, 2, 'b'),
+                          (3.1, 3, 'b'),
+                          (4.1, 4, 'c'),
+                          (5.1, 5, 'c')],
+                          columns=['a', 'b', 'c'])
+        x['c'] = x['c'].astype('category')
+        in_box = sdutil._BoxMembership(x)
+
+        boxlims = [pd.DataFrame([(1.2, 0, set(['a','b'])),
+                                 (8.0, 7, set(['a','b']))],
+                                columns=['a', 'b', 'c']),
+                   pd.DataFrame([(0.1, 1, set(['a','b','c'])),
+                                 (5.1, 4, set(['a','b','c']))],
+                                columns=['a', 'b', 'c']),
+                   pd.DataFrame([(0.1, 0, set(['c'])),
+                                 (5.1, 5, set(['c']))],
+                                columns=['a', 'b', 'c'])]
+
+        logical = in_box.in_boxes(boxlims)
+        self.assertEqual(logical.shape, (3, 6))
+        for boxlim, expected in zip(boxlims, logical):
+            np.testing.assert_equal(in_box(boxlim), expected)
+            np.testing.assert_equal(sdutil._in_box(x, boxlim), expected)
+        np.testing.assert_equal(logical[1], [0, 1, 1, 1, 1, 0])
+
+        # only test the limits on a subset of the columns
+        logical = in_box.in_boxes(boxlims, columns=['a', 'b'])
+        np.testing.assert_equal(logical[2], np.ones((6,)))
+
     
     def test_make_box(self):
         x = pd.DataFrame([(0,1,2),
@@ -0,0 +1,102 @@
+'''
+
+
+'''
+from __future__ import (absolute_import, print_function, division,
+                        unicode_literals)
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from ema_workbench.em_framework.caching import ResultCache, CachingCallback
+from ema_workbench.em_framework.callbacks import DefaultCallback
+from ema_workbench.em_framework.model import Model
+from ema_workbench.em_framework.outcomes import ScalarOutcome
+from ema_workbench.em_framework.parameters import (RealParameter, Policy,
+                                                   Scenario, Case, Constant)
+
+
+def create_model():
+    model = Model('test', function=lambda a=0, b=0, c=0: {'y': a + b})
+    model.uncertainties = [RealParameter('a', 0, 1)]
+    model.levers = [RealParameter('b', 0, 1)]
+    model.constants = [Constant('c', 1)]
+    model.outcomes = [ScalarOutcome('y')]
+    return model
+
+
+class TestResultCache(unittest.TestCase):
+    def test_key(self):
+        model = create_model()
+        cache = ResultCache()
+
+        case = Case('0', 'test', Policy('p', b=0.5), Scenario('s', a=0.1), 0)
+        other = Case('1', 'test', Policy('q', b=np.float64(0.5)),
+                     Scenario('t', a=0.1, d=2), 1)
+        self.assertEqual(cache.key(model, case), cache.key(model, other))
+
+        other = Case('1', 'test', Policy('q', b=0.6), Scenario('t', a=0.1), 1)
+        self.assertNotEqual(cache.key(model, case), cache.key(model, other))
+
+        key = cache.key(model, case)
+        model.constants = [Constant('c', 2)]
+        self.assertNotEqual(cache.key(model, case), key)
+
+    def test_lru(self):
+        cache = ResultCache(maxsize=2)
+        cache.put('a', {'y': 1})
+        cache.put('b', {'y': 2})
+        cache.lookup('a')
+        cache.put('c', {'y': 3})
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.lookup('a'), {'y': 1})
+        self.assertIsNone(cache.lookup('b'))
+        self.assertEqual(cache.hits, 2)
+        self.assertEqual(cache.misses, 1)
+        self.assertAlmostEqual(cache.hit_rate, 2 / 3)
+
+    def test_directory(self):
+        directory = tempfile.mkdtemp()
+        try:
+            cache = ResultCache(maxsize=1, directory=directory)
+            cache.put('a', {'y': 1})
+            cache.put('b', {'y': 2})
+
+            self.assertEqual(cache.lookup('a'), {'y': 1})
+
+            cache = ResultCache(directory=directory)
+            self.assertEqual(cache.lookup('b'), {'y': 2})
+        finally:
+            shutil.rmtree(directory)
+
+
+class TestCachingCallback(unittest.TestCase):
+    def test_filter(self):
+        model = create_model()
+        cache = ResultCache()
+
+        cases = [Case(str(i), 'test', Policy('p', b=0.5),
+                      Scenario(str(i), a=i / 10), i) for i in range(4)]
+
+        callback = DefaultCallback(model.uncertainties, model.levers,
+                                   model.outcomes, 4)
+        callback = CachingCallback(callback, cache, [model])
+        self.assertEqual(list(callback.filter(cases)), cases)
+        callback.store_batch([(c, {'y': c.experiment_id}) for c in cases])
+        self.assertEqual(len(cache), 4)
+
+        callback = DefaultCallback(model.uncertainties, model.levers,
+                                   model.outcomes, 4)
+        callback = CachingCallback(callback, cache, [model])
+        self.assertEqual(list(callback.filter(cases)), [])
+        self.assertEqual(callback.i, 4)
+
+        _, outcomes = callback.get_results()
+        np.testing.assert_equal(outcomes['y'], [0, 1, 2, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,13 +5,18 @@ Created on 22 Jan 2013
 '''
 from __future__ import (absolute_import, print_function, division,
                         unicode_literals)
+import os
 import random
+import shutil
+import tempfile
 import unittest
 
 import mock
 import numpy as np
 
-from ema_workbench.em_framework.callbacks import DefaultCallback
+from ema_workbench.em_framework.callbacks import (DefaultCallback,
+                                        FileBasedCallback,
+                                        load_file_based_results)
 from ema_workbench.em_framework.parameters import (CategoricalParameter,
                                         RealParameter, IntegerParameter)
 from ema_workbench.em_framework.parameters import Policy, Scenario, Case
@@ -177,6 +182,176 @@ class TestDefaultCallback(unittest.TestCase):
         for name in names:
             self.assertEqual(experiments[name][0], design[name])
 
+    def test_store_batch(self):
+        nr_experiments = 4
+        uncs = [RealParameter("a", 0, 1),
+                CategoricalParameter('b', ['x', 'y'])]
+        levers = [RealParameter("c", 0, 1)]
+        outcomes = [TimeSeriesOutcome("test")]
+        model = NamedObject('test')
+        policy = Policy('policy', c=0.5)
+
+        batch = []
+        for i in range(3):
+            scenario = Scenario(a=i/10, b='x' if i%2 else 'y')
+            experiment = Case(i, model.name, policy, scenario, i)
+            batch.append((experiment, {'test': np.arange(5)*i}))
+
+        callback = DefaultCallback(uncs, levers, outcomes,
+                                   nr_experiments=nr_experiments,
+                                   reporting_interval=1)
+        callback.store_batch(batch)
+        self.assertEqual(callback.i, 3)
+
+        experiments, out = callback.get_results()
+        self.assertEqual(out['test'].shape, (4, 5))
+        np.testing.assert_equal(out['test'][2], np.arange(5)*2)
+        self.assertTrue(np.all(np.isnan(out['test'][3])))
+        self.assertEqual(experiments['a'][1], 0.1)
+        self.assertEqual(experiments['b'][1], 'x')
+        self.assertEqual(experiments['c'][2], 0.5)
+        self.assertEqual(experiments['policy'][0], policy.name)
+        self.assertEqual(experiments['model'][0], model.name)
+        self.assertEqual(experiments['scenario'][2], batch[2][0].scenario.name)
+
+        # batch and single storage give the same results
+        single = DefaultCallback(uncs, levers, outcomes,
+                                 nr_experiments=nr_experiments)
+        for experiment, model_outcomes in batch:
+            single(experiment, model_outcomes)
+        single_experiments, single_out = single.get_results()
+        self.assertTrue(single_experiments.equals(experiments))
+        np.testing.assert_equal(single_out['test'], out['test'])
+
+    def test_store_batch_mixed_designs(self):
+        # designs with different parameters are stored one at the time
+        nr_experiments = 3
+        uncs = [RealParameter("a", 0, 1)]
+        levers = [RealParameter("c", 0, 1)]
+        outcomes = [TimeSeriesOutcome("test")]
+        model = NamedObject('test')
+
+        batch = [(Case(0, model.name, Policy('p0', c=0.5),
+                       Scenario(a=0.1), 0), {'test': 1}),
+                 (Case(1, model.name, Policy('p1'),
+                       Scenario(a=0.2, d='x'), 1), {'test': 2}),
+                 (Case(2, model.name, Policy('p2', c=0.7),
+                       Scenario(a=0.3), 2), {'test': 3})]
+
+        callback = DefaultCallback(uncs, levers, outcomes,
+                                   nr_experiments=nr_experiments)
+        callback.store_batch(batch)
+
+        single = DefaultCallback(uncs, levers, outcomes,
+                                 nr_experiments=nr_experiments)
+        for experiment, model_outcomes in batch:
+            single(experiment, model_outcomes)
+
+        experiments, _ = callback.get_results()
+        single_experiments, _ = single.get_results()
+        self.assertTrue(single_experiments.equals(experiments))
+        self.assertEqual(experiments['c'][2], 0.7)
+        self.assertTrue(np.isnan(experiments['c'][1]))
+        self.assertEqual(experiments['d'][1], 'x')
+
+
+class TestFileBasedCallback(unittest.TestCase):
+    def setUp(self):
+        self.directory = os.path.join(tempfile.mkdtemp(), 'results')
+
+    def tearDown(self):
+        shutil.rmtree(os.path.dirname(self.directory))
+
+    def test_store_results(self):
+        nr_experiments = 5
+        uncs = [RealParameter("a", 0, 1),
+                CategoricalParameter('b', ['x', 'y'])]
+        outcomes = [TimeSeriesOutcome("test")]
+        model = NamedObject('test')
+        policy = Policy('policy')
+
+        results = []
+        for i in range(4):
+            scenario = Scenario(a=i/10, b='x' if i%2 else 'y')
+            experiment = Case(i, model.name, policy, scenario, i)
+            results.append((experiment, {'test': np.arange(3)*i}))
+
+        callback = FileBasedCallback(uncs, [], outcomes,
+                                     nr_experiments=nr_experiments,
+                                     directory=self.directory,
+                                     flush_interval=2)
+        callback(*results[0])
+        callback.store_batch(results[1:3])
+        callback(*results[3])
+        self.assertEqual(callback.i, 4)
+
+        # compare with the default callback
+        default = DefaultCallback(uncs, [], outcomes,
+                                  nr_experiments=nr_experiments)
+        default.store_batch(results)
+        expected_experiments, expected_outcomes = default.get_results()
+
+        experiments, out = callback.get_results()
+        self.assertIsInstance(out['test'], np.memmap)
+        self.assertTrue(experiments.equals(expected_experiments))
+        np.testing.assert_equal(out['test'], expected_outcomes['test'])
+
+        # read back in from disk
+        experiments, out = load_file_based_results(self.directory,
+                                                   mmap_mode=None)
+        self.assertTrue(experiments.equals(expected_experiments))
+        np.testing.assert_equal(out['test'], expected_outcomes['test'])
+
+    def test_resume(self):
+        nr_experiments = 4
+        uncs = [RealParameter("a", 0, 1),
+                CategoricalParameter('b', ['x', 'y'])]
+        outcomes = [TimeSeriesOutcome("test")]
+        model = NamedObject('test')
+        policy = Policy('policy')
+
+        results = []
+        for i in range(nr_experiments):
+            scenario = Scenario(a=i/10, b='x' if i%2 else 'y')
+            experiment = Case(i, model.name, policy, scenario, i)
+            results.append((experiment, {'test': np.arange(3)*i}))
+
+        callback = FileBasedCallback(uncs, [], outcomes,
+                                     nr_experiments=nr_experiments,
+                                     directory=self.directory,
+                                     flush_interval=2)
+        callback.store_batch(results[0:2])
+        # not flushed, so lost when the run is interrupted
+        callback(*results[2])
+        del callback
+
+        callback = FileBasedCallback(uncs, [], outcomes,
+                                     nr_experiments=nr_experiments,
+                                     directory=self.directory,
+                                     flush_interval=2, resume=True)
+        self.assertEqual(callback.i, 2)
+
+        experiments = [experiment for experiment, _ in results]
+        remaining = list(callback.filter(experiments))
+        self.assertEqual(remaining, experiments[2::])
+
+        callback.store_batch(results[2::])
+        self.assertEqual(callback.i, nr_experiments)
+        self.assertEqual(list(callback.filter(experiments)), [])
+
+        default = DefaultCallback(uncs, [], outcomes,
+                                  nr_experiments=nr_experiments)
+        default.store_batch(results)
+        expected_experiments, expected_outcomes = default.get_results()
+
+        experiments, out = callback.get_results()
+        self.assertTrue(experiments.equals(expected_experiments))
+        np.testing.assert_equal(out['test'], expected_outcomes['test'])
+
+        with self.assertRaises(EMAError):
+            FileBasedCallback(uncs, [], outcomes, nr_experiments=10,
+                              directory=self.directory, resume=True)
+
 
 if __name__ == "__main__":
     unittest.main()
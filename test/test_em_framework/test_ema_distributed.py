@@ -0,0 +1,97 @@
+'''
+
+
+'''
+from __future__ import (absolute_import, print_function, division,
+                        unicode_literals)
+import threading
+import time
+import unittest
+from collections import deque
+
+from dask.distributed import Client
+import mock
+
+from ema_workbench.em_framework.ema_distributed import AdaptiveBatches
+
+
+_straggled = []
+_release = threading.Event()
+
+
+def straggling_batch(experiments, instrument=False):
+    '''stands in for run_timed_experiments_on_worker, the first run of
+    experiment 0 hangs until released, all others return right away'''
+    if 0 in experiments and not _straggled:
+        _straggled.append(0)
+        _release.wait(10)
+    return [(e, 2*e) for e in experiments], 0.5 * len(experiments)
+
+
+class TestAdaptiveBatches(unittest.TestCase):
+    def test_batch_size(self):
+        client = mock.Mock()
+        batches = AdaptiveBatches(client, range(1000), n_workers=2)
+
+        # start with single experiments
+        self.assertEqual(batches.batch_size, 1)
+
+        # grow with the observed run time
+        batches.chunksizer.update(10, 0.01)
+        self.assertEqual(batches.batch_size, 100)
+
+        # shrink near the end of the run
+        batches.experiments = deque(range(50))
+        self.assertEqual(batches.batch_size, 25)
+        batches.experiments.clear()
+        self.assertEqual(batches.batch_size, 1)
+
+        # a fixed batch size
+        batches = AdaptiveBatches(client, range(10), n_workers=2,
+                                  batch_size=8)
+        self.assertEqual(batches.batch_size, 8)
+
+    def test_fill(self):
+        client = mock.Mock()
+        client.submit.side_effect = lambda *args, **kwargs: mock.Mock()
+        batches = AdaptiveBatches(client, range(10), n_workers=2,
+                                  batch_size=3)
+        batches._fill()
+
+        # two batches per worker are in flight
+        self.assertEqual(client.submit.call_count, 4)
+        submitted = [call[0][1] for call in client.submit.call_args_list]
+        self.assertEqual(submitted, [[0, 1, 2], [3, 4, 5], [6, 7, 8], [9]])
+        self.assertEqual(len(batches.experiments), 0)
+
+    @mock.patch('ema_workbench.em_framework.ema_distributed.'
+                'run_timed_experiments_on_worker', straggling_batch)
+    def test_speculative(self):
+        # the workers run in threads of this process, so they use the
+        # patched function
+        client = Client(processes=False, n_workers=3, threads_per_worker=1)
+        try:
+            batches = AdaptiveBatches(client, range(6), n_workers=3,
+                                      batch_size=1, speculative=2)
+
+            start = time.time()
+            results = {}
+            for batch, batch_results in batches:
+                for experiment, result in batch_results:
+                    self.assertNotIn(experiment, results)
+                    results[experiment] = result
+            elapsed = time.time() - start
+
+            # the other batches complete before the straggler is overdue,
+            # so it is only resubmitted because waiting times out
+            self.assertEqual(_straggled, [0])
+            self.assertEqual(results, {e: 2*e for e in range(6)})
+            self.assertLess(elapsed, 5)
+            self.assertEqual(batches._futures, {})
+        finally:
+            _release.set()
+            client.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
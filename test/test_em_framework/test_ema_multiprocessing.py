@@ -5,10 +5,195 @@
 from __future__ import (unicode_literals, print_function, absolute_import,
                                         division)
 
+import threading
+import time
+import unittest
 
+import mock
+import numpy as np
+
+from ema_workbench.em_framework import ema_multiprocessing
+from ema_workbench.em_framework.callbacks import DefaultCallback
+from ema_workbench.em_framework.evaluators import MultiprocessingEvaluator
+from ema_workbench.em_framework.ema_multiprocessing import (ChunkSizer,
+                            SharedOutcomes, store_shared_outcomes,
+                            attach_shared_outcomes, add_tasks)
+from ema_workbench.em_framework.model import Model
+from ema_workbench.em_framework.outcomes import (ScalarOutcome,
+                                                 TimeSeriesOutcome)
+from ema_workbench.em_framework.parameters import RealParameter
 
 # Created on 14 Mar 2017
 #
 # .. codeauthor::jhkwakkel <j.h.kwakkel (at) tudelft (dot) nl>
 
-__all__ = []
\ No newline at end of file
+
+def time_series_model(a=0):
+    return {'y': np.full((1000, ), a)}
+
+
+class TestChunkSizer(unittest.TestCase):
+
+    def test_fixed(self):
+        chunksizer = ChunkSizer(10)
+        self.assertEqual(chunksizer.chunksize, 10)
+
+        chunksizer.update(10, 100)
+        self.assertEqual(chunksizer.chunksize, 10)
+        self.assertEqual(chunksizer.n_experiments, 10)
+        self.assertEqual(chunksizer.duration, 100)
+
+        with self.assertRaises(ValueError):
+            ChunkSizer(0)
+
+    def test_automatic(self):
+        chunksizer = ChunkSizer(target_duration=0.1, max_chunksize=500)
+        self.assertEqual(chunksizer.chunksize, 1)
+
+        # 1 ms per experiment
+        chunksizer.update(1, 0.001)
+        self.assertEqual(chunksizer.chunksize, 100)
+
+        # slow experiments
+        chunksizer = ChunkSizer(target_duration=0.1, max_chunksize=500)
+        chunksizer.update(2, 10)
+        self.assertEqual(chunksizer.chunksize, 1)
+
+        # very fast experiments are capped
+        chunksizer = ChunkSizer(target_duration=0.1, max_chunksize=500)
+        chunksizer.update(10, 0)
+        self.assertEqual(chunksizer.chunksize, 500)
+
+
+class FakeResult(object):
+    def __init__(self, pool, chunk):
+        self.pool = pool
+        self.chunk = chunk
+
+    def get(self):
+        time.sleep(0.001)
+        with self.pool.lock:
+            self.pool.pending -= 1
+        return [{} for _ in self.chunk], 0.001, None
+
+
+class FakePool(object):
+    '''pool that keeps track of the number of tasks whose results have
+    not yet been retrieved'''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.max_pending = 0
+        self.n_tasks = 0
+
+    def apply_async(self, func, args, kwargs=None):
+        with self.lock:
+            self.pending += 1
+            self.n_tasks += 1
+            self.max_pending = max(self.max_pending, self.pending)
+        return FakeResult(self, args[0])
+
+
+class TestAddTasks(unittest.TestCase):
+
+    def test_bounded_pending(self):
+        pool = FakePool()
+        callback = mock.Mock()
+        add_tasks(pool, range(100), callback, chunksize=1, max_pending=3)
+
+        self.assertEqual(pool.n_tasks, 100)
+        self.assertEqual(pool.pending, 0)
+        self.assertLessEqual(pool.max_pending, 3)
+        self.assertEqual(callback.store_batch.call_count, 100)
+
+    def test_lazy_generator(self):
+        # experiments are only taken from the generator once there is
+        # room in the pool
+        pool = FakePool()
+        taken = []
+
+        def experiments():
+            for i in range(50):
+                taken.append((i, pool.pending))
+                yield i
+
+        add_tasks(pool, experiments(), mock.Mock(), chunksize=1,
+                  max_pending=2)
+        self.assertTrue(all(pending < 2 for _, pending in taken))
+
+
+class TestSharedOutcomes(unittest.TestCase):
+
+    def test_store_shared_outcomes(self):
+        arrays = {'a': np.zeros((3, )),
+                  'b': np.zeros((3, 2))}
+        outcomes = {'a': 1, 'b': np.ones((3,)), 'c': 2}
+
+        remaining = store_shared_outcomes(arrays, 1, outcomes)
+
+        # b has the wrong shape, c is not shared
+        self.assertEqual(set(remaining.keys()), {'b', 'c'})
+        np.testing.assert_equal(arrays['a'], [0, 1, 0])
+        np.testing.assert_equal(arrays['b'], np.zeros((3, 2)))
+
+    @unittest.skipIf(ema_multiprocessing.shared_memory is None,
+                     'shared memory not available')
+    def test_shared_outcomes(self):
+        uncs = [RealParameter('a', 0, 1)]
+        outcomes = [ScalarOutcome('b'), TimeSeriesOutcome('c')]
+        callback = DefaultCallback(uncs, [], outcomes, nr_experiments=4)
+
+        shared = SharedOutcomes(callback)
+        data = callback._init_outcome('c', (5, ))
+        self.assertEqual(data.shape, (4, 5))
+        self.assertTrue(np.all(np.isnan(data)))
+        self.assertIn('c', shared.descriptors)
+
+        # the view a worker would see
+        arrays = attach_shared_outcomes(dict(shared.descriptors))
+        arrays['c'][2] = np.arange(5)
+        np.testing.assert_equal(callback.results['c'][2], np.arange(5))
+
+        # a view that outlives the outcome array does not break release
+        row = data[2]
+        del data
+        shared.release()
+        self.assertFalse(np.shares_memory(callback.results['c'], row))
+        np.testing.assert_equal(callback.results['c'][2], np.arange(5))
+        np.testing.assert_equal(row, np.arange(5))
+
+        # the blocks are closed once they are no longer used
+        del row, arrays
+        attach_shared_outcomes({})
+        self.assertEqual(ema_multiprocessing._detached_blocks, [])
+
+        # after release, outcomes are allocated normally again
+        callback._init_outcome('b', ())
+        self.assertEqual(set(shared.descriptors.keys()), {'c'})
+
+    @unittest.skipIf(ema_multiprocessing.shared_memory is None,
+                     'shared memory not available')
+    def test_evaluator(self):
+        model = Model('test', function=time_series_model)
+        model.uncertainties = [RealParameter('a', 0, 1)]
+        model.outcomes = [TimeSeriesOutcome('y')]
+
+        with MultiprocessingEvaluator(model, n_processes=2, chunksize=1,
+                                      shared_memory=True,
+                                      instrument=True) as evaluator:
+            experiments, outcomes = evaluator.perform_experiments(20)
+
+        self.assertEqual(outcomes['y'].shape, (20, 1000))
+        np.testing.assert_equal(
+            outcomes['y'],
+            np.repeat(experiments['a'].values[:, np.newaxis], 1000, axis=1))
+
+        # only the chunks submitted before the array was allocated
+        # return their time series through the pool
+        sizes = evaluator.instrumentation.to_dataframe()['size']
+        self.assertGreaterEqual((sizes < 1000).sum(), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
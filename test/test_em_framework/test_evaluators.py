@@ -6,16 +6,30 @@ from __future__ import (unicode_literals, print_function, absolute_import,
                         division)
 
 import mock
+import os
+import shutil
+import tempfile
 import unittest
 
 import ema_workbench
 from ema_workbench.em_framework import evaluators
+from ema_workbench.em_framework.parameters import (RealParameter, Policy,
+                                                   Scenario)
+from ema_workbench.em_framework.outcomes import ScalarOutcome
+from ema_workbench.util import EMAError
 import ipyparallel
 
 # Created on 14 Mar 2017
 #
 # .. codeauthor::jhkwakkel <j.h.kwakkel (at) tudelft (dot) nl>
 
+
+def failing_model(a=0):
+    if a > 0.5:
+        raise ValueError('a is too large')
+    return {'y': a}
+
+
 class TestEvaluators(unittest.TestCase):
 
     @mock.patch('ema_workbench.em_framework.evaluators.DefaultCallback')
@@ -76,8 +90,102 @@ class TestEvaluators(unittest.TestCase):
             evaluator.evaluate_experiments(10, 10, mocked_callback)
             lb_view.map.called_once()
     
+    @mock.patch('ema_workbench.em_framework.evaluators.experiment_generator')
+    @mock.patch('ema_workbench.em_framework.evaluators.ExperimentRunner')
+    def test_submit_experiments(self, mocked_runner, mocked_generator):
+        model = mock.Mock(spec=ema_workbench.Model)
+        model.name = "test"
+        experiment = mock.Mock()
+        experiment.model_name = "test"
+        mocked_generator.return_value = [experiment]
+        mocked_runner.return_value = mocked_runner
+        mocked_runner.run_experiment.return_value = {'a': 1}
+
+        evaluator = evaluators.SequentialEvaluator(model)
+        futures = evaluator.submit_experiments(10, 10)
+        self.assertEqual(len(futures), 1)
+        self.assertEqual(futures[0].result(), (experiment, {'a': 1}))
+
+        results = list(evaluator.iter_experiments(10, 10))
+        self.assertEqual(results, [(experiment, {'a': 1})])
+
+        mocked_runner.run_experiment.side_effect = ValueError
+        futures = evaluator.submit_experiments(10, 10)
+        self.assertIsInstance(futures[0].exception(), ValueError)
+
     def test_perform_experiments(self):
         pass
 
+
+class TestSubmitErrors(unittest.TestCase):
+
+    def test_submit_errors(self):
+        model = ema_workbench.Model('test', function=failing_model)
+        model.uncertainties = [RealParameter('a', 0, 1)]
+        model.outcomes = [ScalarOutcome('y')]
+        scenarios = [Scenario(a=0.8), Scenario(a=0.2), Scenario(a=0.9),
+                     Scenario(a=0.3)]
+
+        for evaluator in [evaluators.SequentialEvaluator(model),
+                          evaluators.MultiprocessingEvaluator(model,
+                                    n_processes=2, chunksize=2)]:
+            with evaluator:
+                futures = evaluator.submit_experiments(scenarios,
+                                                       [Policy('none')])
+                exceptions = [future.exception(timeout=60) for future
+                              in futures]
+
+            self.assertIsInstance(exceptions[0], EMAError)
+            self.assertIsInstance(exceptions[2], EMAError)
+
+            # experiments after a failure still run
+            self.assertIsNone(exceptions[1])
+            self.assertIsNone(exceptions[3])
+            self.assertEqual(futures[1].result()[1], {'y': 0.2})
+            self.assertEqual(futures[3].result()[1], {'y': 0.3})
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def create_model(self, outcomes=('y', )):
+        model = ema_workbench.Model('test', function=lambda a=0: {'y': a,
+                                                                   'z': a})
+        model.uncertainties = [RealParameter('a', 0, 1)]
+        model.outcomes = [ScalarOutcome(name) for name in outcomes]
+        return model
+
+    def test_checkpoint(self):
+        checkpoint = os.path.join(self.directory, 'checkpoint')
+        model = self.create_model()
+        experiments, outcomes = evaluators.perform_experiments(
+            model, 5, checkpoint=checkpoint)
+
+        # a completed run is not run again
+        evaluator = evaluators.SequentialEvaluator(model)
+        evaluator.evaluate_experiments = mock.Mock()
+        resumed_experiments, resumed_outcomes = \
+            evaluators.perform_experiments(model, 5, evaluator=evaluator,
+                                           checkpoint=checkpoint)
+        evaluator.evaluate_experiments.assert_not_called()
+        self.assertTrue(resumed_experiments['a'].equals(experiments['a']))
+        self.assertEqual(list(resumed_outcomes['y']), list(outcomes['y']))
+
+        # different arguments
+        with self.assertRaises(EMAError):
+            evaluators.perform_experiments(model, 6, checkpoint=checkpoint)
+        with self.assertRaises(EMAError):
+            evaluators.perform_experiments(model, 5, checkpoint=checkpoint,
+                                           uncertainty_sampling='mc')
+        with self.assertRaises(EMAError):
+            evaluators.perform_experiments(self.create_model(('y', 'z')), 5,
+                                           checkpoint=checkpoint)
+
+
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
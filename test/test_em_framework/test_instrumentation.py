@@ -0,0 +1,105 @@
+'''
+
+
+'''
+from __future__ import (absolute_import, print_function, division,
+                        unicode_literals)
+import unittest
+
+import numpy as np
+
+from ema_workbench.em_framework.callbacks import DefaultCallback
+from ema_workbench.em_framework.evaluators import SequentialEvaluator
+from ema_workbench.em_framework.instrumentation import (Instrumentation,
+                                                        InstrumentedCallback)
+from ema_workbench.em_framework.model import Model
+from ema_workbench.em_framework.outcomes import ScalarOutcome
+from ema_workbench.em_framework.parameters import (RealParameter, Policy,
+                                                   Scenario, Case)
+
+
+def create_model():
+    model = Model('test', function=lambda a=0: {'y': a})
+    model.uncertainties = [RealParameter('a', 0, 1)]
+    model.outcomes = [ScalarOutcome('y')]
+    return model
+
+
+class TestInstrumentation(unittest.TestCase):
+    def test_to_dataframe(self):
+        instrumentation = Instrumentation()
+        instrumentation._submitted = {0: 10.0, 1: 10.0}
+        instrumentation.ran(0, 11.0, 0.5)
+        instrumentation.update([(1, 12.0, 1.5, 100)])
+        instrumentation.stored([0, 1], 0.2)
+        instrumentation.stored([2], 0.1)
+
+        timings = instrumentation.to_dataframe()
+        self.assertEqual(timings.columns.tolist(), Instrumentation.columns)
+        self.assertEqual(timings.index.tolist(), [0, 1, 2])
+        np.testing.assert_allclose(timings['runtime'], [0.5, 1.5, np.nan])
+        np.testing.assert_allclose(timings['queue_wait'], [1, 2, np.nan])
+        np.testing.assert_allclose(timings['size'], [np.nan, 100, np.nan])
+        np.testing.assert_allclose(timings['callback_time'], [0.1, 0.1, 0.1])
+
+        np.testing.assert_allclose(instrumentation.runtimes([2, 1, 0]),
+                                   [np.nan, 1.5, 0.5])
+
+        summary = instrumentation.summary()
+        self.assertEqual(summary.index.tolist(), Instrumentation.columns)
+        self.assertEqual(summary.loc['runtime', 'count'], 2)
+        self.assertEqual(summary.loc['runtime', 'total'], 2)
+        self.assertEqual(summary.loc['queue_wait', 'max'], 2)
+
+        counts, edges = instrumentation.histogram('runtime', bins=2)
+        np.testing.assert_equal(counts, [1, 1])
+        np.testing.assert_allclose(edges, [0.5, 1, 1.5])
+
+    def test_instrumented_callback(self):
+        model = create_model()
+        callback = DefaultCallback(model.uncertainties, [], model.outcomes,
+                                   nr_experiments=3)
+        instrumentation = Instrumentation()
+        wrapped = InstrumentedCallback(callback, instrumentation)
+
+        experiments = [Case(str(i), 'test', Policy('p'), Scenario(a=i), i)
+                       for i in range(3)]
+        self.assertEqual(list(wrapped.filter(experiments)), experiments)
+
+        wrapped(experiments[0], {'y': 0})
+        wrapped.store_batch([(e, {'y': 1}) for e in experiments[1::]])
+        self.assertEqual(wrapped.i, 3)
+
+        timings = instrumentation.to_dataframe()
+        self.assertEqual(timings.index.tolist(), [0, 1, 2])
+        self.assertFalse(timings['callback_time'].isnull().any())
+
+
+class TestPerformExperiments(unittest.TestCase):
+    def test_runtime_column(self):
+        model = create_model()
+
+        evaluator = SequentialEvaluator(model)
+        experiments, _ = evaluator.perform_experiments(5)
+        self.assertIsNone(evaluator.instrumentation)
+        self.assertNotIn('runtime', experiments.columns)
+
+        evaluator = SequentialEvaluator(model, instrument=True)
+        experiments, _ = evaluator.perform_experiments(5)
+        self.assertNotIn('runtime', experiments.columns)
+
+        timings = evaluator.instrumentation.to_dataframe()
+        self.assertEqual(timings.shape[0], 5)
+        self.assertFalse(timings['runtime'].isnull().any())
+        self.assertFalse(timings['queue_wait'].isnull().any())
+        self.assertTrue(timings['size'].isnull().all())
+
+        evaluator = SequentialEvaluator(model)
+        experiments, _ = evaluator.perform_experiments(5,
+                                                       runtime_column=True)
+        self.assertIn('runtime', experiments.columns)
+        self.assertTrue((experiments['runtime'] >= 0).all())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -9,15 +9,21 @@ from __future__ import (print_function, absolute_import, unicode_literals,
 
 import unittest
 
+import numpy as np
+
 try:
     import unittest.mock as mock
 except ImportError:
     import mock
 
-from ema_workbench.em_framework.model import Model, FileModel
+from ema_workbench.em_framework.model import (Model, FileModel,
+                                              ReplicatorModel,
+                                              VectorizedReplicatorModel)
 from ema_workbench.em_framework.parameters import (RealParameter, Policy, 
                                                    Scenario, Category,
                                                    CategoricalParameter)
+from ema_workbench.em_framework.outcomes import (ScalarOutcome,
+                                                 TimeSeriesOutcome)
 from ema_workbench.util import EMAError
 
 class FileModelTest(FileModel):
@@ -127,10 +133,25 @@ class TestModel(unittest.TestCase):
     
     def test_cleanup(self):
         model_name = 'modelname'
-        
+
         model = Model(model_name, lambda x:x)
         model.cleanup()
 
+    def test_reset_model(self):
+        model_name = 'modelname'
+
+        model = Model(model_name, lambda a=1: {'b': a})
+        model.uncertainties = [RealParameter('a', 0, 1)]
+        model.outcomes = [ScalarOutcome('b')]
+
+        model.run_model(Scenario(a=0.1), Policy('test'))
+        first = model.outcomes_output
+        model.reset_model()
+
+        model.run_model(Scenario(a=0.2), Policy('test'))
+        self.assertEqual(first['b'], 0.1)
+        self.assertEqual(model.outcomes_output['b'], 0.2)
+
     def test_model_uncertainties(self):
         model_name = 'modelname'
         
@@ -142,6 +163,38 @@ class TestModel(unittest.TestCase):
         self.assertTrue(len(model.uncertainties.keys())==1)
         self.assertTrue(unc_a.name in model.uncertainties)
 
+class TestReplicatorModel(unittest.TestCase):
+
+    def test_run_model(self):
+        def function(a=0, seed=0):
+            return {'b': a + seed, 'c': [a, seed]}
+
+        model = ReplicatorModel('modelname', function)
+        model.uncertainties = [RealParameter('a', 0, 1)]
+        model.outcomes = [ScalarOutcome('b', function=np.mean),
+                          TimeSeriesOutcome('c')]
+        model.replications = [{'seed': 1}, {'seed': 2}, {'seed': 3}]
+
+        model.run_model(Scenario(a=0.5), Policy('test'))
+        self.assertEqual(model.outcomes_output['b'], 2.5)
+        np.testing.assert_equal(model.outcomes_output['c'],
+                                [[0.5, 1], [0.5, 2], [0.5, 3]])
+
+    def test_vectorized(self):
+        function = mock.Mock()
+        function.return_value = {'b': np.array([1, 2, 3])}
+
+        model = VectorizedReplicatorModel('modelname', function)
+        model.uncertainties = [RealParameter('a', 0, 1)]
+        model.outcomes = [ScalarOutcome('b', function=np.mean)]
+        model.replications = 3
+
+        model.run_model(Scenario(a=0.5), Policy('test'))
+        function.assert_called_once_with(a=0.5,
+                                         replications=model.replications)
+        self.assertEqual(model.outcomes_output['b'], 2)
+
+
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
\ No newline at end of file
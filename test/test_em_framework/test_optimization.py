@@ -8,6 +8,9 @@ from __future__ import (unicode_literals, print_function, absolute_import,
 
 import unittest
 
+import numpy as np
+import pandas as pd
+
 try:
     import unittest.mock as mock
 except ImportError:
@@ -18,7 +21,11 @@ from ema_workbench.em_framework.parameters import (RealParameter,
                                        IntegerParameter, CategoricalParameter)
 from ema_workbench.em_framework.outcomes import ScalarOutcome, Constraint
 from ema_workbench.em_framework.optimization import (Problem, RobustProblem, 
-             to_dataframe, to_platypus_types, to_problem, to_robust_problem)
+             to_dataframe, to_platypus_types, to_problem, to_robust_problem,
+             SteadyStateEpsMOEA, evaluate, evaluate_robust)
+from ema_workbench.em_framework.parameters import Policy
+from ema_workbench.em_framework.evaluators import SequentialEvaluator
+from ema_workbench.util import EMAError
 
 # Created on 6 Jun 2017
 #
@@ -156,6 +163,25 @@ class TestOptimization(unittest.TestCase):
             
     def test_process_levers(self):
         pass
+
+    def test_evaluate(self):
+        problem = mock.Mock()
+        problem.searchover = 'levers'
+        problem.outcome_names = ['x']
+        problem.ema_constraints = [Constraint('c', outcome_names='x',
+                                              function=lambda x: max(0, x-1))]
+
+        experiments = pd.DataFrame({'policy': ['2', '0', '1']})
+        outcomes = {'x': np.array([2, 0, 1])}
+
+        policies = [Policy(str(i)) for i in range(3)]
+        jobs = [mock.Mock() for _ in policies]
+        evaluate(zip(policies, jobs), experiments, outcomes, problem)
+
+        for i, job in enumerate(jobs):
+            self.assertEqual(job.solution.ema_results,
+                             ([i], [max(0, i-1)]))
+            job.solution.evaluate.assert_called_once()
     
     def test_process_uncertainties(self):
         pass
@@ -190,5 +216,69 @@ class TestRobustOptimization(unittest.TestCase):
     def test_process_robust(self):
         pass
 
+    def test_evaluate_robust(self):
+        problem = mock.Mock()
+        problem.robustness_functions = [ScalarOutcome('mean x',
+                variable_name='x', function=np.mean, kind='maximize')]
+        problem.ema_constraints = []
+
+        experiments = pd.DataFrame({'policy': ['0', '1', '0', '1']})
+        outcomes = {'x': np.array([1, 2, 3, 4])}
+
+        policies = [Policy(str(i)) for i in range(2)]
+        jobs = [mock.Mock() for _ in policies]
+        evaluate_robust(zip(policies, jobs), experiments, outcomes, problem)
+
+        self.assertEqual(jobs[0].solution.ema_results, ([2], []))
+        self.assertEqual(jobs[1].solution.ema_results, ([3], []))
+
+        # vectorized robustness functions are called once
+        function = mock.Mock(wraps=np.mean)
+        problem.robustness_functions = [ScalarOutcome('mean x',
+                variable_name='x', function=function, kind='maximize',
+                vectorized=True)]
+
+        jobs = [mock.Mock() for _ in policies]
+        evaluate_robust(zip(policies, jobs), experiments, outcomes, problem)
+
+        function.assert_called_once()
+        np.testing.assert_equal(function.call_args[0][0], [[1, 3], [2, 4]])
+        self.assertEqual(jobs[0].solution.ema_results, ([2], []))
+        self.assertEqual(jobs[1].solution.ema_results, ([3], []))
+
+
+class TestSteadyStateEpsMOEA(unittest.TestCase):
+    def test_run(self):
+        def function(x1=0, x2=0):
+            return {'y1': x1, 'y2': (1 - x1) * (1 + x2)}
+
+        model = Model('test', function=function)
+        model.levers = [RealParameter('x1', 0, 1),
+                        RealParameter('x2', 0, 1)]
+        model.outcomes = [ScalarOutcome('y1', kind=ScalarOutcome.MINIMIZE),
+                          ScalarOutcome('y2', kind=ScalarOutcome.MINIMIZE)]
+
+        problem = to_problem(model, 'levers')
+        evaluator = SequentialEvaluator(model)
+        optimizer = SteadyStateEpsMOEA(problem, evaluator, [0.1, 0.1],
+                                       population_size=10, n_pending=1)
+
+        callback = mock.Mock()
+        optimizer.run(45, callback=callback)
+
+        self.assertEqual(optimizer.nfe, 45)
+        self.assertEqual(len(optimizer.population), 10)
+        self.assertTrue(len(optimizer.result) > 0)
+        self.assertEqual(callback.call_count, 5)
+
+        with self.assertRaises(EMAError):
+            SteadyStateEpsMOEA(problem, evaluator, [0.1, 0.1],
+                               population_size=1)
+        with self.assertRaises(EMAError):
+            SteadyStateEpsMOEA(problem, evaluator, [0.1, 0.1], n_pending=0)
+        with self.assertRaises(TypeError):
+            SteadyStateEpsMOEA(problem, evaluator, [0.1, 0.1],
+                               populaton_size=10)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -206,6 +206,36 @@ class CategoricalParameterTestCase(unittest.TestCase):
         with self.assertRaises(KeyError):
             par1.cat_for_index(3)
 
+class ExperimentTestCase(unittest.TestCase):
+    def test_experiment(self):
+        scenario = parameters.Scenario('s', a=1, b=2)
+        policy = parameters.Policy('p', b=3, c=4)
+        constants = {'d': 5}
+
+        experiment = parameters.Experiment(scenario, policy, constants)
+        self.assertEqual(dict(experiment), {'a': 1, 'b': 3, 'c': 4, 'd': 5})
+        self.assertEqual(list(experiment), ['a', 'b', 'c', 'd'])
+        self.assertEqual(len(experiment), 4)
+        self.assertEqual(experiment.name, 's_p_1')
+        self.assertEqual(experiment.id, scenario.id * policy.id)
+
+        with self.assertRaises(TypeError):
+            experiment['a'] = 2
+
+        replication = type('Replication', (dict, ), {})(d=6, seed=7)
+        replication.id = 2
+
+        replicated = experiment.replicate(replication)
+        self.assertEqual(dict(replicated),
+                         {'a': 1, 'b': 3, 'c': 4, 'd': 6, 'seed': 7})
+        self.assertEqual(replicated.name, 's_p_2')
+        self.assertEqual(replicated.id, experiment.id * 2)
+
+        # nothing has been copied
+        scenario['a'] = 10
+        self.assertEqual(replicated['a'], 10)
+
+
 class CreateOutcomesTestCase(unittest.TestCase):
     def test_create_outcomes(self):
         outcome_list = [dict(type='scalar', name='a'), 
@@ -6,12 +6,16 @@ Created on 21 jan. 2013
 from __future__ import (absolute_import, unicode_literals, division, 
                         print_function)
 
+import itertools
 import mock
 import unittest
 
+import numpy as np
+from scipy.spatial.distance import pdist
+
 from ema_workbench.em_framework.samplers import (LHSSampler, MonteCarloSampler, 
                                 FullFactorialSampler, PartialFactorialSampler,
-                                determine_parameters)
+                                determine_parameters, _maximin_score)
 from ema_workbench.em_framework.parameters import (RealParameter, 
                                                       IntegerParameter, 
                                                       CategoricalParameter)
@@ -46,9 +50,56 @@ class SamplerTestCase(unittest.TestCase):
         sampler = MonteCarloSampler()
         self._test_generate_designs(sampler)
     
+    def test_seed(self):
+        for sampler in [LHSSampler, MonteCarloSampler]:
+            a = sampler(seed=42).generate_designs(self.uncertainties, 10)
+            b = sampler(seed=42).generate_designs(self.uncertainties, 10)
+            np.testing.assert_equal(a.designs, b.designs)
+
+    def test_lhs_stratification(self):
+        # one sample in each of the n intervals, for any n
+        for n in [1, 7, 49, 100]:
+            sampler = LHSSampler(seed=1)
+            unit = sampler._lhs_unit(n, 5)
+            self.assertEqual(unit.shape, (n, 5))
+
+            intervals = np.sort(np.floor(unit*n), axis=0)
+            for column in intervals.T:
+                np.testing.assert_equal(column, np.arange(n))
+
+        sample = LHSSampler().sample('uniform', (0, 1), 49)
+        self.assertEqual(sample.shape, (49,))
+
+    def test_lhs_criterion(self):
+        with self.assertRaises(ValueError):
+            LHSSampler(criterion='unknown')
+        with self.assertRaises(ValueError):
+            LHSSampler(criterion=LHSSampler.MAXIMIN, iterations=0)
+
+        for criterion in [LHSSampler.MAXIMIN, LHSSampler.CORRELATION]:
+            sampler = LHSSampler(seed=1, criterion=criterion, iterations=20)
+            designs = sampler.generate_designs(self.uncertainties, 10)
+            self.assertEqual(designs.designs.shape, (10, 3))
+
+        unit = LHSSampler(seed=1)._lhs_unit(50, 4)
+        self.assertAlmostEqual(_maximin_score(unit), pdist(unit).min())
+
     def test_ff_sampler(self):
         sampler = FullFactorialSampler()
         self._test_generate_designs(sampler)
+
+    def test_design_matrix(self):
+        sampler = LHSSampler()
+        designs = sampler.generate_designs(self.uncertainties, 10)
+        designs.kind = Scenario
+
+        self.assertIsInstance(designs.designs, np.ndarray)
+        self.assertEqual(designs.designs.shape, (10, 3))
+        self.assertEqual(designs.designs.dtype, np.float64)
+
+        for design in designs:
+            self.assertIsInstance(design['2'], int)
+            self.assertIn(design['3'], ['a', 'b', 'c'])
         
     def test_pf_sampler(self):
         uncs = [RealParameter('a', 0, 5, resolution=(0, 2.5,5), pff=True),
@@ -75,6 +126,37 @@ class SamplerTestCase(unittest.TestCase):
         received = {u.name for u in other}
         expected = {'c', 'd'}
         self.assertEqual(received, expected)
+
+        # lazy indexing gives the same designs as iterating
+        self.assertEqual(dict(designs[13]), dict(list(designs)[13]))
+ 
+    def test_ff_designs(self):
+        sampler = FullFactorialSampler()
+        designs = sampler.generate_designs(self.uncertainties, 3)
+        designs.kind = Scenario
+
+        values = [[0, 5, 10], [0, 5, 10], ['a', 'b', 'c']]
+        expected = list(itertools.product(*values))
+        self.assertEqual(designs.n, len(expected))
+
+        received = [(d['1'], d['2'], d['3']) for d in designs]
+        self.assertEqual(received, expected)
+
+        self.assertEqual((designs[5]['1'], designs[5]['2'], designs[5]['3']),
+                         expected[5])
+        self.assertEqual(designs[-1]['3'], 'c')
+        with self.assertRaises(IndexError):
+            designs[designs.n]
+
+        chunks = list(designs.chunks(10))
+        self.assertEqual([len(chunk) for chunk in chunks], [10, 10, 7])
+
+        # n does not require enumerating the designs
+        uncertainties = [RealParameter(str(i), 0, 1) for i in range(10)]
+        designs = sampler.generate_designs(uncertainties, 50)
+        designs.kind = Scenario
+        self.assertEqual(designs.n, 50**10)
+        self.assertEqual(designs[designs.n-1]['9'], 1)
  
     def test_determine_parameters(self):
         function = mock.Mock()
@@ -10,8 +10,18 @@ import unittest
 import numpy as np
 import pandas as pd
 
+from ema_workbench.em_framework import (Model, RealParameter,
+                                        BooleanParameter,
+                                        CategoricalParameter, ScalarOutcome,
+                                        TimeSeriesOutcome, perform_experiments)
+from ema_workbench.util import EMAError
 from ema_workbench.util.utilities import (save_results, load_results,
-                              merge_results, get_ema_project_home_dir)
+                              merge_results, get_ema_project_home_dir,
+                              LazyOutcomes)
+
+
+def some_model(x=0, b=False, c='a', l=0):
+    return {'y': x + l, 'z': np.full((5, ), x)}
 
 
 def setUpModule():
@@ -129,7 +139,141 @@ class LoadResultsTestCase(unittest.TestCase):
         self.assertTrue(np.all(np.allclose(experiments['x'],loaded_experiments['x'])))
         self.assertTrue(np.all(np.allclose(experiments['y'],loaded_experiments['y'])))        
         
-        
+
+    def test_load_results_dtypes(self):
+        nr_experiments = 100
+        experiments = pd.DataFrame({'x': np.random.rand(nr_experiments),
+                                    'i': np.arange(nr_experiments),
+                                    'b': np.arange(nr_experiments)%2 == 0})
+        experiments['c'] = pd.Categorical(['a', 'b']*50)
+        experiments['policy'] = np.asarray(['p']*nr_experiments, 
+                                           dtype=object)
+        outcomes = {'a': np.random.rand(nr_experiments),
+                    'b': np.random.rand(nr_experiments, 10, 3)}
+
+        fn = '../data/test.tar'
+        for compression in ['gz', None]:
+            save_results((experiments, outcomes), fn,
+                         compression=compression)
+            loaded_experiments, loaded_outcomes = load_results(fn,
+                                                          mmap_mode='r')
+
+            self.assertTrue(loaded_experiments.equals(experiments))
+            for key, value in outcomes.items():
+                np.testing.assert_equal(loaded_outcomes[key], value)
+
+            if compression is None:
+                self.assertIsInstance(loaded_outcomes['a'], np.memmap)
+            else:
+                self.assertNotIsInstance(loaded_outcomes['a'], np.memmap)
+
+            del loaded_outcomes
+            os.remove(fn)
+
+    def test_pickle(self):
+        nr_experiments = 10
+        experiments = pd.DataFrame({'x': np.random.rand(nr_experiments)})
+        experiments['c'] = pd.Categorical([1, 2]*5)
+        outcomes = {'a': np.asarray(['a', 'bb']*5, dtype=object)}
+
+        # strings and categories are stored without pickling
+        fn = '../data/test.tar'
+        save_results((experiments, outcomes), fn, compression=None)
+        loaded_experiments, loaded_outcomes = load_results(fn)
+        self.assertTrue(loaded_experiments.equals(experiments))
+        self.assertEqual(loaded_outcomes['a'].dtype, object)
+        np.testing.assert_equal(loaded_outcomes['a'], outcomes['a'])
+
+        # other objects are only pickled if allowed
+        outcomes['b'] = np.asarray([{'a': i} for i in range(nr_experiments)])
+        with self.assertRaises(EMAError):
+            save_results((experiments, outcomes), fn, compression=None)
+
+        save_results((experiments, outcomes), fn, compression=None,
+                     allow_pickle=True)
+        with self.assertRaises(EMAError):
+            load_results(fn)
+        _, loaded_outcomes = load_results(fn, allow_pickle=True)
+        np.testing.assert_equal(loaded_outcomes['b'], outcomes['b'])
+
+        del loaded_outcomes
+        os.remove(fn)
+
+    def test_perform_experiments(self):
+        model = Model('test', function=some_model)
+        model.uncertainties = [RealParameter('x', 0, 1),
+                               BooleanParameter('b'),
+                               CategoricalParameter('c', ['a', 'b'])]
+        model.levers = [RealParameter('l', 0, 1)]
+        model.outcomes = [ScalarOutcome('y'), TimeSeriesOutcome('z')]
+        experiments, outcomes = perform_experiments(model, 5, 2)
+
+        fn = '../data/test.tar.gz'
+        save_results((experiments, outcomes), fn)
+        loaded_experiments, loaded_outcomes = load_results(fn)
+        os.remove(fn)
+
+        self.assertTrue(loaded_experiments.equals(experiments))
+        self.assertEqual(set(loaded_outcomes.keys()), set(outcomes.keys()))
+        for key, value in outcomes.items():
+            self.assertEqual(loaded_outcomes[key].dtype, value.dtype)
+            np.testing.assert_equal(loaded_outcomes[key], value)
+
+    def test_load_results_selection(self):
+        nr_experiments = 100
+        experiments = pd.DataFrame({'x': np.random.rand(nr_experiments)})
+        experiments['policy'] = pd.Categorical(['a', 'b']*50)
+        outcomes = {'a': np.random.rand(nr_experiments),
+                    'b': np.random.rand(nr_experiments, 10)}
+
+        fn = '../data/test.tar'
+        save_results((experiments, outcomes), fn, compression=None)
+
+        # selected outcomes
+        _, loaded_outcomes = load_results(fn, outcomes=['b'])
+        self.assertEqual(list(loaded_outcomes.keys()), ['b'])
+        with self.assertRaises(EMAError):
+            load_results(fn, outcomes=['c'])
+
+        # lazy loading
+        _, loaded_outcomes = load_results(fn, lazy=True)
+        self.assertIsInstance(loaded_outcomes, LazyOutcomes)
+        self.assertEqual(set(loaded_outcomes.keys()), {'a', 'b'})
+        self.assertEqual(loaded_outcomes._loaded, {})
+        np.testing.assert_equal(loaded_outcomes['a'], outcomes['a'])
+        self.assertEqual(list(loaded_outcomes._loaded.keys()), ['a'])
+
+        # subset of rows
+        for lazy in [False, True]:
+            loaded_experiments, loaded_outcomes = load_results(fn, lazy=lazy,
+                    rows=lambda experiments: experiments['policy'] == 'b')
+            self.assertEqual(loaded_experiments.shape[0], 50)
+            self.assertTrue(np.all(loaded_experiments['policy'] == 'b'))
+            np.testing.assert_equal(loaded_outcomes['b'], 
+                                    outcomes['b'][1::2])
+
+        rows = [1, 5, 7]
+        loaded_experiments, loaded_outcomes = load_results(fn, rows=rows)
+        np.testing.assert_equal(loaded_experiments['x'].values, 
+                                experiments['x'].values[rows])
+        np.testing.assert_equal(loaded_outcomes['a'], outcomes['a'][rows])
+
+        del loaded_outcomes
+        os.remove(fn)
+
+    def test_load_old_format(self):
+        experiments, outcomes = load_results('../data/eng_trans.tar.gz')
+
+        self.assertEqual(experiments.shape[0], 600)
+        self.assertEqual(outcomes['TIME'].shape, (600, 101))
+
+        experiments, outcomes = load_results('../data/eng_trans.tar.gz',
+                                             outcomes=['TIME'], lazy=True,
+                                             rows=np.arange(10))
+        self.assertEqual(experiments.shape[0], 10)
+        self.assertEqual(outcomes['TIME'].shape, (10, 101))
+
+
 class ExperimentsToScenariosTestCase(unittest.TestCase):
     pass
 